@@ -9,5 +9,6 @@ class ProfileAdmin(admin.ModelAdmin):
 @admin.register(MovieList)
 class MovieListAdmin(admin.ModelAdmin):
     list_display = ('id', 'profile', 'item_id', 'title', 'added_date', 'media_type')
-    search_fields = ('title', 'profile__name')
+    search_fields = ('title__title', 'profile__name')
     list_filter = ('media_type', 'added_date')
+    list_select_related = ('profile', 'title')
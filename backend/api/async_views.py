@@ -0,0 +1,274 @@
+# backend/api/async_views.py
+"""
+ASGI-native versions of the read and upstream-calling endpoints.
+
+They mirror the function views in ``views.py`` and are routed instead of
+them when ``ASYNC_READ_VIEWS`` is on. Authentication runs on the event
+loop through ``aauthenticate`` so hot tokens never hop to a thread,
+throttles and replica pins use the cache's async methods, and upstream
+calls go through the pooled async client in ``catalog``.
+``ChangeFeedView`` has no sync version and is always routed.
+"""
+import inspect
+import logging
+import time
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.http import HttpResponse, StreamingHttpResponse
+from django.utils.cache import get_conditional_response
+from rest_framework import status
+from rest_framework.permissions import IsAuthenticated
+from rest_framework.response import Response
+from rest_framework.views import APIView
+
+from . import browse, catalog, changefeed
+from .authentication import StreamTicket, StreamTicketAuthentication
+from .models import Profile
+from .pagination import KeysetPagination
+from .renderers import EventStreamRenderer, FastJSONRenderer
+from .routers import replica_reads
+from .serializers import MovieListValuesSerializer, ProfileValuesSerializer
+from .views import (
+    MOVIE_LIST_ORDERINGS, PROFILE_SUMMARY_FIELDS, attach_lists, catalog_params, catalog_response,
+    encoded_page_response, make_etag, movie_list_queryset, profile_lists_queryset, profiles_queryset,
+    requested_fields, set_validators, wants_lists,
+)
+
+logger = logging.getLogger(__name__)
+
+
+class AsyncAPIView(APIView):
+    """``APIView`` whose handlers are coroutines, dispatched without a thread hop."""
+
+    async def dispatch(self, request, *args, **kwargs):
+        self.args = args
+        self.kwargs = kwargs
+        request = self.initialize_request(request, *args, **kwargs)
+        self.request = request
+        self.headers = self.default_response_headers
+
+        try:
+            await self.ainitial(request, *args, **kwargs)
+            if request.method.lower() in self.http_method_names:
+                handler = getattr(self, request.method.lower(), self.http_method_not_allowed)
+            else:
+                handler = self.http_method_not_allowed
+            response = handler(request, *args, **kwargs)
+            if inspect.isawaitable(response):
+                response = await response
+        except Exception as exc:
+            response = self.handle_exception(exc)
+
+        self.response = self.finalize_response(request, response, *args, **kwargs)
+        return self.rendered(self.response)
+
+    def rendered(self, response):
+        # Django's async handler renders template-style responses through
+        # sync_to_async; rendering here and returning a plain HttpResponse
+        # keeps the JSON encoding on the event loop.
+        if not hasattr(response, 'render'):
+            return response
+        response.render()
+        plain = HttpResponse(response.content, status=response.status_code)
+        for header, value in response.items():
+            plain[header] = value
+        plain.cookies = response.cookies
+        return plain
+
+    async def ainitial(self, request, *args, **kwargs):
+        self.format_kwarg = self.get_format_suffix(**kwargs)
+        request.accepted_renderer, request.accepted_media_type = self.perform_content_negotiation(request)
+        request.version, request.versioning_scheme = self.determine_version(request, *args, **kwargs)
+        await self.aperform_authentication(request)
+        self.check_permissions(request)
+        await self.acheck_throttles(request)
+
+    async def aperform_authentication(self, request):
+        for authenticator in request.authenticators:
+            try:
+                if hasattr(authenticator, 'aauthenticate'):
+                    user_auth_tuple = await authenticator.aauthenticate(request)
+                else:
+                    user_auth_tuple = await sync_to_async(authenticator.authenticate)(request)
+            except Exception:
+                request._not_authenticated()
+                raise
+            if user_auth_tuple is not None:
+                request._authenticator = authenticator
+                request.user, request.auth = user_auth_tuple
+                return
+        request._not_authenticated()
+
+    async def acheck_throttles(self, request):
+        # The cache round trips of APIView.check_throttles, without blocking the loop.
+        durations = []
+        for throttle in self.get_throttles():
+            if hasattr(throttle, 'aallow_request'):
+                allowed = await throttle.aallow_request(request, self)
+            else:
+                allowed = await sync_to_async(throttle.allow_request)(request, self)
+            if not allowed:
+                durations.append(throttle.wait())
+        if durations:
+            durations = [duration for duration in durations if duration is not None]
+            self.throttled(request, max(durations, default=None))
+
+
+class UserInfoView(AsyncAPIView):
+    permission_classes = [IsAuthenticated]
+
+    @replica_reads
+    async def get(self, request):
+        user = request.user
+        return Response({
+            'username': user.username,
+            'email': user.email,
+            'id': user.id,
+        })
+
+
+class ProfilesView(AsyncAPIView):
+    permission_classes = [IsAuthenticated]
+
+    @replica_reads
+    async def get(self, request):
+        fields = requested_fields(request, aliases={'summary': PROFILE_SUMMARY_FIELDS})
+        query = request.GET.urlencode()
+
+        if 'HTTP_IF_NONE_MATCH' in request.META:
+            stamps = Profile.objects.filter(user_id=request.user.id).order_by('id').values_list('id', 'version')
+            etag = make_etag('profiles', query, *[stamp async for stamp in stamps])
+            not_modified = get_conditional_response(request, etag=etag)
+            if not_modified is not None:
+                return not_modified
+
+        profiles = [profile async for profile in profiles_queryset(request.user.id, fields)]
+        if wants_lists(profiles, fields):
+            movies = profile_lists_queryset([profile['id'] for profile in profiles])
+            attach_lists(profiles, [movie async for movie in movies])
+        serializer = ProfileValuesSerializer(profiles, fields=fields)
+        etag = make_etag('profiles', query, *((profile['id'], profile['version']) for profile in profiles))
+        return set_validators(Response(serializer.data), etag)
+
+
+class MovieListView(AsyncAPIView):
+    permission_classes = [IsAuthenticated]
+
+    @replica_reads
+    async def get(self, request):
+        profile_id = request.query_params.get('profile_id')
+        if not profile_id:
+            return Response({"error": "Profile ID is required"}, status=status.HTTP_400_BAD_REQUEST)
+
+        try:
+            profile = await Profile.objects.only('id', 'version', 'updated_at').aget(
+                id=profile_id, user_id=request.user.id
+            )
+        except Profile.DoesNotExist:
+            return Response({"error": "Profile not found"}, status=status.HTTP_404_NOT_FOUND)
+
+        etag = make_etag('mylist', profile.id, profile.version, request.GET.urlencode())
+        not_modified = get_conditional_response(request, etag=etag, last_modified=int(profile.updated_at.timestamp()))
+        if not_modified is not None:
+            return set_validators(not_modified, etag, profile.updated_at)
+
+        ordering = MOVIE_LIST_ORDERINGS.get(request.query_params.get('ordering', 'added'))
+        if ordering is None:
+            return Response({"error": "Unknown ordering"}, status=status.HTTP_400_BAD_REQUEST)
+        paginator = KeysetPagination(ordering)
+        fields = requested_fields(request)
+
+        movies = movie_list_queryset(profile, request.query_params, fields, paginator)
+        page = await paginator.apaginate_queryset(movies, request)
+        serializer = MovieListValuesSerializer(page, fields=fields)
+        return set_validators(paginator.get_paginated_response(serializer.data), etag, profile.updated_at)
+
+
+class CatalogProxyView(AsyncAPIView):
+    permission_classes = [IsAuthenticated]
+
+    async def get(self, request, tmdb_path):
+        tmdb_path = tmdb_path.strip('/')
+        if not catalog.is_allowed_path(tmdb_path):
+            return Response({"error": "Catalog path not found"}, status=status.HTTP_404_NOT_FOUND)
+
+        cache = catalog.get_catalog_cache()
+        try:
+            payload, state = await cache.aget(tmdb_path, catalog_params(request))
+        except catalog.UpstreamError as exc:
+            return Response({"error": exc.message}, status=exc.status_code)
+        return catalog_response(cache, tmdb_path, payload, state)
+
+
+class BrowseHomeView(AsyncAPIView):
+    permission_classes = [IsAuthenticated]
+
+    async def get(self, request):
+        profile_id = request.query_params.get('profile_id')
+        if not profile_id:
+            return Response({"error": "Profile ID is required"}, status=status.HTTP_400_BAD_REQUEST)
+
+        try:
+            profile = await Profile.objects.aget(id=profile_id, user_id=request.user.id)
+        except Profile.DoesNotExist:
+            return Response({"error": "Profile not found"}, status=status.HTTP_404_NOT_FOUND)
+
+        return encoded_page_response(request, *await browse.aget_browse_home(profile))
+
+
+class ChangeFeedView(AsyncAPIView):
+    """Server-Sent Events for one profile, see ``changefeed``."""
+    # Browsers' EventSource authenticates with a ticket, other clients with the header.
+    authentication_classes = [StreamTicketAuthentication, *AsyncAPIView.authentication_classes]
+    permission_classes = [IsAuthenticated]
+    renderer_classes = [FastJSONRenderer, EventStreamRenderer]
+
+    async def get(self, request):
+        if getattr(request, 'scope', None) is None:
+            # A WSGI server would buffer the endless body.
+            return Response({"error": "The change feed needs an ASGI server"}, status=status.HTTP_501_NOT_IMPLEMENTED)
+        profile_id = request.query_params.get('profile_id', '')
+        if not profile_id.isdigit():
+            return Response({"error": "Profile ID is required"}, status=status.HTTP_400_BAD_REQUEST)
+        if isinstance(request.auth, StreamTicket) and request.auth['profile_id'] != int(profile_id):
+            return Response({"error": "Ticket is for another profile"}, status=status.HTTP_403_FORBIDDEN)
+        if not await Profile.objects.filter(id=profile_id, user_id=request.user.id).aexists():
+            return Response({"error": "Profile not found"}, status=status.HTTP_404_NOT_FOUND)
+
+        # EventSource sends the header when it reconnects by itself; the parameter is for
+        # other clients and for reconnects with a fresh ticket.
+        last_event_id = request.headers.get('Last-Event-ID') or request.query_params.get('last_event_id')
+        try:
+            subscription, first_events = await changefeed.get_broker().subscribe(int(profile_id), last_event_id)
+        except Exception:
+            logger.warning('Could not open the change feed of profile %s', profile_id, exc_info=True)
+            return Response({"error": "Change feed unavailable"}, status=status.HTTP_503_SERVICE_UNAVAILABLE)
+
+        response = StreamingHttpResponse(
+            changefeed.stream(subscription, first_events, self.lifetime(request)),
+            content_type='text/event-stream',
+        )
+        response['Cache-Control'] = 'no-cache'
+        # Stops nginx from buffering the stream.
+        response['X-Accel-Buffering'] = 'no'
+        return response
+
+    @staticmethod
+    def lifetime(request):
+        """Seconds until the stream closes: ``MAX_SECONDS``, or sooner when the access token expires."""
+        lifetime = settings.CHANGE_FEED['MAX_SECONDS']
+        payload = getattr(request.auth, 'payload', {})
+        # A ticket outlives its own few seconds, up to the access token it came from.
+        expires = payload['access_exp'] if 'access_exp' in payload else payload.get('exp')
+        if expires is not None:
+            lifetime = min(lifetime, max(expires - time.time(), 0))
+        return lifetime
+
+
+get_user_info = UserInfoView.as_view()
+get_profiles = ProfilesView.as_view()
+get_movie_list = MovieListView.as_view()
+catalog_proxy = CatalogProxyView.as_view()
+browse_home = BrowseHomeView.as_view()
+change_feed = ChangeFeedView.as_view()
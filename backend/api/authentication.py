@@ -0,0 +1,333 @@
+# backend/api/authentication.py
+"""
+JWT authentication that verifies each access token once per process.
+
+Verified tokens are kept in a bounded LRU keyed on a hash of the raw token
+and expire with the token's ``exp`` claim; resolved users are cached for
+the access-token lifetime. Revoked tokens are tracked by ``jti`` in the
+shared cache so revocation is honoured across workers even for tokens
+that are already cached. Likewise, saving or deleting a user bumps a
+version marker in the shared cache, and every worker reloads a cached
+user whose marker changed.
+
+Revocations are also stored in ``RevokedToken``, one row per ``jti`` that
+lives until the token expires, which is what the refresh endpoint checks:
+rotating a refresh token claims its ``jti`` with a single INSERT, so a
+replayed or concurrently reused refresh token fails on the primary key.
+This replaces simplejwt's blacklist app, which records every token issued.
+
+``EventSource`` cannot send an ``Authorization`` header, so the change
+feed also accepts a ``StreamTicket`` in its ``ticket`` parameter: a JWT of
+its own type, valid for ``CHANGE_FEED['TICKET_SECONDS']``, bound to one
+profile and minted with an access token by ``/api/mylist/events/ticket/``.
+"""
+import hashlib
+import time
+from datetime import timedelta
+
+from django.conf import settings
+from django.contrib.auth.models import User
+from django.core.cache import caches
+from django.core.signals import setting_changed
+from django.db import IntegrityError, transaction
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+from django.utils import timezone
+from django.utils.functional import cached_property
+from rest_framework.permissions import SAFE_METHODS
+from rest_framework_simplejwt.authentication import JWTAuthentication
+from rest_framework_simplejwt.exceptions import AuthenticationFailed, InvalidToken, TokenError
+from rest_framework_simplejwt.models import TokenUser
+from rest_framework_simplejwt.settings import api_settings
+from rest_framework_simplejwt.tokens import Token
+from rest_framework_simplejwt.utils import datetime_from_epoch
+
+from .lru import LRUCache
+from .models import RevokedToken
+
+_verified_tokens = None
+_users = None
+
+
+def _caches():
+    global _verified_tokens, _users
+    if _verified_tokens is None:
+        config = settings.JWT_AUTH_CACHE
+        _verified_tokens = LRUCache(config['TOKENS'])
+        _users = LRUCache(config['USERS'])
+    return _verified_tokens, _users
+
+
+def _revocation_key(jti):
+    return f'jwt-revoked:{jti}'
+
+
+def _user_version_key(user_id):
+    return f'jwt-user-version:{user_id}'
+
+
+def _user_version(user_id):
+    return caches[settings.JWT_AUTH_CACHE['ALIAS']].get(_user_version_key(user_id))
+
+
+def _bump_user_version(user_id):
+    # Outlives every local entry, which expire after the access-token lifetime.
+    timeout = int(api_settings.ACCESS_TOKEN_LIFETIME.total_seconds()) + 1
+    caches[settings.JWT_AUTH_CACHE['ALIAS']].set(_user_version_key(user_id), time.time_ns(), timeout)
+
+
+def _remember_revocation(jti, token):
+    timeout = max(1, int(token['exp'] - time.time()))
+    caches[settings.JWT_AUTH_CACHE['ALIAS']].set(_revocation_key(jti), True, timeout)
+
+
+def revoke_token(token):
+    """Reject ``token`` (a validated token object) until it expires."""
+    jti = token.get(api_settings.JTI_CLAIM)
+    if jti is None:
+        return
+    _remember_revocation(jti, token)
+    RevokedToken.objects.bulk_create(
+        [RevokedToken(jti=jti, expires_at=datetime_from_epoch(token['exp']))], ignore_conflicts=True
+    )
+
+
+def claim_token(token):
+    """
+    Revoke ``token`` if it was not already; returns False if it was.
+
+    Used for single-use tokens: of any number of concurrent claims exactly
+    one succeeds.
+    """
+    jti = token.get(api_settings.JTI_CLAIM)
+    if jti is None:
+        return False
+    try:
+        with transaction.atomic():
+            RevokedToken.objects.create(jti=jti, expires_at=datetime_from_epoch(token['exp']))
+    except IntegrityError:
+        return False
+    _remember_revocation(jti, token)
+    return True
+
+
+def is_revoked(token, stored=False):
+    """
+    Whether ``token`` was revoked. The shared cache answers on the hot path;
+    ``stored`` also checks the database, for tokens revoked longer ago than
+    the cache may keep.
+    """
+    jti = token.get(api_settings.JTI_CLAIM)
+    if jti is None:
+        return False
+    if caches[settings.JWT_AUTH_CACHE['ALIAS']].get(_revocation_key(jti)) is not None:
+        return True
+    return stored and RevokedToken.objects.filter(jti=jti).exists()
+
+
+def prune_revoked_tokens(batch_size=5000):
+    """Delete revocations of tokens that have expired; returns how many were deleted."""
+    leeway = api_settings.LEEWAY
+    cutoff = timezone.now() - (leeway if isinstance(leeway, timedelta) else timedelta(seconds=leeway))
+    deleted = 0
+    while True:
+        expired = list(
+            RevokedToken.objects.filter(expires_at__lt=cutoff).values_list('jti', flat=True)[:batch_size]
+        )
+        if not expired:
+            return deleted
+        deleted += RevokedToken.objects.filter(jti__in=expired).delete()[0]
+
+
+class CachedJWTAuthentication(JWTAuthentication):
+    def get_validated_token(self, raw_token):
+        tokens, _ = _caches()
+        key = hashlib.sha256(raw_token).hexdigest()
+        token = tokens.get(key)
+        if token is None:
+            token = super().get_validated_token(raw_token)
+            tokens.set(key, token, expires_at=token['exp'])
+        if is_revoked(token):
+            tokens.delete(key)
+            raise InvalidToken({'detail': 'Token has been revoked', 'code': 'token_not_valid'})
+        return token
+
+    def get_user(self, validated_token):
+        user_id = validated_token.get(api_settings.USER_ID_CLAIM)
+        user, version = self.cached_user(user_id)
+        if user is None:
+            user = super().get_user(validated_token)
+            self.remember_user(user_id, user, version)
+        return user
+
+    async def aget_user(self, validated_token):
+        """Async ``get_user``: cache hits never leave the event loop."""
+        _, users = _caches()
+        user_id = validated_token.get(api_settings.USER_ID_CLAIM)
+        if user_id is None:
+            raise InvalidToken({'detail': 'Token contained no recognizable user identification'})
+        user, version = self.cached_user(user_id)
+        if user is None:
+            try:
+                user = await User.objects.aget(**{api_settings.USER_ID_FIELD: user_id})
+            except User.DoesNotExist:
+                raise AuthenticationFailed('User not found', code='user_not_found')
+            if not user.is_active:
+                raise AuthenticationFailed('User is inactive', code='user_inactive')
+            self.remember_user(user_id, user, version)
+        return user
+
+    def cached_user(self, user_id):
+        """``(user, version)``; the user is None when it must be loaded again."""
+        _, users = _caches()
+        # Read before any load, so a change made meanwhile still invalidates it.
+        version = _user_version(user_id)
+        entry = users.get(user_id)
+        if entry is None or entry[1] != version:
+            return None, version
+        return entry[0], version
+
+    def remember_user(self, user_id, user, version):
+        _, users = _caches()
+        lifetime = api_settings.ACCESS_TOKEN_LIFETIME.total_seconds()
+        users.set(user_id, (user, version), expires_at=time.time() + lifetime)
+
+    async def aauthenticate(self, request):
+        header = self.get_header(request)
+        if header is None:
+            return None
+        raw_token = self.get_raw_token(header)
+        if raw_token is None:
+            return None
+        validated_token = self.get_validated_token(raw_token)
+        return await self.aget_user(validated_token), validated_token
+
+
+class ClaimsUser(TokenUser):
+    """User built from access-token claims, see ``TokenObtainPairWithClaimsSerializer``."""
+
+    @cached_property
+    def email(self):
+        return self.token.get('email', '')
+
+
+class ClaimsJWTAuthentication(CachedJWTAuthentication):
+    """
+    Opt-in (``JWT_STATELESS_USER``) authentication that skips the auth_user
+    lookup for read requests.
+
+    Safe methods get a ``ClaimsUser`` built from the token alone; writes,
+    and tokens issued before the extra claims existed, still load the full
+    ``User`` so model relations and ``is_active`` keep working. With the
+    switch on, deactivating a user takes effect on reads only once their
+    access token expires.
+    """
+
+    def authenticate(self, request):
+        header = self.get_header(request)
+        if header is None:
+            return None
+        raw_token = self.get_raw_token(header)
+        if raw_token is None:
+            return None
+
+        validated_token = self.get_validated_token(raw_token)
+        if self.use_claims(request, validated_token):
+            return ClaimsUser(validated_token), validated_token
+        return self.get_user(validated_token), validated_token
+
+    async def aauthenticate(self, request):
+        header = self.get_header(request)
+        if header is None:
+            return None
+        raw_token = self.get_raw_token(header)
+        if raw_token is None:
+            return None
+
+        validated_token = self.get_validated_token(raw_token)
+        if self.use_claims(request, validated_token):
+            return ClaimsUser(validated_token), validated_token
+        return await self.aget_user(validated_token), validated_token
+
+    def use_claims(self, request, validated_token):
+        return (settings.JWT_STATELESS_USER and request.method in SAFE_METHODS
+                and 'username' in validated_token)
+
+
+class StreamTicket(Token):
+    """
+    Short-lived token for opening one profile's change feed.
+
+    ``access_exp`` carries the expiry of the access token it was minted
+    with, so the stream still ends when that token would have.
+    """
+    token_type = 'stream'
+
+    @property
+    def lifetime(self):
+        return timedelta(seconds=settings.CHANGE_FEED['TICKET_SECONDS'])
+
+    @classmethod
+    def for_profile(cls, user, profile_id, access_token=None):
+        ticket = cls.for_user(user)
+        ticket['profile_id'] = profile_id
+        ticket['access_exp'] = access_token.get('exp') if access_token is not None else None
+        return ticket
+
+
+class StreamTicketAuthentication(CachedJWTAuthentication):
+    """Authenticates a ``StreamTicket`` in the ``ticket`` query parameter."""
+
+    def get_ticket(self, request):
+        raw_ticket = request.query_params.get('ticket')
+        if not raw_ticket:
+            return None
+        try:
+            ticket = StreamTicket(raw_ticket)
+        except TokenError as exc:
+            raise InvalidToken({'detail': str(exc), 'code': 'token_not_valid'})
+        return ticket
+
+    def authenticate(self, request):
+        ticket = self.get_ticket(request)
+        if ticket is None:
+            return None
+        return self.get_user(ticket), ticket
+
+    async def aauthenticate(self, request):
+        ticket = self.get_ticket(request)
+        if ticket is None:
+            return None
+        return await self.aget_user(ticket), ticket
+
+
+def verify_header(header):
+    """
+    Validate the raw ``Authorization`` header value through the shared cache.
+
+    Returns the validated token, or None when the header carries no bearer
+    token. Raises ``InvalidToken`` for bad, expired or revoked tokens.
+    """
+    authentication = CachedJWTAuthentication()
+    raw_token = authentication.get_raw_token(header.encode('iso-8859-1'))
+    if raw_token is None:
+        return None
+    return authentication.get_validated_token(raw_token)
+
+
+@receiver(post_save, sender=User)
+@receiver(post_delete, sender=User)
+def forget_user(sender, instance, **kwargs):
+    user_id = getattr(instance, api_settings.USER_ID_FIELD)
+    _, users = _caches()
+    users.delete(user_id)
+    _bump_user_version(user_id)
+    # Again once committed: another worker may have reloaded the old row meanwhile.
+    transaction.on_commit(lambda: _bump_user_version(user_id))
+
+
+@receiver(setting_changed)
+def reset_auth_caches(setting=None, **kwargs):
+    global _verified_tokens, _users
+    if setting in (None, 'JWT_AUTH_CACHE', 'SIMPLE_JWT'):
+        _verified_tokens = _users = None
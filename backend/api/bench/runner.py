@@ -0,0 +1,188 @@
+# backend/api/bench/runner.py
+"""
+Phased load run over the main API endpoints.
+
+Each phase sends one kind of request for every seeded user (``rounds``
+times) with ``concurrency`` requests in flight, so requests/sec and
+latency are reported per endpoint. Query counts are measured on the
+server side of the request, whichever transport carries it.
+"""
+import json
+import threading
+import time
+import urllib.error
+import urllib.request
+from concurrent.futures import ThreadPoolExecutor
+from wsgiref.simple_server import WSGIRequestHandler
+
+from django.core.servers.basehttp import ThreadedWSGIServer
+from django.core.wsgi import get_wsgi_application
+from django.db import connection
+from django.test import Client
+
+from .seed import PASSWORD
+from .stats import summarize
+
+PHASES = ('register', 'token', 'refresh', 'profiles', 'mylist_get', 'mylist_add', 'mylist_remove')
+QUERY_COUNT_HEADER = 'X-Bench-Queries'
+# Well above any seeded item_id so adds never collide with the seeded list.
+ITEM_ID_BASE = 10_000_000
+
+
+class QueryCounter:
+    def __init__(self):
+        self.count = 0
+
+    def __call__(self, execute, sql, params, many, context):
+        self.count += 1
+        return execute(sql, params, many, context)
+
+
+def parse_body(content):
+    try:
+        return json.loads(content)
+    except ValueError:
+        return None
+
+
+class ClientTransport:
+    """In-process requests through ``django.test.Client``, one client per thread."""
+    name = 'client'
+
+    def __init__(self):
+        self.local = threading.local()
+
+    def request(self, method, path, data=None, token=None, address=None):
+        client = getattr(self.local, 'client', None)
+        if client is None:
+            client = self.local.client = Client()
+        headers = {}
+        if token:
+            headers['Authorization'] = f'Bearer {token}'
+        if address:
+            headers['X-Forwarded-For'] = address
+
+        counter = QueryCounter()
+        with connection.execute_wrapper(counter):
+            response = client.generic(
+                method, path, json.dumps(data) if data is not None else '',
+                content_type='application/json', headers=headers,
+            )
+        return response.status_code, parse_body(response.content), counter.count
+
+    def close(self):
+        pass
+
+
+class _QuietHandler(WSGIRequestHandler):
+    def log_message(self, *args):
+        pass
+
+
+def count_queries(application):
+    """WSGI wrapper that reports the request's query count in a response header."""
+    def wrapped(environ, start_response):
+        counter = QueryCounter()
+        with connection.execute_wrapper(counter):
+            def start(status, headers, exc_info=None):
+                return start_response(status, [*headers, (QUERY_COUNT_HEADER, str(counter.count))], exc_info)
+            return application(environ, start)
+    return wrapped
+
+
+class LiveServerTransport:
+    """Real HTTP requests against a threaded WSGI server on a local port."""
+    name = 'live'
+
+    def __init__(self):
+        self.server = ThreadedWSGIServer(('127.0.0.1', 0), _QuietHandler, allow_reuse_address=False)
+        self.server.set_app(count_queries(get_wsgi_application()))
+        self.url = f'http://127.0.0.1:{self.server.server_address[1]}'
+        threading.Thread(target=self.server.serve_forever, daemon=True).start()
+
+    def request(self, method, path, data=None, token=None, address=None):
+        headers = {'Content-Type': 'application/json', 'Accept': 'application/json'}
+        if token:
+            headers['Authorization'] = f'Bearer {token}'
+        if address:
+            headers['X-Forwarded-For'] = address
+        body = json.dumps(data).encode() if data is not None else None
+        request = urllib.request.Request(self.url + path, data=body, headers=headers, method=method)
+        try:
+            with urllib.request.urlopen(request) as response:
+                status, content, queries = response.status, response.read(), response.headers[QUERY_COUNT_HEADER]
+        except urllib.error.HTTPError as exc:
+            status, content, queries = exc.code, exc.read(), exc.headers[QUERY_COUNT_HEADER]
+        return status, parse_body(content), int(queries or 0)
+
+    def close(self):
+        self.server.shutdown()
+        self.server.server_close()
+
+
+def _requests(phase, user, round_number):
+    """Return ``(method, path, data, expected_status)`` for one request of ``phase``."""
+    item_id = ITEM_ID_BASE + round_number
+    if phase == 'register':
+        username = f"{user['username']}-new{round_number}"
+        return 'POST', '/api/register/', {'username': username, 'password': PASSWORD, 'email': ''}, 201
+    if phase == 'token':
+        return 'POST', '/api/token/', {'username': user['username'], 'password': PASSWORD}, 200
+    if phase == 'refresh':
+        return 'POST', '/api/token/refresh/', {'refresh': user['refresh']}, 200
+    if phase == 'profiles':
+        return 'GET', '/api/profiles/', None, 200
+    if phase == 'mylist_get':
+        return 'GET', f"/api/mylist/?profile_id={user['profile_id']}", None, 200
+    if phase == 'mylist_add':
+        data = {
+            'profile_id': user['profile_id'], 'item_id': item_id,
+            'title': f'Title {item_id}', 'poster_path': f'/poster{item_id}.jpg', 'media_type': 'movie',
+        }
+        return 'POST', '/api/mylist/add/', data, 201
+    if phase == 'mylist_remove':
+        return 'DELETE', f"/api/mylist/remove/{item_id}/?profile_id={user['profile_id']}", None, 200
+    raise ValueError(phase)
+
+
+def run_phase(transport, phase, users, rounds, concurrency):
+    def send(job):
+        user, round_number = job
+        method, path, data, expected = _requests(phase, user, round_number)
+        started = time.perf_counter()
+        status, body, queries = transport.request(
+            method, path, data, token=user.get('token'), address=user['address'],
+        )
+        latency = time.perf_counter() - started
+        if phase in ('token', 'refresh') and status == 200:
+            # Refresh tokens are single use, so every round needs the rotated one.
+            user['token'], user['refresh'] = body['access'], body['refresh']
+        return latency, status == expected, queries
+
+    jobs = [(user, round_number) for round_number in range(rounds) for user in users]
+    started = time.perf_counter()
+    if concurrency > 1:
+        with ThreadPoolExecutor(max_workers=concurrency) as pool:
+            outcomes = list(pool.map(send, jobs))
+    else:
+        outcomes = [send(job) for job in jobs]
+    elapsed = time.perf_counter() - started
+
+    return summarize(
+        [latency for latency, _, _ in outcomes], elapsed,
+        errors=sum(1 for _, ok, _ in outcomes if not ok),
+        queries=[queries for _, _, queries in outcomes],
+    )
+
+
+def run_benchmark(transport, seeded, rounds=1, concurrency=8, phases=PHASES):
+    """Run ``phases`` in order for the users returned by ``seed.seed``."""
+    users = [
+        # A distinct client address per user keeps the anonymous throttle
+        # from rejecting the register and token phases.
+        {'username': username, 'profile_id': profile_ids[0] if profile_ids else None,
+         'address': f'10.{index >> 16 & 255}.{index >> 8 & 255}.{index & 255}',
+         'token': None, 'refresh': None}
+        for index, (username, profile_ids) in enumerate(seeded)
+    ]
+    return {phase: run_phase(transport, phase, users, rounds, concurrency) for phase in phases}
@@ -0,0 +1,54 @@
+# backend/api/bench/seed.py
+from django.contrib.auth.hashers import make_password
+from django.contrib.auth.models import User
+
+from ..models import MovieList, Profile, Title
+
+PASSWORD = 'bench-password'
+
+
+def seed(users, profiles, items, prefix='bench'):
+    """
+    Create ``users`` users with ``profiles`` profiles of ``items`` list items each.
+
+    Everything goes in through ``bulk_create`` and all users share one
+    password hash, so seeding stays cheap at any size. Returns a list of
+    ``(username, [profile_id, ...])`` tuples.
+    """
+    password = make_password(PASSWORD)
+    User.objects.bulk_create(
+        User(username=f'{prefix}{index}', email=f'{prefix}{index}@example.com', password=password)
+        for index in range(users)
+    )
+    seeded = list(User.objects.filter(username__startswith=prefix).order_by('id'))
+
+    Profile.objects.bulk_create(
+        Profile(user=user, name=f'Profile {number}')
+        for user in seeded for number in range(profiles)
+    )
+    profile_ids = {}
+    for profile_id, user_id in Profile.objects.filter(user__in=seeded).order_by('id').values_list('id', 'user_id'):
+        profile_ids.setdefault(user_id, []).append(profile_id)
+
+    Title.objects.bulk_create(
+        (
+            Title(item_id=item_id, media_type='movie', title=f'Title {item_id}', poster_path=f'/poster{item_id}.jpg')
+            for item_id in range(1, items + 1)
+        ),
+        ignore_conflicts=True,
+    )
+    title_ids = dict(
+        Title.objects.filter(media_type='movie', item_id__lte=items).values_list('item_id', 'id')
+    )
+    MovieList.objects.bulk_create(
+        (
+            MovieList(
+                user_id=user_id, profile_id=profile_id, item_id=item_id,
+                title_id=title_ids[item_id], media_type='movie',
+            )
+            for user_id, ids in profile_ids.items() for profile_id in ids
+            for item_id in range(1, items + 1)
+        ),
+        batch_size=1000,
+    )
+    return [(user.username, profile_ids.get(user.id, [])) for user in seeded]
@@ -0,0 +1,28 @@
+# backend/api/bench/stats.py
+import statistics
+
+
+def percentile(sorted_values, fraction):
+    if not sorted_values:
+        return 0.0
+    index = min(len(sorted_values) - 1, max(0, round(fraction * (len(sorted_values) - 1))))
+    return sorted_values[index]
+
+
+def summarize(latencies, elapsed, errors=0, queries=None):
+    """Latency percentiles in milliseconds plus throughput for one run."""
+    values = sorted(latency * 1000 for latency in latencies)
+    summary = {
+        'requests': len(values),
+        'errors': errors,
+        'elapsed_s': round(elapsed, 3),
+        'rps': round(len(values) / elapsed, 1) if elapsed else 0.0,
+        'mean_ms': round(statistics.fmean(values), 2) if values else 0.0,
+        'p50_ms': round(percentile(values, 0.50), 2),
+        'p95_ms': round(percentile(values, 0.95), 2),
+        'p99_ms': round(percentile(values, 0.99), 2),
+    }
+    if queries is not None:
+        summary['queries_mean'] = round(statistics.fmean(queries), 2) if queries else 0.0
+        summary['queries_max'] = max(queries, default=0)
+    return summary
@@ -0,0 +1,17 @@
+# backend/api/bench/tokens.py
+from rest_framework_simplejwt.settings import api_settings
+from rest_framework_simplejwt.tokens import AccessToken
+
+
+def claims_token(user_id, username=None):
+    """
+    Access token for a user that need not exist in the database.
+
+    With ``JWT_STATELESS_USER`` on, read requests authenticate from these
+    claims alone, which keeps auth_user out of upstream-bound load tests.
+    """
+    token = AccessToken()
+    token[api_settings.USER_ID_CLAIM] = user_id
+    token['username'] = username or f'bench{user_id}'
+    token['email'] = ''
+    return str(token)
@@ -0,0 +1,60 @@
+# backend/api/bench/upstream.py
+import json
+import mimetypes
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import urlparse
+
+
+class _Server(ThreadingHTTPServer):
+    daemon_threads = True
+    request_queue_size = 1024
+
+
+class StubUpstream:
+    """
+    Local stand-in for TMDB: records hits per path and can delay or fail.
+
+    Paths ending in a file name from ``images`` are served those bytes, so
+    the stub can stand in for the image CDN too.
+    """
+
+    def __init__(self, delay=0, status=200, results=None, images=None):
+        self.delay = delay
+        self.status = status
+        self.results = results or []
+        self.images = images or {}
+        self.hits = {}
+        self._lock = threading.Lock()
+        stub = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def do_GET(self):
+                path = urlparse(self.path).path.strip('/')
+                with stub._lock:
+                    stub.hits[path] = stub.hits.get(path, 0) + 1
+                    count = stub.hits[path]
+                time.sleep(stub.delay)
+                name = path.rsplit('/', 1)[-1]
+                if name in stub.images:
+                    body, content_type = stub.images[name], mimetypes.guess_type(name)[0]
+                else:
+                    body = json.dumps({'path': path, 'count': count, 'results': stub.results}).encode()
+                    content_type = 'application/json'
+                self.send_response(stub.status)
+                self.send_header('Content-Type', content_type)
+                self.send_header('Content-Length', str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def log_message(self, *args):
+                pass
+
+        self.server = _Server(('127.0.0.1', 0), Handler)
+        self.url = f'http://127.0.0.1:{self.server.server_address[1]}/3/'
+        threading.Thread(target=self.server.serve_forever, daemon=True).start()
+
+    def close(self):
+        self.server.shutdown()
+        self.server.server_close()
@@ -0,0 +1,10 @@
+# backend/api/bench/urls.py
+"""Side-by-side routes used by the load tests; never included in the real URLconf."""
+from django.urls import path
+
+from .. import async_views, views
+
+urlpatterns = [
+    path('wsgi/catalog/<path:tmdb_path>', views.catalog_proxy),
+    path('asgi/catalog/<path:tmdb_path>', async_views.catalog_proxy),
+]
@@ -0,0 +1,149 @@
+# backend/api/browse.py
+"""
+Assembles the whole browse home page in one payload.
+
+Catalog rows are fetched concurrently through the catalog cache (on a
+thread pool for sync views, with asyncio for async ones) and combined
+with the profile's My List. The encoded page is cached per profile, both
+plain and gzipped, until the TTL expires or the profile's list changes.
+"""
+import asyncio
+import gzip
+import json
+import logging
+from concurrent.futures import ThreadPoolExecutor
+
+from django.conf import settings
+from django.core.cache import caches
+from django.core.serializers.json import DjangoJSONEncoder
+from django.db import transaction
+from django.utils import timezone
+
+from . import catalog
+from .models import MovieList
+from .serializers import MovieListSerializer
+
+logger = logging.getLogger(__name__)
+
+ANIME_PARAMS = {
+    'with_genres': '16',
+    'with_keywords': '210024|6075|287501',
+    'sort_by': 'vote_average.desc,popularity.desc',
+    'with_original_language': 'ja',
+    'without_genres': '10762',
+    'adult': 'false',
+}
+
+# Mirrors frontend/my-app/src/requests.js, with duplicate paths listed once.
+BROWSE_ROWS = [
+    ('fetchMovieNowPlaying', 'Now Playing', 'movie/now_playing', {}),
+    ('fetchMoviePopular', 'Popular Movies', 'movie/popular', {}),
+    ('fetchMovieToprated', 'Top Rated Movies', 'movie/top_rated', {}),
+    ('fetchMovieUpcoming', 'Upcoming Movies', 'movie/upcoming', {}),
+    ('fetchAnime', 'Anime', 'discover/tv', ANIME_PARAMS),
+    ('fetchTvShowsAiringToday', 'Airing Today', 'tv/airing_today', {}),
+    ('fetchTvshowsOnTheAir', 'On The Air', 'tv/on_the_air', {'sort_by': 'vote_average.desc'}),
+    ('fetchTvshowsPopular', 'Popular', 'tv/popular', {}),
+    ('fetchTvshowsToprated', 'Top Rated', 'tv/top_rated', {}),
+    ('fetchTrendingToday', 'Trending Today', 'trending/all/day', {}),
+    ('fetchTrendingWeek', 'Trending this Week', 'trending/all/week', {}),
+    ('fetchTrendingMoviesToday', 'Trending Movies Today', 'trending/movie/day', {}),
+    ('fetchTrendingTvShowsToday', 'Trending TvShows Today', 'trending/tv/day', {}),
+    ('fetchTrendingMoviesWeek', 'Trending Movies this Week', 'trending/movie/week', {}),
+    ('fetchTrendingTvShowsWeek', 'Trending TvShows this Week', 'trending/tv/week', {}),
+]
+
+_executor = None
+
+
+def get_executor():
+    global _executor
+    if _executor is None:
+        _executor = ThreadPoolExecutor(
+            max_workers=settings.BROWSE_HOME['MAX_WORKERS'],
+            thread_name_prefix='browse-home',
+        )
+    return _executor
+
+
+def cache_key(profile_id):
+    return f'browse-home:{profile_id}'
+
+
+def invalidate_browse_home(*profile_ids):
+    """Drop the profiles' cached pages once the current transaction commits."""
+    # Sooner, a concurrent request could cache the page from before the change.
+    keys = [cache_key(profile_id) for profile_id in profile_ids]
+    transaction.on_commit(lambda: caches[settings.BROWSE_HOME['ALIAS']].delete_many(keys))
+
+
+def fetch_row(catalog_cache, row):
+    key, title, path, params = row
+    data = {'key': key, 'title': title, 'path': path, 'results': []}
+    try:
+        payload, _ = catalog_cache.get(path, params)
+    except catalog.UpstreamError as exc:
+        logger.warning('Browse row %s failed: %s', path, exc.message)
+        data['error'] = exc.message
+    else:
+        data['results'] = payload.get('results', [])
+    return data
+
+
+async def afetch_row(catalog_cache, row):
+    key, title, path, params = row
+    data = {'key': key, 'title': title, 'path': path, 'results': []}
+    try:
+        payload, _ = await catalog_cache.aget(path, params)
+    except catalog.UpstreamError as exc:
+        logger.warning('Browse row %s failed: %s', path, exc.message)
+        data['error'] = exc.message
+    else:
+        data['results'] = payload.get('results', [])
+    return data
+
+
+def my_list_queryset(profile):
+    return MovieList.objects.filter(profile=profile).select_related('title').order_by('-added_date', '-id')
+
+
+def encode_page(profile, rows, my_list):
+    page = {
+        'profile_id': profile.id,
+        'generated_at': timezone.now(),
+        'rows': rows,
+        'my_list': MovieListSerializer(my_list, many=True).data,
+    }
+    body = json.dumps(page, cls=DjangoJSONEncoder, separators=(',', ':')).encode()
+    return body, gzip.compress(body, compresslevel=6, mtime=0)
+
+
+def get_browse_home(profile):
+    """Return ``(body, gzipped_body)`` for the profile, building it on a miss."""
+    cache = caches[settings.BROWSE_HOME['ALIAS']]
+    key = cache_key(profile.id)
+    cached = cache.get(key)
+    if cached is not None:
+        return cached
+
+    catalog_cache = catalog.get_catalog_cache()
+    rows = list(get_executor().map(lambda row: fetch_row(catalog_cache, row), BROWSE_ROWS))
+    encoded = encode_page(profile, rows, list(my_list_queryset(profile)))
+    cache.set(key, encoded, settings.BROWSE_HOME['TTL'])
+    return encoded
+
+
+async def aget_browse_home(profile):
+    """Async ``get_browse_home``: rows are gathered on the event loop."""
+    cache = caches[settings.BROWSE_HOME['ALIAS']]
+    key = cache_key(profile.id)
+    cached = await cache.aget(key)
+    if cached is not None:
+        return cached
+
+    catalog_cache = catalog.get_catalog_cache()
+    rows = await asyncio.gather(*(afetch_row(catalog_cache, row) for row in BROWSE_ROWS))
+    my_list = [movie async for movie in my_list_queryset(profile)]
+    encoded = encode_page(profile, list(rows), my_list)
+    await cache.aset(key, encoded, settings.BROWSE_HOME['TTL'])
+    return encoded
@@ -0,0 +1,369 @@
+# backend/api/catalog.py
+"""
+Server-side proxy for the TMDB catalog endpoints behind the browse rows.
+
+Responses are cached in two tiers: a small in-process LRU in front of the
+shared Django cache configured by ``CATALOG_CACHE['ALIAS']``. Each entry is
+fresh for the TTL of its path and may then be served stale for
+``STALE_TTL`` seconds while a single background refresh runs. Concurrent
+misses for the same key are coalesced so upstream is hit once.
+
+``get`` serves the sync views from worker threads; ``aget`` serves the
+async views and fetches through a pooled ``httpx.AsyncClient`` per event
+loop, so slow upstream calls do not tie up threads.
+
+Every payload fetched upstream is passed to ``on_fetch``, which feeds the
+local title index (``titles.index_payload``). It writes to the database,
+so it runs after the response is ready: on the ``executor`` thread for
+``get`` (inline without one) and as a background task for ``aget``.
+Failures are logged and counted in ``api_title_index_failures_total``.
+"""
+import asyncio
+import hashlib
+import json
+import logging
+import threading
+import time
+import urllib.error
+import urllib.request
+import weakref
+from concurrent.futures import Future, ThreadPoolExecutor
+from urllib.parse import urlencode, urljoin
+
+import httpx
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.core.cache import caches
+from django.core.signals import setting_changed
+from django.db import close_old_connections
+from django.dispatch import receiver
+
+from . import metrics, titles
+from .lru import LRUCache
+
+logger = logging.getLogger(__name__)
+
+HIT = 'hit'
+STALE = 'stale'
+MISS = 'miss'
+
+
+class UpstreamError(Exception):
+    def __init__(self, status_code, message):
+        super().__init__(message)
+        self.status_code = status_code
+        self.message = message
+
+
+class CatalogCache:
+    def __init__(self, fetch, shared=None, lru_size=512, default_ttl=300,
+                 stale_ttl=3600, ttls=None, clock=time.time, afetch=None, on_fetch=None, executor=None):
+        self.fetch = fetch
+        self.afetch = afetch
+        self.on_fetch = on_fetch
+        self.executor = executor
+        self.shared = shared
+        self.local = LRUCache(lru_size)
+        self.default_ttl = default_ttl
+        self.stale_ttl = stale_ttl
+        # Longest prefix wins, so sort once up front.
+        self.ttls = sorted((ttls or {}).items(), key=lambda item: len(item[0]), reverse=True)
+        self.clock = clock
+        self._inflight = {}
+        self._lock = threading.Lock()
+        # Coalescing state for ``aget``; tasks belong to a single event loop.
+        self._ainflight = weakref.WeakKeyDictionary()
+        self._background = set()
+
+    def ttl_for(self, path):
+        for prefix, ttl in self.ttls:
+            if path.startswith(prefix):
+                return ttl
+        return self.default_ttl
+
+    @staticmethod
+    def make_key(path, params):
+        query = urlencode(sorted(params.items()))
+        digest = hashlib.sha1(f'{path}?{query}'.encode()).hexdigest()
+        return f'catalog:{digest}'
+
+    def get(self, path, params=None):
+        """Return ``(payload, state)`` where state is one of HIT, STALE or MISS."""
+        params = params or {}
+        key = self.make_key(path, params)
+        entry = self._lookup(key)
+        now = self.clock()
+
+        if entry is not None:
+            if now < entry['fresh_until']:
+                return entry['payload'], HIT
+            if now < entry['stale_until']:
+                self._refresh_in_background(key, path, params)
+                return entry['payload'], STALE
+
+        entry = self._load(key, path, params)
+        return entry['payload'], MISS
+
+    async def aget(self, path, params=None):
+        """Async ``get`` that coalesces misses into one task per key and loop."""
+        params = params or {}
+        key = self.make_key(path, params)
+        entry = await self._alookup(key)
+        now = self.clock()
+
+        if entry is not None:
+            if now < entry['fresh_until']:
+                return entry['payload'], HIT
+            if now < entry['stale_until']:
+                self._arefresh_in_background(key, path, params)
+                return entry['payload'], STALE
+
+        entry = await self._aload(key, path, params)
+        return entry['payload'], MISS
+
+    def invalidate(self, path, params=None):
+        key = self.make_key(path, params or {})
+        self.local.delete(key)
+        if self.shared is not None:
+            self.shared.delete(key)
+
+    def _lookup(self, key):
+        entry = self.local.get(key)
+        if entry is None and self.shared is not None:
+            entry = self.shared.get(key)
+            if entry is not None:
+                self.local.set(key, entry)
+        return entry
+
+    def _store(self, key, entry):
+        self.local.set(key, entry)
+        if self.shared is not None:
+            timeout = max(1, int(entry['stale_until'] - self.clock()))
+            self.shared.set(key, entry, timeout)
+
+    def _fetch_and_store(self, key, path, params):
+        payload = self.fetch(path, params)
+        now = self.clock()
+        ttl = self.ttl_for(path)
+        entry = {
+            'payload': payload,
+            'fresh_until': now + ttl,
+            'stale_until': now + ttl + self.stale_ttl,
+        }
+        self._store(key, entry)
+        return entry
+
+    def _load(self, key, path, params):
+        with self._lock:
+            call = self._inflight.get(key)
+            leader = call is None
+            if leader:
+                call = self._inflight[key] = Future()
+
+        if not leader:
+            return call.result()
+
+        try:
+            entry = self._fetch_and_store(key, path, params)
+        except BaseException as exc:
+            call.set_exception(exc)
+            raise
+        else:
+            call.set_result(entry)
+        finally:
+            with self._lock:
+                self._inflight.pop(key, None)
+        # After the waiting callers are released: the hook writes to the database.
+        if self.on_fetch is not None:
+            if self.executor is not None:
+                self.executor.submit(self._notify_in_background, path, entry['payload'])
+            else:
+                self._notify(path, entry['payload'])
+        return entry
+
+    def _notify(self, path, payload):
+        try:
+            self.on_fetch(path, payload)
+        except Exception:
+            metrics.registry.title_index_failures.inc()
+            logger.warning('on_fetch hook failed for %s', path, exc_info=True)
+
+    def _notify_in_background(self, path, payload):
+        # Executor threads see no request signals, so recycle connections here.
+        close_old_connections()
+        try:
+            self._notify(path, payload)
+        finally:
+            close_old_connections()
+
+    async def _alookup(self, key):
+        entry = self.local.get(key)
+        if entry is None and self.shared is not None:
+            entry = await self.shared.aget(key)
+            if entry is not None:
+                self.local.set(key, entry)
+        return entry
+
+    async def _afetch_and_store(self, key, path, params):
+        payload = await self.afetch(path, params)
+        if self.on_fetch is not None:
+            # Off the response path: the hook writes to the database.
+            self._spawn(self._anotify(path, payload))
+        now = self.clock()
+        ttl = self.ttl_for(path)
+        entry = {
+            'payload': payload,
+            'fresh_until': now + ttl,
+            'stale_until': now + ttl + self.stale_ttl,
+        }
+        self.local.set(key, entry)
+        if self.shared is not None:
+            await self.shared.aset(key, entry, max(1, int(entry['stale_until'] - now)))
+        return entry
+
+    def _aload(self, key, path, params):
+        inflight = self._ainflight.setdefault(asyncio.get_running_loop(), {})
+        task = inflight.get(key)
+        if task is None:
+            task = inflight[key] = asyncio.ensure_future(self._afetch_and_store(key, path, params))
+            task.add_done_callback(lambda _: inflight.pop(key, None))
+        # Shielded so one cancelled caller does not cancel the shared fetch.
+        return asyncio.shield(task)
+
+    async def _anotify(self, path, payload):
+        await sync_to_async(self._notify)(path, payload)
+
+    def _spawn(self, coroutine):
+        task = asyncio.ensure_future(coroutine)
+        self._background.add(task)
+        task.add_done_callback(self._background.discard)
+
+    def _arefresh_in_background(self, key, path, params):
+        inflight = self._ainflight.setdefault(asyncio.get_running_loop(), {})
+        if key in inflight:
+            return
+
+        async def refresh():
+            try:
+                await self._aload(key, path, params)
+            except Exception:
+                logger.warning('Background refresh of %s failed', path, exc_info=True)
+
+        self._spawn(refresh())
+
+    def _refresh_in_background(self, key, path, params):
+        with self._lock:
+            if key in self._inflight:
+                return
+
+        def refresh():
+            try:
+                self._load(key, path, params)
+            except Exception:
+                logger.warning('Background refresh of %s failed', path, exc_info=True)
+
+        threading.Thread(target=refresh, daemon=True).start()
+
+
+def fetch_tmdb(path, params):
+    query = dict(params)
+    if settings.TMDB_API_KEY:
+        query['api_key'] = settings.TMDB_API_KEY
+    url = urljoin(settings.TMDB_BASE_URL, path)
+    if query:
+        url = f'{url}?{urlencode(sorted(query.items()))}'
+
+    request = urllib.request.Request(url, headers={'Accept': 'application/json'})
+    try:
+        with urllib.request.urlopen(request, timeout=settings.TMDB_TIMEOUT) as response:
+            return json.loads(response.read())
+    except urllib.error.HTTPError as exc:
+        raise UpstreamError(exc.code, f'Upstream returned {exc.code}') from exc
+    except (urllib.error.URLError, TimeoutError, ValueError) as exc:
+        raise UpstreamError(502, 'Upstream request failed') from exc
+
+
+_async_clients = weakref.WeakKeyDictionary()
+
+
+def get_async_client():
+    """Return the pooled client for the running event loop."""
+    loop = asyncio.get_running_loop()
+    client = _async_clients.get(loop)
+    if client is None:
+        client = _async_clients[loop] = httpx.AsyncClient(
+            timeout=settings.TMDB_TIMEOUT,
+            limits=httpx.Limits(
+                max_connections=settings.TMDB_MAX_CONNECTIONS,
+                max_keepalive_connections=settings.TMDB_MAX_CONNECTIONS,
+            ),
+            headers={'Accept': 'application/json'},
+        )
+    return client
+
+
+async def afetch_tmdb(path, params):
+    query = dict(params)
+    if settings.TMDB_API_KEY:
+        query['api_key'] = settings.TMDB_API_KEY
+
+    try:
+        response = await get_async_client().get(
+            urljoin(settings.TMDB_BASE_URL, path), params=sorted(query.items())
+        )
+    except httpx.HTTPError as exc:
+        raise UpstreamError(502, 'Upstream request failed') from exc
+    if response.status_code >= 400:
+        raise UpstreamError(response.status_code, f'Upstream returned {response.status_code}')
+    try:
+        return response.json()
+    except ValueError as exc:
+        raise UpstreamError(502, 'Upstream request failed') from exc
+
+
+def is_allowed_path(path):
+    if not path or '..' in path or '//' in path:
+        return False
+    return any(path.startswith(prefix) for prefix in settings.CATALOG_CACHE['ALLOWED_PREFIXES'])
+
+
+_index_executor = None
+
+
+def get_index_executor():
+    # One thread: index writes never contend with each other.
+    global _index_executor
+    if _index_executor is None:
+        _index_executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix='title-index')
+    return _index_executor
+
+
+_catalog_cache = None
+_catalog_lock = threading.Lock()
+
+
+def get_catalog_cache():
+    global _catalog_cache
+    if _catalog_cache is None:
+        with _catalog_lock:
+            if _catalog_cache is None:
+                config = settings.CATALOG_CACHE
+                _catalog_cache = CatalogCache(
+                    fetch=fetch_tmdb,
+                    afetch=afetch_tmdb,
+                    on_fetch=titles.index_payload,
+                    executor=get_index_executor() if config['INDEX_IN_BACKGROUND'] else None,
+                    shared=caches[config['ALIAS']],
+                    lru_size=config['LRU_SIZE'],
+                    default_ttl=config['DEFAULT_TTL'],
+                    stale_ttl=config['STALE_TTL'],
+                    ttls=config['TTLS'],
+                )
+    return _catalog_cache
+
+
+@receiver(setting_changed)
+def reset_catalog_cache(setting=None, **kwargs):
+    global _catalog_cache
+    if setting in (None, 'CATALOG_CACHE', 'CACHES', 'TMDB_BASE_URL', 'TMDB_API_KEY'):
+        _catalog_cache = None
@@ -0,0 +1,352 @@
+# backend/api/changefeed.py
+"""
+Per-profile change feed behind ``/api/mylist/events/`` (Server-Sent Events).
+
+The write views publish ``list`` (``{"added": [...], "removed": [...]}``),
+``profile`` (``{"changed": [field, ...]}``) and ``profile_deleted`` events once their
+transaction commits. Every device streaming the profile receives them and
+refetches what changed instead of polling.
+
+A stream starts with a ``ready`` event whose id marks the current position.
+A client that reconnects with ``Last-Event-ID`` gets the events it missed
+from the broker's per-profile history, the last ``HISTORY`` of them. If
+they are no longer all there it gets a single ``reset`` event and should
+refetch everything.
+
+Each connection has a queue of ``QUEUE_SIZE`` events. When a client reads
+too slowly to keep up the queue fills, and its stream is closed rather than
+buffering without bound. ``EventSource`` then reconnects with the last id it
+saw and catches up from the history. Streams also end after ``MAX_SECONDS``,
+or when the access token expires, so that reconnects authenticate again.
+
+Brokers:
+
+``LocalBroker``
+    In-process. Every device of a profile must reach the same process.
+``RedisBroker``
+    History in a Redis stream per profile. Events fan out through one
+    pub/sub subscription per process, so idle connections cost Redis
+    nothing. Needs the ``redis`` package and Redis 7 or later.
+
+Streams are coroutines and need ASGI (``backend/asgi.py``). Under WSGI the
+endpoint answers 501.
+"""
+import asyncio
+import json
+import logging
+import secrets
+import threading
+import time
+from collections import defaultdict, deque, namedtuple
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.core.exceptions import ImproperlyConfigured
+from django.core.signals import setting_changed
+from django.db import transaction
+from django.dispatch import receiver
+from django.utils.module_loading import import_string
+
+from .lru import LRUCache
+
+try:
+    import redis
+except ImportError:  # Only RedisBroker needs it.
+    redis = None
+
+logger = logging.getLogger(__name__)
+
+Event = namedtuple('Event', ['id', 'kind', 'data'])
+
+
+def encode(event):
+    """``event`` as an SSE message."""
+    return f'id: {event.id}\nevent: {event.kind}\ndata: {json.dumps(event.data)}\n\n'.encode()
+
+
+class Subscription:
+    """One stream's bounded queue, fed from any thread."""
+
+    def __init__(self, broker, profile_id, queue_size):
+        self.broker = broker
+        self.profile_id = profile_id
+        self.loop = asyncio.get_running_loop()
+        self.queue = asyncio.Queue(queue_size)
+        self.overflowed = False
+        # Id of the last event handed out; replayed and live events may overlap.
+        self.last_id = None
+
+    def deliver(self, event):
+        try:
+            self.loop.call_soon_threadsafe(self._put, event)
+        except RuntimeError:
+            # The stream's event loop is gone.
+            self.close()
+
+    def _put(self, event):
+        try:
+            self.queue.put_nowait(event)
+        except asyncio.QueueFull:
+            self.overflowed = True
+
+    def accept(self, event):
+        """False for an event this stream has already sent."""
+        if self.last_id is not None and not self.broker.is_after(event.id, self.last_id):
+            return False
+        self.last_id = event.id
+        return True
+
+    async def next(self, timeout):
+        """The next event, or None after ``timeout`` seconds or once the queue overflowed."""
+        while not self.overflowed:
+            try:
+                event = await asyncio.wait_for(self.queue.get(), timeout)
+            except asyncio.TimeoutError:
+                return None
+            if self.accept(event):
+                return event
+        return None
+
+    def close(self):
+        self.broker.unsubscribe(self)
+
+
+class LocalBroker:
+    """
+    In-process pub/sub with a history of the last ``history`` events per profile.
+
+    Ids are ``<token>-<sequence>``, where the token is drawn for each
+    profile's history when it is created. An id from before a restart, or
+    from a history evicted to stay under ``max_profiles``, does not match.
+    """
+
+    def __init__(self, history=100, queue_size=64, max_profiles=10000):
+        self.history = history
+        self.queue_size = queue_size
+        self._histories = LRUCache(max_profiles)
+        self._subscribers = defaultdict(set)
+        self._lock = threading.Lock()
+
+    def _history(self, profile_id):
+        history = self._histories.get(profile_id)
+        if history is None:
+            history = {'token': secrets.token_hex(4), 'sequence': 0, 'events': deque(maxlen=self.history)}
+            self._histories.set(profile_id, history)
+        return history
+
+    @staticmethod
+    def _parse(event_id):
+        token, _, sequence = event_id.rpartition('-')
+        return token, int(sequence) if sequence.isdigit() else None
+
+    def is_after(self, event_id, other_id):
+        token, sequence = self._parse(event_id)
+        other_token, other_sequence = self._parse(other_id)
+        # A new token means the history was recreated and counts from 1 again.
+        return token != other_token or sequence > other_sequence
+
+    def publish(self, profile_id, kind, data):
+        with self._lock:
+            history = self._history(profile_id)
+            history['sequence'] += 1
+            event = Event(f"{history['token']}-{history['sequence']}", kind, data)
+            history['events'].append(event)
+        self.deliver(profile_id, event)
+        return event
+
+    def deliver(self, profile_id, event):
+        with self._lock:
+            subscribers = list(self._subscribers.get(profile_id, ()))
+        for subscription in subscribers:
+            subscription.deliver(event)
+
+    async def subscribe(self, profile_id, last_event_id=None):
+        """``(subscription, first_events)``; the first events are ``ready`` or the missed ones."""
+        subscription = Subscription(self, profile_id, self.queue_size)
+        with self._lock:
+            self._subscribers[profile_id].add(subscription)
+            history = self._history(profile_id)
+            current = Event(f"{history['token']}-{history['sequence']}", 'ready', {})
+            missed = self._missed(history, last_event_id) if last_event_id else None
+        return subscription, self._first_events(subscription, current, last_event_id, missed)
+
+    def _missed(self, history, last_event_id):
+        """The events after ``last_event_id``, or None when some are no longer known."""
+        token, sequence = self._parse(last_event_id)
+        if token != history['token'] or sequence is None or sequence > history['sequence']:
+            return None
+        events = history['events']
+        if events and sequence < self._parse(events[0].id)[1] - 1:
+            return None
+        return [event for event in events if self._parse(event.id)[1] > sequence]
+
+    @staticmethod
+    def _first_events(subscription, current, last_event_id, missed):
+        if not last_event_id:
+            events = [current]
+        elif missed is None:
+            events = [Event(current.id, 'reset', {})]
+        else:
+            events = missed
+        subscription.last_id = missed[-1].id if missed else current.id
+        return events
+
+    def unsubscribe(self, subscription):
+        with self._lock:
+            subscribers = self._subscribers.get(subscription.profile_id)
+            if subscribers is not None:
+                subscribers.discard(subscription)
+                if not subscribers:
+                    del self._subscribers[subscription.profile_id]
+
+    def connections(self):
+        with self._lock:
+            return sum(len(subscribers) for subscribers in self._subscribers.values())
+
+
+class RedisBroker(LocalBroker):
+    """
+    Shared pub/sub: a capped Redis stream per profile holds the history,
+    and one channel carries every event to every process.
+    """
+    channel = 'changefeed'
+
+    def __init__(self, url, history=100, queue_size=64, max_profiles=10000, ttl=24 * 3600):
+        if redis is None:
+            raise ImproperlyConfigured('RedisBroker needs the redis package')
+        super().__init__(history=history, queue_size=queue_size, max_profiles=max_profiles)
+        self.client = redis.Redis.from_url(url, decode_responses=True)
+        self.ttl = ttl
+        self._listener = None
+
+    def _key(self, profile_id):
+        return f'changefeed:{profile_id}'
+
+    @staticmethod
+    def _parse(event_id):
+        try:
+            milliseconds, sequence = event_id.split('-')
+            return int(milliseconds), int(sequence)
+        except ValueError:
+            return None
+
+    def is_after(self, event_id, other_id):
+        return self._parse(event_id) > self._parse(other_id)
+
+    def publish(self, profile_id, kind, data):
+        key = self._key(profile_id)
+        payload = json.dumps(data)
+        pipe = self.client.pipeline()
+        pipe.xadd(key, {'kind': kind, 'data': payload}, maxlen=self.history, approximate=True)
+        pipe.expire(key, self.ttl)
+        event_id = pipe.execute()[0]
+        self.client.publish(self.channel, json.dumps([profile_id, event_id, kind, data]))
+        return Event(event_id, kind, data)
+
+    def _listen(self):
+        while True:
+            try:
+                pubsub = self.client.pubsub(ignore_subscribe_messages=True)
+                pubsub.subscribe(self.channel)
+                for message in pubsub.listen():
+                    profile_id, event_id, kind, data = json.loads(message['data'])
+                    self.deliver(profile_id, Event(event_id, kind, data))
+            except Exception:
+                logger.warning('Change feed subscription failed, retrying', exc_info=True)
+                time.sleep(1)
+
+    def _start_listener(self):
+        if self._listener is not None:
+            return
+        with self._lock:
+            if self._listener is None:
+                self._listener = threading.Thread(target=self._listen, name='changefeed-listener', daemon=True)
+                self._listener.start()
+
+    async def subscribe(self, profile_id, last_event_id=None):
+        self._start_listener()
+        subscription = Subscription(self, profile_id, self.queue_size)
+        with self._lock:
+            self._subscribers[profile_id].add(subscription)
+        try:
+            current, missed = await sync_to_async(self._read, thread_sensitive=False)(profile_id, last_event_id)
+        except Exception:
+            self.unsubscribe(subscription)
+            raise
+        return subscription, self._first_events(subscription, current, last_event_id, missed)
+
+    def _read(self, profile_id, last_event_id):
+        key = self._key(profile_id)
+        newest = self.client.xrevrange(key, count=1)
+        current = Event(newest[0][0] if newest else '0-0', 'ready', {})
+        if not last_event_id:
+            return current, None
+        last = self._parse(last_event_id)
+        if last is None or last > self._parse(current.id):
+            return current, None
+        if last == self._parse(current.id):
+            return current, []
+        # Entries trimmed after the client's last one would be missed.
+        deleted = self.client.xinfo_stream(key).get('max-deleted-entry-id', '0-0')
+        if last < self._parse(deleted):
+            return current, None
+        entries = self.client.xrange(key, min=f'({last_event_id}')
+        return current, [Event(entry_id, fields['kind'], json.loads(fields['data'])) for entry_id, fields in entries]
+
+
+def publish(profile_id, kind, data=None):
+    """Send an event to the profile's streams once the current transaction commits."""
+    def send():
+        try:
+            get_broker().publish(profile_id, kind, data or {})
+        except Exception:
+            # Clients miss a live update, not the change itself.
+            logger.warning('Could not publish %s event for profile %s', kind, profile_id, exc_info=True)
+    transaction.on_commit(send)
+
+
+async def stream(subscription, first_events, lifetime):
+    """The SSE body: ``first_events``, then live ones, with keepalive comments."""
+    config = settings.CHANGE_FEED
+    deadline = time.monotonic() + lifetime
+    try:
+        yield f"retry: {config['RETRY_MS']}\n\n".encode()
+        for event in first_events:
+            yield encode(event)
+        while True:
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                return
+            event = await subscription.next(min(config['KEEPALIVE'], remaining))
+            if event is not None:
+                yield encode(event)
+            elif subscription.overflowed:
+                logger.info('Closing change feed of profile %s: client too slow', subscription.profile_id)
+                return
+            elif remaining > config['KEEPALIVE']:
+                yield b': keepalive\n\n'
+    finally:
+        subscription.close()
+
+
+_broker = None
+_broker_lock = threading.Lock()
+
+
+def get_broker():
+    global _broker
+    if _broker is None:
+        with _broker_lock:
+            if _broker is None:
+                config = settings.CHANGE_FEED
+                _broker = import_string(config['BACKEND'])(
+                    history=config['HISTORY'], queue_size=config['QUEUE_SIZE'], **config['OPTIONS'],
+                )
+    return _broker
+
+
+@receiver(setting_changed)
+def reset_broker(setting=None, **kwargs):
+    global _broker
+    if setting in (None, 'CHANGE_FEED'):
+        _broker = None
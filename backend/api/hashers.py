@@ -0,0 +1,23 @@
+# backend/api/hashers.py
+from django.conf import settings
+from django.contrib.auth.hashers import PBKDF2PasswordHasher, must_update_salt
+
+
+class TunedPBKDF2PasswordHasher(PBKDF2PasswordHasher):
+    """
+    PBKDF2-SHA256 with the work factor from ``PASSWORD_HASH_ITERATIONS``,
+    or Django's own when that is unset.
+
+    It keeps Django's algorithm name, so stored hashes verify unchanged.
+    Hashes with fewer iterations (or from a hasher further down
+    ``PASSWORD_HASHERS``) are re-encoded at the user's next login; ones
+    with more are kept rather than weakened.
+    """
+
+    @property
+    def iterations(self):
+        return settings.PASSWORD_HASH_ITERATIONS or PBKDF2PasswordHasher.iterations
+
+    def must_update(self, encoded):
+        decoded = self.decode(encoded)
+        return decoded['iterations'] < self.iterations or must_update_salt(decoded['salt'], self.salt_entropy)
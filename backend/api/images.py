@@ -0,0 +1,318 @@
+# backend/api/images.py
+"""
+Poster and backdrop proxy with resized variants cached on local disk.
+
+``/api/images/<size>/<name>`` serves the TMDB image ``name`` at ``size``
+(``w342`` for one of ``WIDTHS``, or ``original``), as WebP with
+``?format=webp``. The original is fetched from ``UPSTREAM_URL`` once, and
+each variant is made from it with Pillow on its first request; concurrent
+misses for the same variant are coalesced. Without Pillow every size is
+the original.
+
+Files are content-addressed: a blob is stored under the SHA-256 of its
+bytes, which is also its ETag, and small ref files map (name, size,
+format) to a blob. A blob never changes once written, so responses are
+``immutable``. When the blobs outgrow ``MAX_BYTES`` the least recently
+served are deleted down to ``LOW_WATER`` of it; a ref whose blob is gone
+is a miss.
+
+Blobs go out as ``FileResponse``, which WSGI servers send with
+``sendfile``, or, with ``SENDFILE_HEADER`` (e.g. ``X-Accel-Redirect``), as
+an empty response for the front proxy to fill from ``SENDFILE_PREFIX``.
+"""
+import hashlib
+import io
+import logging
+import math
+import os
+import re
+import tempfile
+import threading
+import time
+import urllib.error
+import urllib.request
+from concurrent.futures import Future
+from pathlib import Path
+from urllib.parse import urljoin
+
+from django.conf import settings
+from django.core.cache import cache
+from django.core.signals import setting_changed
+from django.dispatch import receiver
+from django.http import FileResponse, HttpResponse, JsonResponse
+from django.utils.cache import get_conditional_response
+from django.views.decorators.http import require_safe
+
+from .catalog import UpstreamError
+from .throttling import scoped
+
+try:
+    from PIL import Image
+except ImportError:  # Resizing is optional; originals are still served.
+    Image = None
+
+# Pillow raises OSError subclasses for data it cannot decode, and
+# DecompressionBombError (not an OSError) for oversized dimensions.
+UNREADABLE = (OSError,) if Image is None else (OSError, Image.DecompressionBombError)
+
+logger = logging.getLogger(__name__)
+
+NAME_PATTERN = re.compile(r'^[A-Za-z0-9_-]{1,64}\.(jpg|jpeg|png|webp)$')
+CONTENT_TYPES = {'jpg': 'image/jpeg', 'png': 'image/png', 'webp': 'image/webp'}
+IMMUTABLE = 'public, max-age=31536000, immutable'
+# Serving a blob moves it to the front of the LRU at most this often.
+TOUCH_INTERVAL = 60
+MISSING_TTL = 300
+
+
+class ImageCache:
+    """Content-addressed blobs plus refs under ``root``, bounded by ``max_bytes``."""
+
+    def __init__(self, root, max_bytes, low_water=0.9):
+        self.root = Path(root)
+        self.max_bytes = max_bytes
+        self.low_water = low_water
+        self._size = None
+        self._lock = threading.Lock()
+
+    def blob_path(self, digest, ext):
+        return self.root / 'blobs' / digest[:2] / f'{digest}.{ext}'
+
+    def _ref_path(self, key):
+        digest = hashlib.sha256(key.encode()).hexdigest()
+        return self.root / 'refs' / digest[:2] / digest
+
+    def lookup(self, key):
+        """``(path, digest, ext)`` of the blob stored for ``key``, or None."""
+        try:
+            digest, ext = self._ref_path(key).read_text().split('.')
+            path = self.blob_path(digest, ext)
+            mtime = path.stat().st_mtime
+        except (OSError, ValueError):
+            return None
+        now = time.time()
+        if now - mtime > TOUCH_INTERVAL:
+            try:
+                os.utime(path, (now, now))
+            except OSError:
+                return None
+        return path, digest, ext
+
+    def store(self, key, data, ext):
+        digest = hashlib.sha256(data).hexdigest()
+        path = self.blob_path(digest, ext)
+        if not path.exists():
+            self._write(path, data)
+            self._grow(len(data))
+        self._write(self._ref_path(key), f'{digest}.{ext}'.encode())
+        return path, digest, ext
+
+    @staticmethod
+    def _write(path, data):
+        # Readers never see a partial file: write aside, then rename.
+        path.parent.mkdir(parents=True, exist_ok=True)
+        fd, temporary = tempfile.mkstemp(dir=path.parent, prefix='.tmp-')
+        try:
+            with os.fdopen(fd, 'wb') as handle:
+                handle.write(data)
+            os.replace(temporary, path)
+        except BaseException:
+            os.unlink(temporary)
+            raise
+
+    def _blobs(self):
+        for directory in (self.root / 'blobs').glob('*'):
+            for entry in os.scandir(directory):
+                if entry.is_file() and not entry.name.startswith('.tmp-'):
+                    stat = entry.stat()
+                    yield stat.st_mtime, stat.st_size, entry.path
+
+    def _grow(self, size):
+        with self._lock:
+            if self._size is None:
+                self._size = sum(size for _, size, _ in self._blobs())
+            else:
+                self._size += size
+            if self._size > self.max_bytes:
+                self._evict()
+
+    def _evict(self):
+        # Other processes share the directory, so start from what is on disk.
+        blobs = sorted(self._blobs())
+        total = sum(size for _, size, _ in blobs)
+        target = self.max_bytes * self.low_water
+        for _, size, path in blobs:
+            if total <= target:
+                break
+            try:
+                os.unlink(path)
+            except FileNotFoundError:
+                pass
+            total -= size
+        self._size = total
+
+
+def parse_width(size):
+    """Width in pixels for ``size``, None for ``original``; raises ValueError otherwise."""
+    if size == 'original':
+        return None
+    if size.startswith('w') and size[1:].isdigit() and int(size[1:]) in settings.IMAGE_PROXY['WIDTHS']:
+        return int(size[1:])
+    raise ValueError(size)
+
+
+def fetch_original(name):
+    config = settings.IMAGE_PROXY
+    request = urllib.request.Request(urljoin(config['UPSTREAM_URL'], name), headers={'Accept': 'image/*'})
+    try:
+        with urllib.request.urlopen(request, timeout=settings.TMDB_TIMEOUT) as response:
+            if not response.headers.get_content_type().startswith('image/'):
+                raise UpstreamError(502, 'Upstream did not return an image')
+            data = response.read(config['MAX_SOURCE_BYTES'] + 1)
+    except urllib.error.HTTPError as exc:
+        raise UpstreamError(404 if exc.code == 404 else 502, f'Upstream returned {exc.code}') from exc
+    except (urllib.error.URLError, TimeoutError) as exc:
+        raise UpstreamError(502, 'Upstream request failed') from exc
+    if len(data) > config['MAX_SOURCE_BYTES']:
+        raise UpstreamError(502, 'Upstream image too large')
+    return data
+
+
+def render(data, width, fmt):
+    """Encode ``data`` at ``width`` (None keeps it) as ``fmt`` ('webp' or the source's own format)."""
+    config = settings.IMAGE_PROXY
+    image = Image.open(io.BytesIO(data))
+    if width and image.width > width:
+        height = max(1, round(image.height * width / image.width))
+        # JPEG can decode straight to a fraction of its size.
+        image.draft('RGB', (width, height))
+        image = image.resize((width, height), Image.LANCZOS)
+
+    out = io.BytesIO()
+    if fmt == 'webp':
+        image.save(out, 'WEBP', quality=config['WEBP_QUALITY'], method=4)
+    elif fmt == 'png':
+        image.save(out, 'PNG', optimize=True)
+    else:
+        image.convert('RGB').save(out, 'JPEG', quality=config['JPEG_QUALITY'], optimize=True, progressive=True)
+    return out.getvalue()
+
+
+class ImageProxy:
+    def __init__(self, cache, fetch=fetch_original):
+        self.cache = cache
+        self.fetch = fetch
+        self._inflight = {}
+        self._lock = threading.Lock()
+
+    def get(self, name, width=None, fmt=None):
+        """``(path, digest, ext)`` of ``name`` at ``width`` as ``fmt``, making it if needed."""
+        source_ext = name.rsplit('.', 1)[1].lower().replace('jpeg', 'jpg')
+        if Image is None:
+            width, fmt = None, None
+        fmt = fmt or source_ext
+        if width is None and fmt == source_ext:
+            return self._coalesced(f'{name}:original', lambda: self._original(name, source_ext))
+        return self._coalesced(
+            f'{name}:{width or "original"}:{fmt}',
+            lambda: self._variant(name, source_ext, width, fmt),
+        )
+
+    def _original(self, name, ext):
+        return self.cache.store(f'{name}:original', self.fetch(name), ext)
+
+    def _variant(self, name, source_ext, width, fmt):
+        path, _, _ = self.get(name)
+        data = render(path.read_bytes(), width, fmt)
+        return self.cache.store(f'{name}:{width or "original"}:{fmt}', data, fmt)
+
+    def _coalesced(self, key, make):
+        found = self.cache.lookup(key)
+        if found is not None:
+            return found
+        with self._lock:
+            call = self._inflight.get(key)
+            leader = call is None
+            if leader:
+                call = self._inflight[key] = Future()
+        if not leader:
+            return call.result()
+        try:
+            found = make()
+        except BaseException as exc:
+            call.set_exception(exc)
+            raise
+        else:
+            call.set_result(found)
+            return found
+        finally:
+            with self._lock:
+                self._inflight.pop(key, None)
+
+
+def blob_response(path, digest, ext):
+    config = settings.IMAGE_PROXY
+    if config['SENDFILE_HEADER']:
+        response = HttpResponse(content_type=CONTENT_TYPES[ext])
+        relative = path.relative_to(Path(config['CACHE_DIR'])).as_posix()
+        response[config['SENDFILE_HEADER']] = config['SENDFILE_PREFIX'] + relative
+    else:
+        response = FileResponse(open(path, 'rb'), content_type=CONTENT_TYPES[ext])
+    return response
+
+
+@require_safe
+def image_view(request, size, name):
+    # Anonymous, so limited per address; misses cost an upstream fetch and a resize.
+    throttle = scoped('images')()
+    if not throttle.allow_request(request, None):
+        response = JsonResponse({'error': 'Request was throttled.'}, status=429)
+        response['Retry-After'] = str(math.ceil(throttle.wait()))
+        return response
+
+    try:
+        width = parse_width(size)
+    except ValueError:
+        return JsonResponse({'error': 'Unknown image size'}, status=404)
+    fmt = request.GET.get('format')
+    if not NAME_PATTERN.match(name) or fmt not in (None, 'webp'):
+        return JsonResponse({'error': 'Image not found'}, status=404)
+    if cache.get(f'image-missing:{name}'):
+        return JsonResponse({'error': 'Image not found'}, status=404)
+
+    try:
+        path, digest, ext = get_image_proxy().get(name, width, fmt)
+    except UpstreamError as exc:
+        if exc.status_code == 404:
+            cache.set(f'image-missing:{name}', True, MISSING_TTL)
+        return JsonResponse({'error': exc.message}, status=exc.status_code)
+    except UNREADABLE:
+        logger.warning('Could not render image %s', name, exc_info=True)
+        return JsonResponse({'error': 'Upstream image could not be read'}, status=502)
+
+    etag = f'"{digest}"'
+    response = get_conditional_response(request, etag=etag) or blob_response(path, digest, ext)
+    response['ETag'] = etag
+    response['Cache-Control'] = IMMUTABLE
+    return response
+
+
+_image_proxy = None
+_image_lock = threading.Lock()
+
+
+def get_image_proxy():
+    global _image_proxy
+    if _image_proxy is None:
+        with _image_lock:
+            if _image_proxy is None:
+                config = settings.IMAGE_PROXY
+                _image_proxy = ImageProxy(ImageCache(config['CACHE_DIR'], config['MAX_BYTES'], config['LOW_WATER']))
+    return _image_proxy
+
+
+@receiver(setting_changed)
+def reset_image_proxy(setting=None, **kwargs):
+    global _image_proxy
+    if setting in (None, 'IMAGE_PROXY'):
+        _image_proxy = None
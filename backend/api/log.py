@@ -0,0 +1,119 @@
+# backend/api/log.py
+"""
+Structured, non-blocking logging.
+
+Request threads only tag each record with the current request id and put
+it on a bounded in-memory queue; a ``QueueListener`` thread formats the
+records as JSON lines and writes them out. When the queue is full, records
+are dropped and counted rather than making the request wait.
+"""
+import copy
+import contextvars
+import json
+import logging
+import queue
+from datetime import datetime, timezone
+from logging.handlers import QueueHandler, QueueListener
+
+_request_id = contextvars.ContextVar('api_request_id', default=None)
+
+# Values of these payload keys never reach the logs.
+REDACTED_FIELDS = frozenset({'password', 'avatar', 'preferences', 'token', 'access', 'refresh'})
+
+# Attributes every LogRecord has; anything else was passed through ``extra``.
+_RECORD_ATTRIBUTES = frozenset(vars(logging.LogRecord('', 0, '', 0, '', (), None))) | {'message', 'request_id'}
+
+
+def get_request_id():
+    return _request_id.get()
+
+
+def set_request_id(request_id):
+    """Bind ``request_id`` to the current context; returns a token for ``reset_request_id``."""
+    return _request_id.set(request_id)
+
+
+def reset_request_id(token):
+    _request_id.reset(token)
+
+
+def redact(data):
+    """Copy of a request payload that is safe to log."""
+    try:
+        items = data.items()
+    except AttributeError:
+        return '<unloggable payload>'
+    return {key: '[redacted]' if key in REDACTED_FIELDS else value for key, value in items}
+
+
+class RequestIDFilter(logging.Filter):
+    """Stamps records with the id of the request being handled, in the calling thread."""
+
+    def filter(self, record):
+        request_id = _request_id.get()
+        if request_id is None:
+            # django.request logs 4xx/5xx responses after the middleware
+            # chain (and so the context) has been left.
+            request_id = getattr(getattr(record, 'request', None), 'request_id', None)
+        record.request_id = request_id
+        return True
+
+
+class JSONFormatter(logging.Formatter):
+    def format(self, record):
+        entry = {
+            'time': datetime.fromtimestamp(record.created, tz=timezone.utc).isoformat(),
+            'level': record.levelname,
+            'logger': record.name,
+            'message': record.getMessage(),
+            'request_id': getattr(record, 'request_id', None),
+        }
+        for key, value in vars(record).items():
+            if key not in _RECORD_ATTRIBUTES and not key.startswith('_'):
+                entry[key] = value
+        if record.exc_info:
+            entry['exc_info'] = self.formatException(record.exc_info)
+        if record.stack_info:
+            entry['stack_info'] = self.formatStack(record.stack_info)
+        return json.dumps(entry, default=str)
+
+
+class QueueLogHandler(QueueHandler):
+    """
+    ``QueueHandler`` that owns its listener and a stream handler behind it.
+
+    Formatting happens on the listener thread, so the formatter set on this
+    handler is passed on to the stream handler.
+    """
+
+    def __init__(self, stream=None, maxsize=10000):
+        super().__init__(queue.Queue(maxsize))
+        self.dropped = 0
+        self.target = logging.StreamHandler(stream)
+        self.listener = QueueListener(self.queue, self.target)
+        self.listener.start()
+
+    def setFormatter(self, fmt):
+        super().setFormatter(fmt)
+        self.target.setFormatter(fmt)
+
+    def prepare(self, record):
+        # Merge the arguments now, because they may change after the call
+        # returns, but leave formatting (and tracebacks) to the listener.
+        record = copy.copy(record)
+        record.msg = record.getMessage()
+        record.args = None
+        return record
+
+    def enqueue(self, record):
+        try:
+            self.queue.put_nowait(record)
+        except queue.Full:
+            self.dropped += 1
+
+    def close(self):
+        # logging.shutdown() calls this at exit; stopping drains the queue.
+        if self.listener._thread is not None:
+            self.listener.stop()
+        self.target.close()
+        super().close()
@@ -0,0 +1,69 @@
+# backend/api/logins.py
+"""
+``last_login`` bookkeeping off the token endpoint's response path.
+
+simplejwt's ``UPDATE_LAST_LOGIN`` saves the user on every login. With
+``LOGIN_PIPELINE['DEFER_LAST_LOGIN']`` the login time goes into a
+write-behind buffer (``writebehind``) instead, and one ``bulk_update``
+per flush writes the logins of every user since the last one. The stored
+``last_login`` is then up to ``LAST_LOGIN_FLUSH_INTERVAL`` seconds behind.
+"""
+import threading
+
+from django.conf import settings
+from django.contrib.auth.models import User, update_last_login
+from django.core.signals import setting_changed
+from django.dispatch import receiver
+from django.utils import timezone
+
+from .writebehind import WriteBehindBuffer
+
+
+def write_last_logins(logins):
+    """Store ``(user_id, timestamp)`` pairs; returns the number of users updated."""
+    users = [User(pk=user_id, last_login=timestamp) for user_id, timestamp in logins]
+    # Deleted users match no row and are skipped by the UPDATE.
+    return User.objects.bulk_update(users, ['last_login'], batch_size=500)
+
+
+class LoginBuffer(WriteBehindBuffer):
+    name = 'last-login'
+
+    def __init__(self, flush_interval=10, max_pending=1000, write=write_last_logins):
+        super().__init__(write, flush_interval=flush_interval, max_pending=max_pending)
+
+    def record(self, user):
+        user.last_login = timezone.now()
+        super().record(user.pk, (user.pk, user.last_login))
+
+
+def record_login(user):
+    if settings.LOGIN_PIPELINE['DEFER_LAST_LOGIN']:
+        get_login_buffer().record(user)
+    else:
+        update_last_login(None, user)
+
+
+_login_buffer = None
+_login_lock = threading.Lock()
+
+
+def get_login_buffer():
+    global _login_buffer
+    if _login_buffer is None:
+        with _login_lock:
+            if _login_buffer is None:
+                config = settings.LOGIN_PIPELINE
+                _login_buffer = LoginBuffer(
+                    flush_interval=config['LAST_LOGIN_FLUSH_INTERVAL'],
+                    max_pending=config['MAX_PENDING_LOGINS'],
+                )
+    return _login_buffer
+
+
+@receiver(setting_changed)
+def reset_login_buffer(setting=None, **kwargs):
+    global _login_buffer
+    if setting in (None, 'LOGIN_PIPELINE') and _login_buffer is not None:
+        _login_buffer.close()
+        _login_buffer = None
@@ -0,0 +1,112 @@
+# backend/api/management/commands/bench_api.py
+import json
+import os
+import shutil
+import tempfile
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+from django.test.utils import setup_test_environment, teardown_test_environment
+
+from api import logins
+from api.bench.runner import PHASES, ClientTransport, LiveServerTransport, run_benchmark
+from api.bench.seed import seed
+
+TRANSPORTS = {'client': ClientTransport, 'live': LiveServerTransport}
+
+
+class Command(BaseCommand):
+    help = (
+        'Seed a throwaway test database and measure latency, throughput and query counts for '
+        'register, token, refresh, profiles and My List endpoints. Use --output to save the JSON report '
+        'and --baseline to compare against a saved one.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--users', type=int, default=50)
+        parser.add_argument('--profiles', type=int, default=2, help='Profiles per user')
+        parser.add_argument('--items', type=int, default=100, help='My List items per profile')
+        parser.add_argument('--rounds', type=int, default=1, help='Requests per user and endpoint')
+        parser.add_argument('--concurrency', type=int, default=8)
+        parser.add_argument('--transport', choices=sorted(TRANSPORTS), default='client',
+                            help='"client" runs in-process, "live" goes over HTTP to a local server')
+        parser.add_argument('--json', action='store_true', help='Print the report as JSON')
+        parser.add_argument('--output', help='Write the JSON report to this file')
+        parser.add_argument('--baseline', help='JSON report to compare against')
+        parser.add_argument('--max-regression', type=float, default=20.0,
+                            help='Allowed p95 slowdown against the baseline, in percent')
+
+    def handle(self, *args, **options):
+        if options['users'] < 1 or options['profiles'] < 1:
+            raise CommandError('--users and --profiles must be at least 1.')
+
+        config = {name: options[name] for name in
+                  ('users', 'profiles', 'items', 'rounds', 'concurrency', 'transport')}
+        report = {'config': config, 'results': self.run(config)}
+
+        rendered = json.dumps(report, indent=2, sort_keys=True)
+        if options['output']:
+            with open(options['output'], 'w') as handle:
+                handle.write(rendered + '\n')
+        if options['json']:
+            self.stdout.write(rendered)
+        else:
+            self.write_table(report['results'])
+
+        if options['baseline']:
+            with open(options['baseline']) as handle:
+                baseline = json.load(handle)
+            if baseline.get('config') != config:
+                self.stderr.write('Warning: baseline was recorded with a different configuration.')
+            regressions = self.compare(baseline['results'], report['results'], options['max_regression'])
+            if regressions:
+                raise CommandError('Regressions against baseline:\n' + '\n'.join(regressions))
+            self.stdout.write('No regressions against baseline.')
+
+    def run(self, config):
+        original_name = connection.settings_dict['NAME']
+        workdir = tempfile.mkdtemp(prefix='bench-api-')
+        if connection.vendor == 'sqlite':
+            # A shared in-memory database raises "table is locked" as soon as
+            # two threads write; a file database waits for the lock instead.
+            connection.settings_dict['TEST']['NAME'] = os.path.join(workdir, 'bench.sqlite3')
+        setup_test_environment()
+        connection.creation.create_test_db(verbosity=0, autoclobber=True, serialize=False)
+        try:
+            seeded = seed(config['users'], config['profiles'], config['items'])
+            transport = TRANSPORTS[config['transport']]()
+            try:
+                return run_benchmark(transport, seeded, config['rounds'], config['concurrency'])
+            finally:
+                transport.close()
+                # Buffered last_login writes belong to the throwaway database.
+                logins.reset_login_buffer()
+        finally:
+            connection.creation.destroy_test_db(original_name, verbosity=0)
+            teardown_test_environment()
+            shutil.rmtree(workdir, ignore_errors=True)
+
+    def write_table(self, results):
+        self.stdout.write(f"{'endpoint':<14}{'req':>6}{'err':>5}{'req/s':>9}{'p50 ms':>9}"
+                          f"{'p95 ms':>9}{'p99 ms':>9}{'queries':>9}")
+        for phase in PHASES:
+            stats = results[phase]
+            self.stdout.write(
+                f"{phase:<14}{stats['requests']:>6}{stats['errors']:>5}{stats['rps']:>9}"
+                f"{stats['p50_ms']:>9}{stats['p95_ms']:>9}{stats['p99_ms']:>9}{stats['queries_max']:>9}"
+            )
+
+    def compare(self, baseline, current, max_regression):
+        regressions = []
+        for phase, stats in current.items():
+            before = baseline.get(phase)
+            if before is None:
+                continue
+            limit = before['p95_ms'] * (1 + max_regression / 100)
+            if stats['p95_ms'] > limit:
+                regressions.append(f"{phase}: p95 {before['p95_ms']}ms -> {stats['p95_ms']}ms")
+            if stats['queries_max'] > before['queries_max']:
+                regressions.append(f"{phase}: queries {before['queries_max']} -> {stats['queries_max']}")
+            if stats['errors'] > before['errors']:
+                regressions.append(f"{phase}: errors {before['errors']} -> {stats['errors']}")
+        return regressions
@@ -0,0 +1,27 @@
+# backend/api/management/commands/build_recommendations.py
+import time
+
+from django.core.management.base import BaseCommand
+
+from api import recommendations
+
+
+class Command(BaseCommand):
+    help = (
+        'Precompute item-item neighbors for recommendations from all My List rows. '
+        'With --incremental, only items whose lists changed since the last run are refreshed.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--incremental', action='store_true',
+                            help='Refresh stale items only instead of rebuilding everything')
+        parser.add_argument('--limit', type=int, help='Refresh at most this many stale items')
+
+    def handle(self, *args, **options):
+        started = time.perf_counter()
+        if options['incremental']:
+            refreshed = recommendations.refresh_stale(options['limit'])
+            self.stdout.write(f'Refreshed {refreshed} items in {time.perf_counter() - started:.2f}s')
+        else:
+            stored = recommendations.rebuild()
+            self.stdout.write(f'Stored {stored} neighbors in {time.perf_counter() - started:.2f}s')
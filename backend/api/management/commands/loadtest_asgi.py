@@ -0,0 +1,108 @@
+# backend/api/management/commands/loadtest_asgi.py
+import asyncio
+import json
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from django.core.management.base import BaseCommand
+from django.test import AsyncClient, Client, override_settings
+from django.test.utils import setup_test_environment, teardown_test_environment
+
+from api import catalog
+from api.bench.stats import summarize
+from api.bench.tokens import claims_token
+from api.bench.upstream import StubUpstream
+
+
+class Command(BaseCommand):
+    help = (
+        'Compare WSGI (sync views on a fixed thread pool) with ASGI (coroutine views on one '
+        'event loop) for catalog requests that miss the cache and wait on a slow local upstream. '
+        'Both stacks run in-process through the Django test clients.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--requests', type=int, default=400)
+        parser.add_argument('--concurrency', type=int, default=200,
+                            help='Requests in flight at once in ASGI mode')
+        parser.add_argument('--threads', type=int, default=8,
+                            help='Worker threads in WSGI mode, as with gunicorn --threads')
+        parser.add_argument('--upstream-delay', type=float, default=0.2,
+                            help='Seconds the stub upstream waits before answering')
+        parser.add_argument('--json', action='store_true', help='Print results as JSON')
+
+    def handle(self, *args, **options):
+        total = options['requests']
+        tokens = [claims_token(index) for index in range(total)]
+        upstream = StubUpstream(delay=options['upstream_delay'])
+        setup_test_environment()
+        try:
+            with override_settings(
+                ROOT_URLCONF='api.bench.urls',
+                TMDB_BASE_URL=upstream.url,
+                JWT_STATELESS_USER=True,
+            ):
+                results = {
+                    'wsgi': self.run_wsgi(total, options['threads'], tokens),
+                    'asgi': self.run_asgi(total, options['concurrency'], tokens),
+                }
+        finally:
+            teardown_test_environment()
+            upstream.close()
+            catalog.reset_catalog_cache()
+
+        results['upstream_delay_s'] = options['upstream_delay']
+        if options['json']:
+            self.stdout.write(json.dumps(results, indent=2))
+            return
+        for mode in ('wsgi', 'asgi'):
+            stats = results[mode]
+            self.stdout.write(
+                f"{mode}: {stats['requests']} requests in {stats['elapsed_s']}s "
+                f"({stats['rps']} req/s), p50 {stats['p50_ms']}ms, p95 {stats['p95_ms']}ms, "
+                f"p99 {stats['p99_ms']}ms, errors {stats['errors']}"
+            )
+
+    def run_wsgi(self, total, threads, tokens):
+        local = threading.local()
+
+        def request(index):
+            if not hasattr(local, 'client'):
+                local.client = Client()
+            started = time.perf_counter()
+            response = local.client.get(
+                '/wsgi/catalog/movie/popular', {'page': index},
+                HTTP_AUTHORIZATION=f'Bearer {tokens[index]}',
+            )
+            return time.perf_counter() - started, response.status_code
+
+        started = time.perf_counter()
+        with ThreadPoolExecutor(max_workers=threads) as pool:
+            outcomes = list(pool.map(request, range(total)))
+        return self.summarize(outcomes, time.perf_counter() - started)
+
+    def run_asgi(self, total, concurrency, tokens):
+        async def run():
+            client = AsyncClient()
+            slots = asyncio.Semaphore(concurrency)
+
+            async def request(index):
+                async with slots:
+                    started = time.perf_counter()
+                    # Offset the page so nothing is served from the WSGI run's cache.
+                    response = await client.get(
+                        '/asgi/catalog/movie/popular', {'page': total + index},
+                        headers={'Authorization': f'Bearer {tokens[index]}'},
+                    )
+                    return time.perf_counter() - started, response.status_code
+
+            return await asyncio.gather(*(request(index) for index in range(total)))
+
+        started = time.perf_counter()
+        outcomes = asyncio.run(run())
+        return self.summarize(outcomes, time.perf_counter() - started)
+
+    def summarize(self, outcomes, elapsed):
+        errors = sum(1 for _, status in outcomes if status != 200)
+        return summarize([latency for latency, _ in outcomes], elapsed, errors)
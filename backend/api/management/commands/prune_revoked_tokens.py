@@ -0,0 +1,22 @@
+# backend/api/management/commands/prune_revoked_tokens.py
+import time
+
+from django.core.management.base import BaseCommand
+
+from api import authentication
+
+
+class Command(BaseCommand):
+    help = (
+        'Delete revoked-token rows whose tokens have expired. Expired tokens are rejected '
+        'on their exp claim, so the rows are no longer needed. Run it periodically, e.g. daily.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=5000,
+                            help='Rows deleted per statement')
+
+    def handle(self, *args, **options):
+        started = time.perf_counter()
+        deleted = authentication.prune_revoked_tokens(options['batch_size'])
+        self.stdout.write(f'Deleted {deleted} revoked tokens in {time.perf_counter() - started:.2f}s')
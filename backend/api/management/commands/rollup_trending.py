@@ -0,0 +1,27 @@
+# backend/api/management/commands/rollup_trending.py
+import time
+
+from django.core.management.base import BaseCommand
+
+from api import trending
+
+
+class Command(BaseCommand):
+    help = (
+        'Fold new My List events into the trending buckets and recompute the cached top lists. '
+        'Run it every few minutes.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=10000, help='Events folded per transaction')
+        parser.add_argument('--prune', action='store_true',
+                            help='Also delete expired buckets and rolled-up events')
+
+    def handle(self, *args, **options):
+        started = time.perf_counter()
+        events = trending.rollup(options['batch_size'])
+        trending.refresh_cache()
+        self.stdout.write(f'Rolled up {events} events in {time.perf_counter() - started:.2f}s')
+        if options['prune']:
+            buckets, events = trending.prune()
+            self.stdout.write(f'Pruned {buckets} buckets and {events} events')
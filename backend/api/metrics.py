@@ -0,0 +1,254 @@
+# backend/api/metrics.py
+"""
+In-process request metrics.
+
+``MetricsMiddleware`` samples ``METRICS['SAMPLE_RATE']`` of the requests
+and records per-view wall time, SQL query count and time, serializer time
+and response size into fixed-bucket histograms. Unsampled requests only
+bump a counter, which keeps the overhead low at production load.
+``metrics_view`` serves everything in the Prometheus text format. Each
+worker process keeps its own histograms, so scrape every worker or
+aggregate by instance. It answers 403 until ``METRICS['TOKEN']`` is set.
+"""
+import contextvars
+import random
+import threading
+import time
+from bisect import bisect_left
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction
+from django.conf import settings
+from django.db.backends.signals import connection_created
+from django.dispatch import receiver
+from django.http import HttpResponse
+from django.utils.crypto import constant_time_compare
+
+_current = contextvars.ContextVar('api_request_metrics', default=None)
+
+DURATION_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10)
+QUERY_BUCKETS = (0, 1, 2, 3, 5, 8, 13, 21, 34, 55, 100)
+BYTES_BUCKETS = (256, 1024, 4096, 16384, 65536, 262144, 1048576, 4194304)
+
+
+class RequestRecord:
+    __slots__ = ('queries', 'db_time', 'serializer_time', 'serializer_depth')
+
+    def __init__(self):
+        self.queries = 0
+        self.db_time = 0.0
+        self.serializer_time = 0.0
+        self.serializer_depth = 0
+
+
+def current_record():
+    """The record of the sampled request being handled, or None."""
+    return _current.get()
+
+
+def _escape(value):
+    return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+def _labels(names, values, extra=''):
+    pairs = [f'{name}="{_escape(value)}"' for name, value in zip(names, values)]
+    if extra:
+        pairs.append(extra)
+    return '{' + ','.join(pairs) + '}' if pairs else ''
+
+
+class Counter:
+    def __init__(self, name, documentation, labelnames):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = labelnames
+        self._values = {}
+        self._lock = threading.Lock()
+
+    def inc(self, *labels):
+        with self._lock:
+            self._values[labels] = self._values.get(labels, 0) + 1
+
+    def clear(self):
+        with self._lock:
+            self._values.clear()
+
+    def render(self):
+        lines = [f'# HELP {self.name} {self.documentation}', f'# TYPE {self.name} counter']
+        with self._lock:
+            for labels, value in sorted(self._values.items()):
+                lines.append(f'{self.name}{_labels(self.labelnames, labels)} {value}')
+        return lines
+
+
+class Histogram:
+    def __init__(self, name, documentation, labelnames, buckets):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = labelnames
+        self.buckets = tuple(buckets)
+        # labels -> [per-bucket counts (last one is +Inf), sum]
+        self._series = {}
+        self._lock = threading.Lock()
+
+    def observe(self, value, *labels):
+        index = bisect_left(self.buckets, value)
+        with self._lock:
+            series = self._series.get(labels)
+            if series is None:
+                series = self._series[labels] = [[0] * (len(self.buckets) + 1), 0.0]
+            series[0][index] += 1
+            series[1] += value
+
+    def clear(self):
+        with self._lock:
+            self._series.clear()
+
+    def render(self):
+        lines = [f'# HELP {self.name} {self.documentation}', f'# TYPE {self.name} histogram']
+        with self._lock:
+            for labels, (counts, total) in sorted(self._series.items()):
+                cumulative = 0
+                for bound, count in zip((*self.buckets, '+Inf'), counts):
+                    cumulative += count
+                    le = _labels(self.labelnames, labels, f'le="{bound}"')
+                    lines.append(f'{self.name}_bucket{le} {cumulative}')
+                lines.append(f'{self.name}_sum{_labels(self.labelnames, labels)} {total}')
+                lines.append(f'{self.name}_count{_labels(self.labelnames, labels)} {cumulative}')
+        return lines
+
+
+class Registry:
+    def __init__(self):
+        self.requests = Counter(
+            'api_requests_total', 'Requests handled, sampled or not.', ('view', 'method', 'status'))
+        self.duration = Histogram(
+            'api_request_duration_seconds', 'Wall time of sampled requests.', ('view',), DURATION_BUCKETS)
+        self.queries = Histogram(
+            'api_db_queries', 'SQL queries per sampled request.', ('view',), QUERY_BUCKETS)
+        self.db_duration = Histogram(
+            'api_db_duration_seconds', 'Time spent in SQL per sampled request.', ('view',), DURATION_BUCKETS)
+        self.serializer_duration = Histogram(
+            'api_serializer_duration_seconds', 'Serializer to_representation time per sampled request.',
+            ('view',), DURATION_BUCKETS)
+        self.response_bytes = Histogram(
+            'api_response_bytes', 'Response body size of sampled requests.', ('view',), BYTES_BUCKETS)
+        self.title_index_failures = Counter(
+            'api_title_index_failures_total', 'Catalog payloads the title index failed to store.', ())
+
+    @property
+    def metrics(self):
+        return (self.requests, self.duration, self.queries, self.db_duration,
+                self.serializer_duration, self.response_bytes, self.title_index_failures)
+
+    def clear(self):
+        for metric in self.metrics:
+            metric.clear()
+
+    def render(self):
+        return '\n'.join(line for metric in self.metrics for line in metric.render()) + '\n'
+
+
+registry = Registry()
+
+
+def record_query(execute, sql, params, many, context):
+    record = _current.get()
+    if record is None:
+        return execute(sql, params, many, context)
+    started = time.perf_counter()
+    try:
+        return execute(sql, params, many, context)
+    finally:
+        record.queries += 1
+        record.db_time += time.perf_counter() - started
+
+
+@receiver(connection_created)
+def install_query_hook(sender, connection, **kwargs):
+    if record_query not in connection.execute_wrappers:
+        connection.execute_wrappers.insert(0, record_query)
+
+
+class MetricsMiddleware:
+    """Samples requests into ``registry``; see the module docstring."""
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        self.is_async = iscoroutinefunction(get_response)
+        if self.is_async:
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if self.is_async:
+            return self.__acall__(request)
+        record = self.start()
+        if record is None:
+            response = self.get_response(request)
+        else:
+            token = _current.set(record)
+            started = time.perf_counter()
+            try:
+                response = self.get_response(request)
+            finally:
+                _current.reset(token)
+            self.observe(request, response, record, time.perf_counter() - started)
+        self.count(request, response)
+        return response
+
+    async def __acall__(self, request):
+        record = self.start()
+        if record is None:
+            response = await self.get_response(request)
+        else:
+            # Context variables are copied into sync_to_async threads, so
+            # queries run by the async ORM still land on this record.
+            token = _current.set(record)
+            started = time.perf_counter()
+            try:
+                response = await self.get_response(request)
+            finally:
+                _current.reset(token)
+            self.observe(request, response, record, time.perf_counter() - started)
+        self.count(request, response)
+        return response
+
+    def start(self):
+        config = settings.METRICS
+        if not config['ENABLED'] or random.random() >= config['SAMPLE_RATE']:
+            return None
+        return RequestRecord()
+
+    @staticmethod
+    def view_name(request):
+        match = getattr(request, 'resolver_match', None)
+        return match.view_name if match is not None else 'unmatched'
+
+    def count(self, request, response):
+        if settings.METRICS['ENABLED']:
+            registry.requests.inc(self.view_name(request), request.method, str(response.status_code))
+
+    def observe(self, request, response, record, elapsed):
+        view = self.view_name(request)
+        registry.duration.observe(elapsed, view)
+        registry.queries.observe(record.queries, view)
+        registry.db_duration.observe(record.db_time, view)
+        registry.serializer_duration.observe(record.serializer_time, view)
+        if not response.streaming:
+            registry.response_bytes.observe(len(response.content), view)
+
+        if settings.METRICS['SERVER_TIMING']:
+            response['Server-Timing'] = (
+                f'db;dur={record.db_time * 1000:.2f};desc="{record.queries} queries", '
+                f'ser;dur={record.serializer_time * 1000:.2f}, '
+                f'total;dur={elapsed * 1000:.2f}'
+            )
+
+
+def metrics_view(request):
+    token = settings.METRICS['TOKEN']
+    # Closed until a token is configured; behind a proxy every client can look internal.
+    if not token or not constant_time_compare(request.headers.get('Authorization', ''), f'Bearer {token}'):
+        return HttpResponse(status=403)
+    return HttpResponse(registry.render(), content_type='text/plain; version=0.0.4; charset=utf-8')
@@ -1,35 +1,178 @@
-from django.http import JsonResponse
-from rest_framework_simplejwt.tokens import AccessToken
+import gzip
+import re
+import uuid
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction
 from django.conf import settings
-import jwt
+from django.http import JsonResponse
+from django.utils.cache import patch_vary_headers
+from rest_framework.exceptions import AuthenticationFailed
+from rest_framework_simplejwt.exceptions import InvalidToken
+
+from .authentication import verify_header
+from .log import reset_request_id, set_request_id
+
+try:
+    import brotli
+except ImportError:  # Responses are gzipped only.
+    brotli = None
+
+REQUEST_ID_PATTERN = re.compile(r'^[A-Za-z0-9._-]{1,64}$')
 
 class JWTAuthenticationMiddleware:
+    """
+    Exposes the verified bearer token payload as ``request.user_token_payload``.
+
+    Verification goes through the same cache as ``CachedJWTAuthentication``,
+    so DRF does not verify the token a second time for the same request.
+    """
     def __init__(self, get_response):
         self.get_response = get_response
 
     def __call__(self, request):
         if 'HTTP_AUTHORIZATION' in request.META:
             try:
-                auth_header = request.META['HTTP_AUTHORIZATION']
-                if 'Bearer' in auth_header:
-                    token = auth_header.split(' ')[1]
-                    # Verify token
-                    payload = jwt.decode(
-                        token, 
-                        settings.SECRET_KEY, 
-                        algorithms=['HS256']
-                    )
-                    request.user_token_payload = payload
-            except jwt.ExpiredSignatureError:
+                token = verify_header(request.META['HTTP_AUTHORIZATION'])
+                if token is not None:
+                    request.user_token_payload = token.payload
+            except InvalidToken:
                 return JsonResponse(
-                    {'error': 'Token has expired'}, 
+                    {'error': 'Invalid token'},
                     status=401
                 )
-            except jwt.InvalidTokenError:
+            except AuthenticationFailed:
                 return JsonResponse(
-                    {'error': 'Invalid token'}, 
+                    {'error': 'Invalid authorization header'},
                     status=401
                 )
-        
+
         response = self.get_response(request)
         return response
+
+
+class RequestIDMiddleware:
+    """
+    Gives every request a correlation id for its log records.
+
+    A well-formed incoming ``X-Request-ID`` (e.g. from the load balancer) is
+    kept, otherwise a new one is generated. It is echoed in the response.
+    """
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        self.is_async = iscoroutinefunction(get_response)
+        if self.is_async:
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if self.is_async:
+            return self.__acall__(request)
+        request_id = request.request_id = self.request_id(request)
+        token = set_request_id(request_id)
+        try:
+            response = self.get_response(request)
+        finally:
+            reset_request_id(token)
+        response['X-Request-ID'] = request_id
+        return response
+
+    async def __acall__(self, request):
+        request_id = request.request_id = self.request_id(request)
+        token = set_request_id(request_id)
+        try:
+            response = await self.get_response(request)
+        finally:
+            reset_request_id(token)
+        response['X-Request-ID'] = request_id
+        return response
+
+    @staticmethod
+    def request_id(request):
+        incoming = request.headers.get('X-Request-ID', '')
+        if REQUEST_ID_PATTERN.match(incoming):
+            return incoming
+        return uuid.uuid4().hex
+
+
+# Media types worth compressing; images and the like already are.
+COMPRESSIBLE_TYPES = ('application/json', 'application/javascript', 'text/', 'image/svg+xml')
+
+
+def accepted_encodings(header):
+    """``{coding: q}`` from an ``Accept-Encoding`` header."""
+    accepted = {}
+    for part in header.split(','):
+        coding, _, params = part.partition(';')
+        quality = 1.0
+        for param in params.split(';'):
+            key, _, value = param.partition('=')
+            if key.strip() == 'q':
+                try:
+                    quality = float(value)
+                except ValueError:
+                    quality = 0.0
+        if coding.strip():
+            accepted[coding.strip().lower()] = quality
+    return accepted
+
+
+class CompressionMiddleware:
+    """
+    Compresses responses with brotli (when installed) or gzip.
+
+    Only non-streaming responses of a ``COMPRESSIBLE_TYPES`` type and at
+    least ``RESPONSE_COMPRESSION['MIN_SIZE']`` bytes are compressed;
+    smaller ones fit in a packet or two anyway. Responses that already
+    carry a ``Content-Encoding``, like the browse page, are left alone. As
+    with Django's ``GZipMiddleware``, a strong ETag is made weak because
+    the bytes now depend on the negotiated coding.
+    """
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        self.is_async = iscoroutinefunction(get_response)
+        if self.is_async:
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if self.is_async:
+            return self.__acall__(request)
+        return self.compress(request, self.get_response(request))
+
+    async def __acall__(self, request):
+        return self.compress(request, await self.get_response(request))
+
+    @staticmethod
+    def compress(request, response):
+        config = settings.RESPONSE_COMPRESSION
+        if (
+            response.streaming
+            or response.has_header('Content-Encoding')
+            or not response.get('Content-Type', '').startswith(COMPRESSIBLE_TYPES)
+            or len(response.content) < config['MIN_SIZE']
+        ):
+            return response
+
+        patch_vary_headers(response, ('Accept-Encoding',))
+        accepted = accepted_encodings(request.META.get('HTTP_ACCEPT_ENCODING', ''))
+        fallback = accepted.get('*', 0)
+        if brotli is not None and accepted.get('br', fallback) > 0:
+            coding, content = 'br', brotli.compress(response.content, quality=config['BROTLI_QUALITY'])
+        elif accepted.get('gzip', fallback) > 0:
+            coding, content = 'gzip', gzip.compress(response.content, compresslevel=config['GZIP_LEVEL'], mtime=0)
+        else:
+            return response
+        if len(content) >= len(response.content):
+            return response
+
+        response.content = content
+        response['Content-Length'] = str(len(content))
+        response['Content-Encoding'] = coding
+        etag = response.get('ETag')
+        if etag and etag.startswith('"'):
+            response['ETag'] = 'W/' + etag
+        return response
@@ -0,0 +1,23 @@
+# Generated by Django 5.1.3 on 2026-10-18 12:19
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0005_alter_profile_avatar'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='movielist',
+            index=models.Index(fields=['profile', 'added_date', 'id'], name='movielist_profile_added_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='movielist',
+            index=models.Index(fields=['profile', 'media_type', 'added_date', 'id'], name='movielist_profile_type_idx'),
+        ),
+    ]
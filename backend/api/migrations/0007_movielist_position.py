@@ -0,0 +1,18 @@
+# Generated by Django 5.1.3 on 2026-10-18 12:20
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0006_movielist_keyset_indexes'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='movielist',
+            name='position',
+            field=models.PositiveIntegerField(default=0),
+        ),
+    ]
@@ -0,0 +1,51 @@
+from django.db import migrations
+
+# RFC 7396 merge patch for jsonb, used by api.preferences.apply_patch.
+# plpgsql rather than sql so the function may call itself.
+CREATE_FUNCTION = """
+CREATE OR REPLACE FUNCTION jsonb_merge_patch(target jsonb, patch jsonb) RETURNS jsonb
+LANGUAGE plpgsql IMMUTABLE AS $$
+BEGIN
+    IF patch IS NULL OR jsonb_typeof(patch) <> 'object' THEN
+        RETURN patch;
+    END IF;
+    IF target IS NULL OR jsonb_typeof(target) <> 'object' THEN
+        target := '{}'::jsonb;
+    END IF;
+    RETURN (
+        SELECT coalesce(jsonb_object_agg(entries.key, entries.value), '{}'::jsonb)
+        FROM (
+            SELECT coalesce(p.key, t.key) AS key,
+                   CASE WHEN p.key IS NULL THEN t.value
+                        ELSE jsonb_merge_patch(t.value, p.value) END AS value
+            FROM jsonb_each(target) AS t
+            FULL JOIN jsonb_each(patch) AS p ON t.key = p.key
+        ) AS entries
+        WHERE entries.value <> 'null'::jsonb
+    );
+END;
+$$;
+"""
+
+DROP_FUNCTION = 'DROP FUNCTION IF EXISTS jsonb_merge_patch(jsonb, jsonb);'
+
+
+def create_function(apps, schema_editor):
+    if schema_editor.connection.vendor == 'postgresql':
+        schema_editor.execute(CREATE_FUNCTION)
+
+
+def drop_function(apps, schema_editor):
+    if schema_editor.connection.vendor == 'postgresql':
+        schema_editor.execute(DROP_FUNCTION)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0008_profile_version'),
+    ]
+
+    operations = [
+        migrations.RunPython(create_function, drop_function),
+    ]
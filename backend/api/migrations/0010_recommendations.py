@@ -0,0 +1,38 @@
+# Generated by Django 5.1.3 on 2026-10-18 13:01
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0009_jsonb_merge_patch'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ItemNeighbor',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('item_id', models.IntegerField()),
+                ('neighbor_id', models.IntegerField()),
+                ('score', models.FloatField()),
+            ],
+        ),
+        migrations.CreateModel(
+            name='StaleItem',
+            fields=[
+                ('item_id', models.IntegerField(primary_key=True, serialize=False)),
+            ],
+        ),
+        migrations.AddIndex(
+            model_name='movielist',
+            index=models.Index(fields=['item_id'], name='movielist_item_idx'),
+        ),
+        migrations.AlterUniqueTogether(
+            name='itemneighbor',
+            unique_together={('item_id', 'neighbor_id')},
+        ),
+    ]
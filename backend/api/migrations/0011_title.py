@@ -0,0 +1,29 @@
+# Generated by Django 5.1.3 on 2026-10-18 13:05
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0010_recommendations'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='Title',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('item_id', models.IntegerField()),
+                ('media_type', models.CharField(max_length=16)),
+                ('title', models.CharField(max_length=200)),
+                ('poster_path', models.CharField(blank=True, max_length=200, null=True)),
+                ('release_date', models.DateField(blank=True, null=True)),
+                ('popularity', models.FloatField(default=0)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+            ],
+            options={
+                'unique_together': {('item_id', 'media_type')},
+            },
+        ),
+    ]
@@ -0,0 +1,53 @@
+from django.db import migrations
+
+# Full-text index behind api.titles.search_titles.
+SQLITE_CREATE = [
+    # External-content FTS5 table over api_title.title, with prefix indexes
+    # so autocomplete ("dar*") does not scan the whole term list.
+    "CREATE VIRTUAL TABLE api_title_fts USING fts5("
+    "title, content='api_title', content_rowid='id', "
+    "tokenize='unicode61 remove_diacritics 2', prefix='2 3')",
+    "CREATE TRIGGER api_title_fts_insert AFTER INSERT ON api_title BEGIN "
+    "INSERT INTO api_title_fts(rowid, title) VALUES (new.id, new.title); END",
+    "CREATE TRIGGER api_title_fts_delete AFTER DELETE ON api_title BEGIN "
+    "INSERT INTO api_title_fts(api_title_fts, rowid, title) VALUES ('delete', old.id, old.title); END",
+    "CREATE TRIGGER api_title_fts_update AFTER UPDATE OF title ON api_title BEGIN "
+    "INSERT INTO api_title_fts(api_title_fts, rowid, title) VALUES ('delete', old.id, old.title); "
+    "INSERT INTO api_title_fts(rowid, title) VALUES (new.id, new.title); END",
+    "INSERT INTO api_title_fts(api_title_fts) VALUES ('rebuild')",
+]
+SQLITE_DROP = [
+    'DROP TRIGGER IF EXISTS api_title_fts_update',
+    'DROP TRIGGER IF EXISTS api_title_fts_delete',
+    'DROP TRIGGER IF EXISTS api_title_fts_insert',
+    'DROP TABLE IF EXISTS api_title_fts',
+]
+
+# Expression index matched by the to_tsvector('simple', title) predicate.
+POSTGRES_CREATE = [
+    "CREATE INDEX api_title_search_idx ON api_title USING gin (to_tsvector('simple', title))",
+]
+POSTGRES_DROP = [
+    'DROP INDEX IF EXISTS api_title_search_idx',
+]
+
+
+def run(statements):
+    def operation(apps, schema_editor):
+        for statement in statements.get(schema_editor.connection.vendor, ()):
+            schema_editor.execute(statement, params=None)
+    return operation
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0011_title'),
+    ]
+
+    operations = [
+        migrations.RunPython(
+            run({'sqlite': SQLITE_CREATE, 'postgresql': POSTGRES_CREATE}),
+            run({'sqlite': SQLITE_DROP, 'postgresql': POSTGRES_DROP}),
+        ),
+    ]
@@ -0,0 +1,31 @@
+# Generated by Django 5.1.3 on 2026-10-18 13:20
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0012_title_search_index'),
+    ]
+
+    operations = [
+        # Nullable until 0015 drops them, so that unapplying 0015 can re-add
+        # them to a populated table before 0014 copies the titles back.
+        migrations.AlterField(
+            model_name='movielist',
+            name='poster_path',
+            field=models.CharField(max_length=200, null=True),
+        ),
+        migrations.AlterField(
+            model_name='movielist',
+            name='title',
+            field=models.CharField(max_length=200, null=True),
+        ),
+        migrations.AddField(
+            model_name='movielist',
+            name='title_ref',
+            field=models.ForeignKey(null=True, on_delete=django.db.models.deletion.PROTECT, related_name='+', to='api.title'),
+        ),
+    ]
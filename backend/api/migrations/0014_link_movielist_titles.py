@@ -0,0 +1,86 @@
+"""
+Point every MovieList row at a shared Title, creating titles as needed.
+
+Runs outside a migration-wide transaction, one chunk of rows per
+transaction, so large tables are not locked for the whole backfill and an
+interrupted run resumes where it stopped (rows already linked are skipped).
+"""
+from django.db import migrations, transaction
+
+CHUNK_SIZE = 2000
+
+
+def title_key(item_id, media_type):
+    # Same rule as api.titles.title_key, frozen here for this migration.
+    media_type = (media_type or '').lower()
+    media_type = 'tv' if media_type == 'anime' else media_type
+    return item_id, media_type if media_type in ('movie', 'tv') else 'movie'
+
+
+def link_titles(apps, schema_editor):
+    MovieList = apps.get_model('api', 'MovieList')
+    Title = apps.get_model('api', 'Title')
+    db = schema_editor.connection.alias
+
+    last_id = 0
+    while True:
+        with transaction.atomic(using=db):
+            rows = list(
+                MovieList.objects.using(db)
+                .filter(id__gt=last_id, title_ref__isnull=True)
+                .order_by('id')
+                .only('id', 'item_id', 'media_type', 'title', 'poster_path')[:CHUNK_SIZE]
+            )
+            if not rows:
+                return
+            new = {}
+            for row in rows:
+                key = title_key(row.item_id, row.media_type)
+                new.setdefault(key, Title(
+                    item_id=key[0], media_type=key[1], title=row.title, poster_path=row.poster_path or None,
+                ))
+            Title.objects.using(db).bulk_create(new.values(), ignore_conflicts=True)
+            ids = {
+                (item_id, media_type): pk
+                for pk, item_id, media_type in Title.objects.using(db)
+                .filter(item_id__in={item_id for item_id, _ in new})
+                .values_list('id', 'item_id', 'media_type')
+            }
+            for row in rows:
+                row.title_ref_id = ids[title_key(row.item_id, row.media_type)]
+            MovieList.objects.using(db).bulk_update(rows, ['title_ref'], batch_size=500)
+        last_id = rows[-1].id
+
+
+def copy_titles_back(apps, schema_editor):
+    MovieList = apps.get_model('api', 'MovieList')
+    db = schema_editor.connection.alias
+
+    last_id = 0
+    while True:
+        with transaction.atomic(using=db):
+            rows = list(
+                MovieList.objects.using(db)
+                .filter(id__gt=last_id)
+                .select_related('title_ref')
+                .order_by('id')[:CHUNK_SIZE]
+            )
+            if not rows:
+                return
+            for row in rows:
+                row.title = row.title_ref.title
+                row.poster_path = row.title_ref.poster_path or ''
+            MovieList.objects.using(db).bulk_update(rows, ['title', 'poster_path'], batch_size=500)
+        last_id = rows[-1].id
+
+
+class Migration(migrations.Migration):
+    atomic = False
+
+    dependencies = [
+        ('api', '0013_movielist_title_ref'),
+    ]
+
+    operations = [
+        migrations.RunPython(link_titles, copy_titles_back),
+    ]
@@ -0,0 +1,32 @@
+# Generated by Django 5.1.3 on 2026-10-18 13:20
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0014_link_movielist_titles'),
+    ]
+
+    operations = [
+        migrations.RemoveField(
+            model_name='movielist',
+            name='poster_path',
+        ),
+        migrations.RemoveField(
+            model_name='movielist',
+            name='title',
+        ),
+        migrations.RenameField(
+            model_name='movielist',
+            old_name='title_ref',
+            new_name='title',
+        ),
+        migrations.AlterField(
+            model_name='movielist',
+            name='title',
+            field=models.ForeignKey(on_delete=django.db.models.deletion.PROTECT, to='api.title'),
+        ),
+    ]
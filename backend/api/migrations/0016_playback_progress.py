@@ -0,0 +1,32 @@
+# Generated by Django 5.1.3 on 2026-10-18 13:16
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0015_movielist_drop_title_columns'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='PlaybackProgress',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('item_id', models.IntegerField()),
+                ('media_type', models.CharField(max_length=100, null=True)),
+                ('season', models.PositiveSmallIntegerField(blank=True, null=True)),
+                ('episode', models.PositiveSmallIntegerField(blank=True, null=True)),
+                ('position', models.PositiveIntegerField()),
+                ('duration', models.PositiveIntegerField(blank=True, null=True)),
+                ('updated_at', models.DateTimeField()),
+                ('profile', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='playback_progress', to='api.profile')),
+            ],
+            options={
+                'indexes': [models.Index(fields=['profile', '-updated_at'], name='progress_profile_recent_idx')],
+                'unique_together': {('profile', 'item_id')},
+            },
+        ),
+    ]
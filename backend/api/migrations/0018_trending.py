@@ -0,0 +1,49 @@
+# Generated by Django 5.1.3 on 2026-10-18 13:54
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0017_revoked_token'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='RollupState',
+            fields=[
+                ('name', models.CharField(max_length=50, primary_key=True, serialize=False)),
+                ('last_event_id', models.BigIntegerField(default=0)),
+            ],
+        ),
+        migrations.CreateModel(
+            name='ListEvent',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('profile_id', models.BigIntegerField()),
+                ('item_id', models.IntegerField()),
+                ('media_type', models.CharField(max_length=16)),
+                ('delta', models.SmallIntegerField()),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+            ],
+            options={
+                'indexes': [models.Index(fields=['profile_id', 'item_id'], name='listevent_profile_item_idx'), models.Index(fields=['created_at'], name='listevent_created_idx')],
+            },
+        ),
+        migrations.CreateModel(
+            name='TrendingBucket',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('starts_at', models.DateTimeField()),
+                ('media_type', models.CharField(max_length=16)),
+                ('item_id', models.IntegerField()),
+                ('adds', models.PositiveIntegerField(default=0)),
+                ('removes', models.PositiveIntegerField(default=0)),
+            ],
+            options={
+                'indexes': [models.Index(fields=['media_type', 'starts_at'], name='trending_type_start_idx')],
+                'unique_together': {('starts_at', 'media_type', 'item_id')},
+            },
+        ),
+    ]
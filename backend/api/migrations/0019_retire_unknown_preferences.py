@@ -0,0 +1,151 @@
+"""
+Move the preference keys and values the schema rejects aside.
+
+Preferences were free-form before api.preferences closed the schema, and
+the update endpoints now validate the whole document, so a profile with
+an old key would fail every full update. Rejected entries move to
+``retired_preferences`` with the same nesting instead of being deleted,
+and reversing the migration merges them back. Changed profiles get a new
+version, like any other profile write.
+
+The schema is frozen here as it was when the migration was written; later
+changes to api.preferences do not change what it does. Runs one chunk of
+profiles per transaction.
+"""
+from django.db import migrations, models, transaction
+from django.db.models import F
+from django.utils import timezone
+
+CHUNK_SIZE = 2000
+
+LANGUAGE = {'type': 'string', 'maxLength': 16}
+
+SCHEMA = {
+    'language': LANGUAGE,
+    'audio_language': LANGUAGE,
+    'maturity_rating': {'type': 'string', 'enum': ['all', '7+', '13+', '16+', '18+']},
+    'autoplay_next_episode': {'type': 'boolean'},
+    'autoplay_previews': {'type': 'boolean'},
+    'subtitles': {
+        'type': 'object',
+        'properties': {
+            'enabled': {'type': 'boolean'},
+            'language': LANGUAGE,
+            'size': {'type': 'string', 'enum': ['small', 'medium', 'large']},
+        },
+    },
+    'favorite_genres': {'type': 'array', 'maxItems': 50, 'items': {'type': 'integer', 'minimum': 1}},
+}
+
+TYPES = {'boolean': bool, 'string': str, 'array': list, 'object': dict}
+
+
+def accepts(schema, value):
+    """Whether a scalar or array ``value`` passes ``schema``."""
+    if schema['type'] == 'integer':
+        if not isinstance(value, int) or isinstance(value, bool):
+            return False
+    elif not isinstance(value, TYPES[schema['type']]):
+        return False
+    if 'enum' in schema and value not in schema['enum']:
+        return False
+    if 'maxLength' in schema and len(value) > schema['maxLength']:
+        return False
+    if 'minimum' in schema and value < schema['minimum']:
+        return False
+    if schema['type'] == 'array':
+        return len(value) <= schema['maxItems'] and all(accepts(schema['items'], item) for item in value)
+    return True
+
+
+def split(value, properties=SCHEMA):
+    """``(kept, retired)`` halves of a stored document."""
+    if not isinstance(value, dict):
+        return {}, {'': value}
+    kept, retired = {}, {}
+    for name, item in value.items():
+        schema = properties.get(name)
+        if schema is None:
+            retired[name] = item
+        elif schema['type'] == 'object':
+            if isinstance(item, dict):
+                kept[name], rest = split(item, schema['properties'])
+                if rest:
+                    retired[name] = rest
+            else:
+                retired[name] = item
+        elif accepts(schema, item):
+            kept[name] = item
+        else:
+            retired[name] = item
+    return kept, retired
+
+
+def merge(current, retired):
+    """``current`` with the retired entries put back; current values win."""
+    if '' in retired:
+        # The whole document was not an object.
+        return retired['']
+    merged = dict(retired)
+    for name, item in current.items():
+        if isinstance(item, dict) and isinstance(merged.get(name), dict):
+            merged[name] = merge(item, merged[name])
+        else:
+            merged[name] = item
+    return merged
+
+
+def rewrite(apps, schema_editor, change):
+    Profile = apps.get_model('api', 'Profile')
+    db = schema_editor.connection.alias
+
+    last_id = 0
+    while True:
+        with transaction.atomic(using=db):
+            rows = list(
+                Profile.objects.using(db).filter(id__gt=last_id).order_by('id')
+                .values_list('id', 'preferences', 'retired_preferences')[:CHUNK_SIZE]
+            )
+            if not rows:
+                return
+            for profile_id, stored, retired in rows:
+                fields = change(stored, retired)
+                if fields is not None:
+                    Profile.objects.using(db).filter(id=profile_id).update(
+                        **fields, version=F('version') + 1, updated_at=timezone.now(),
+                    )
+        last_id = rows[-1][0]
+
+
+def retire(apps, schema_editor):
+    def change(stored, retired):
+        kept, rest = split(stored)
+        if not rest:
+            return None
+        return {'preferences': kept, 'retired_preferences': rest}
+    rewrite(apps, schema_editor, change)
+
+
+def restore(apps, schema_editor):
+    def change(stored, retired):
+        if not retired:
+            return None
+        return {'preferences': merge(stored, retired), 'retired_preferences': {}}
+    rewrite(apps, schema_editor, change)
+
+
+class Migration(migrations.Migration):
+    atomic = False
+
+    dependencies = [
+        ('api', '0018_trending'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='profile',
+            name='retired_preferences',
+            field=models.JSONField(blank=True, default=dict, editable=False),
+        ),
+        migrations.RunPython(retire, restore),
+    ]
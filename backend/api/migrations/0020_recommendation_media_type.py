@@ -0,0 +1,44 @@
+"""
+Key item neighbors and stale items on (item_id, media_type).
+
+Both tables only hold derived data, so they are recreated empty rather
+than converted; run ``build_recommendations`` after migrating.
+"""
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0019_retire_unknown_preferences'),
+    ]
+
+    operations = [
+        migrations.DeleteModel(name='ItemNeighbor'),
+        migrations.DeleteModel(name='StaleItem'),
+        migrations.CreateModel(
+            name='ItemNeighbor',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('item_id', models.IntegerField()),
+                ('media_type', models.CharField(max_length=16)),
+                ('neighbor_id', models.IntegerField()),
+                ('neighbor_media_type', models.CharField(max_length=16)),
+                ('score', models.FloatField()),
+            ],
+            options={
+                'unique_together': {('item_id', 'media_type', 'neighbor_id', 'neighbor_media_type')},
+            },
+        ),
+        migrations.CreateModel(
+            name='StaleItem',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('item_id', models.IntegerField()),
+                ('media_type', models.CharField(max_length=16)),
+            ],
+            options={
+                'unique_together': {('item_id', 'media_type')},
+            },
+        ),
+    ]
@@ -0,0 +1,82 @@
+"""
+Keep stored null members that a merge patch does not mention.
+
+The jsonb_merge_patch from 0009 filtered out every null in the result, so
+a patch also dropped keys it never named whose stored value was null.
+RFC 7396, and SQLite's json_patch, only delete the keys the patch itself
+sets to null.
+"""
+from django.db import migrations
+
+CREATE_FUNCTION = """
+CREATE OR REPLACE FUNCTION jsonb_merge_patch(target jsonb, patch jsonb) RETURNS jsonb
+LANGUAGE plpgsql IMMUTABLE AS $$
+BEGIN
+    IF patch IS NULL OR jsonb_typeof(patch) <> 'object' THEN
+        RETURN patch;
+    END IF;
+    IF target IS NULL OR jsonb_typeof(target) <> 'object' THEN
+        target := '{}'::jsonb;
+    END IF;
+    RETURN (
+        SELECT coalesce(jsonb_object_agg(entries.key, entries.value), '{}'::jsonb)
+        FROM (
+            SELECT coalesce(p.key, t.key) AS key,
+                   CASE WHEN p.key IS NULL THEN t.value
+                        ELSE jsonb_merge_patch(t.value, p.value) END AS value,
+                   p.value AS patch_value
+            FROM jsonb_each(target) AS t
+            FULL JOIN jsonb_each(patch) AS p ON t.key = p.key
+        ) AS entries
+        WHERE entries.patch_value IS NULL OR entries.patch_value <> 'null'::jsonb
+    );
+END;
+$$;
+"""
+
+# The 0009 version, for reversing.
+PREVIOUS_FUNCTION = """
+CREATE OR REPLACE FUNCTION jsonb_merge_patch(target jsonb, patch jsonb) RETURNS jsonb
+LANGUAGE plpgsql IMMUTABLE AS $$
+BEGIN
+    IF patch IS NULL OR jsonb_typeof(patch) <> 'object' THEN
+        RETURN patch;
+    END IF;
+    IF target IS NULL OR jsonb_typeof(target) <> 'object' THEN
+        target := '{}'::jsonb;
+    END IF;
+    RETURN (
+        SELECT coalesce(jsonb_object_agg(entries.key, entries.value), '{}'::jsonb)
+        FROM (
+            SELECT coalesce(p.key, t.key) AS key,
+                   CASE WHEN p.key IS NULL THEN t.value
+                        ELSE jsonb_merge_patch(t.value, p.value) END AS value
+            FROM jsonb_each(target) AS t
+            FULL JOIN jsonb_each(patch) AS p ON t.key = p.key
+        ) AS entries
+        WHERE entries.value <> 'null'::jsonb
+    );
+END;
+$$;
+"""
+
+
+def create_function(apps, schema_editor):
+    if schema_editor.connection.vendor == 'postgresql':
+        schema_editor.execute(CREATE_FUNCTION)
+
+
+def restore_function(apps, schema_editor):
+    if schema_editor.connection.vendor == 'postgresql':
+        schema_editor.execute(PREVIOUS_FUNCTION)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0020_recommendation_media_type'),
+    ]
+
+    operations = [
+        migrations.RunPython(create_function, restore_function),
+    ]
@@ -1,18 +1,30 @@
 from django.db import models
 from django.contrib.auth.models import User
+from django.utils import timezone
 
 # Existing MovieList model
 class MovieList(models.Model):
     user = models.ForeignKey(User, on_delete=models.CASCADE)
     profile = models.ForeignKey('Profile', on_delete=models.CASCADE, null=True, blank=True, related_name='movie_lists')
     item_id = models.IntegerField()
-    title = models.CharField(max_length=200)
-    poster_path = models.CharField(max_length=200)
+    # Shared title metadata; each saved row only points at it.
+    title = models.ForeignKey('Title', on_delete=models.PROTECT)
     added_date = models.DateTimeField(auto_now_add=True)
+    # The client's row category (movie, tv or anime), used for routing and
+    # the media_type filter; it is not always the Title's TMDB media type.
     media_type = models.CharField(max_length=100, null=True)
+    # Client-chosen order, set through the batch "reorder" operation.
+    position = models.PositiveIntegerField(default=0)
 
     class Meta:
         unique_together = ('profile', 'item_id')
+        indexes = [
+            # Keyset pagination of a profile's list, newest first.
+            models.Index(fields=['profile', 'added_date', 'id'], name='movielist_profile_added_idx'),
+            models.Index(fields=['profile', 'media_type', 'added_date', 'id'], name='movielist_profile_type_idx'),
+            # Everyone who saved a given title, for recommendations.
+            models.Index(fields=['item_id'], name='movielist_item_idx'),
+        ]
 
 # New Profile model
 class Profile(models.Model):
@@ -21,6 +33,143 @@ class Profile(models.Model):
     avatar = models.CharField(max_length=200, null=True, blank=True)
 
     preferences = models.JSONField(default=dict, blank=True)
+    # Entries the preferences schema rejected when it was closed (migration
+    # 0019), kept rather than deleted. Not exposed through the API.
+    retired_preferences = models.JSONField(default=dict, blank=True, editable=False)
+
+    # Bumped on every write to the profile or its list; used as the ETag
+    # source for conditional GETs.
+    version = models.PositiveBigIntegerField(default=1, editable=False)
+    updated_at = models.DateTimeField(auto_now=True)
 
     def __str__(self):
         return f"{self.name} ({self.user.username})"
+
+    def save(self, *args, **kwargs):
+        bumped = not self._state.adding
+        if bumped:
+            self.version = models.F('version') + 1
+            if kwargs.get('update_fields') is not None:
+                kwargs['update_fields'] = {*kwargs['update_fields'], 'version', 'updated_at'}
+        super().save(*args, **kwargs)
+        if bumped:
+            self.refresh_from_db(fields=['version'])
+
+    @classmethod
+    def touch(cls, *profile_ids):
+        """Bump the version of the given profiles without loading them."""
+        cls.objects.filter(pk__in=profile_ids).update(
+            version=models.F('version') + 1, updated_at=timezone.now()
+        )
+
+
+# Precomputed item-item similarity, see api/recommendations.py
+class ItemNeighbor(models.Model):
+    item_id = models.IntegerField()
+    media_type = models.CharField(max_length=16)
+    neighbor_id = models.IntegerField()
+    neighbor_media_type = models.CharField(max_length=16)
+    score = models.FloatField()
+
+    class Meta:
+        unique_together = ('item_id', 'media_type', 'neighbor_id', 'neighbor_media_type')
+
+
+# Items whose neighbors are out of date since their lists changed.
+class StaleItem(models.Model):
+    item_id = models.IntegerField()
+    media_type = models.CharField(max_length=16)
+
+    class Meta:
+        unique_together = ('item_id', 'media_type')
+
+
+# Title metadata seen through My List and the catalog proxy, searched by
+# /api/search/ (see api/titles.py).
+class Title(models.Model):
+    item_id = models.IntegerField()
+    media_type = models.CharField(max_length=16)
+    title = models.CharField(max_length=200)
+    poster_path = models.CharField(max_length=200, null=True, blank=True)
+    release_date = models.DateField(null=True, blank=True)
+    popularity = models.FloatField(default=0)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        unique_together = ('item_id', 'media_type')
+
+    def __str__(self):
+        return f"{self.title} ({self.media_type} {self.item_id})"
+
+
+# Last reported playback position per profile and title. Written in
+# batches from the buffer in api/progress.py, never per heartbeat.
+class PlaybackProgress(models.Model):
+    profile = models.ForeignKey(Profile, on_delete=models.CASCADE, related_name='playback_progress')
+    item_id = models.IntegerField()
+    media_type = models.CharField(max_length=100, null=True)
+    season = models.PositiveSmallIntegerField(null=True, blank=True)
+    episode = models.PositiveSmallIntegerField(null=True, blank=True)
+    # Seconds.
+    position = models.PositiveIntegerField()
+    duration = models.PositiveIntegerField(null=True, blank=True)
+    # When the player reported the position, not when the row was flushed.
+    updated_at = models.DateTimeField()
+
+    class Meta:
+        unique_together = ('profile', 'item_id')
+        indexes = [
+            # Continue watching: a profile's most recent titles first.
+            models.Index(fields=['profile', '-updated_at'], name='progress_profile_recent_idx'),
+        ]
+
+
+# Refresh and access tokens revoked before they expire, see
+# api/authentication.py. Rows are deleted by `prune_revoked_tokens` once
+# the token has expired anyway.
+class RevokedToken(models.Model):
+    jti = models.CharField(max_length=255, primary_key=True)
+    expires_at = models.DateTimeField(db_index=True)
+
+    def __str__(self):
+        return self.jti
+
+
+# Append-only log of My List adds (delta 1) and removes (delta -1), rolled
+# up into TrendingBucket by `rollup_trending`, see api/trending.py.
+class ListEvent(models.Model):
+    profile_id = models.BigIntegerField()
+    item_id = models.IntegerField()
+    # The Title's media type, movie or tv.
+    media_type = models.CharField(max_length=16)
+    delta = models.SmallIntegerField()
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        indexes = [
+            # The media type of a removed item, from its last add.
+            models.Index(fields=['profile_id', 'item_id'], name='listevent_profile_item_idx'),
+            models.Index(fields=['created_at'], name='listevent_created_idx'),
+        ]
+
+
+# Adds and removes per item and time bucket.
+class TrendingBucket(models.Model):
+    starts_at = models.DateTimeField()
+    media_type = models.CharField(max_length=16)
+    item_id = models.IntegerField()
+    adds = models.PositiveIntegerField(default=0)
+    removes = models.PositiveIntegerField(default=0)
+
+    class Meta:
+        unique_together = ('starts_at', 'media_type', 'item_id')
+        indexes = [
+            # Windowed top-K for one media type.
+            models.Index(fields=['media_type', 'starts_at'], name='trending_type_start_idx'),
+        ]
+
+
+# Progress of the periodic jobs that consume an append-only log.
+class RollupState(models.Model):
+    name = models.CharField(max_length=50, primary_key=True)
+    last_event_id = models.BigIntegerField(default=0)
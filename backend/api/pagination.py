@@ -0,0 +1,100 @@
+# backend/api/pagination.py
+import base64
+import json
+from datetime import datetime
+
+from django.db.models import Q
+from rest_framework.exceptions import ValidationError
+from rest_framework.pagination import BasePagination
+from rest_framework.response import Response
+from rest_framework.utils.urls import replace_query_param
+
+
+class KeysetPagination(BasePagination):
+    """
+    Keyset pagination over a fixed, unique ordering (newest first by default).
+
+    The cursor encodes the ordering values of the last row of the previous
+    page, so every page is a bounded index range scan no matter how deep
+    the client has scrolled.
+    """
+    cursor_query_param = 'cursor'
+    page_size_query_param = 'page_size'
+    page_size = 50
+    max_page_size = 200
+    ordering = ('-added_date', '-id')
+
+    def __init__(self, ordering=None):
+        if ordering is not None:
+            self.ordering = tuple(ordering)
+
+    @property
+    def ordering_fields(self):
+        return [name.lstrip('-') for name in self.ordering]
+
+    def get_page_size(self, request):
+        try:
+            size = int(request.query_params.get(self.page_size_query_param, self.page_size))
+        except ValueError:
+            raise ValidationError({self.page_size_query_param: 'Must be an integer.'})
+        return max(1, min(size, self.max_page_size))
+
+    def encode_cursor(self, row):
+        values = []
+        for name in self.ordering_fields:
+            value = row[name] if isinstance(row, dict) else getattr(row, name)
+            values.append(value.isoformat() if isinstance(value, datetime) else value)
+        return base64.urlsafe_b64encode(json.dumps(values).encode()).decode()
+
+    def decode_cursor(self, cursor, model):
+        try:
+            values = json.loads(base64.urlsafe_b64decode(cursor.encode()))
+            if not isinstance(values, list) or len(values) != len(self.ordering):
+                raise ValueError(cursor)
+            return [
+                model._meta.get_field(name).to_python(value)
+                for name, value in zip(self.ordering_fields, values)
+            ]
+        except Exception:
+            raise ValidationError({self.cursor_query_param: 'Invalid cursor.'})
+
+    def keyset_filter(self, values):
+        # (a, b, c) after (x, y, z)  <=>  a > x  OR  a = x AND b > y  OR  ...
+        condition = Q()
+        for position, name in enumerate(self.ordering):
+            lookup = 'lt' if name.startswith('-') else 'gt'
+            term = Q(**{f'{name.lstrip("-")}__{lookup}': values[position]})
+            for previous in range(position):
+                term &= Q(**{self.ordering_fields[previous]: values[previous]})
+            condition |= term
+        return condition
+
+    def page_queryset(self, queryset, request):
+        self.request = request
+        self.page_size_value = self.get_page_size(request)
+        queryset = queryset.order_by(*self.ordering)
+
+        cursor = request.query_params.get(self.cursor_query_param)
+        if cursor:
+            queryset = queryset.filter(self.keyset_filter(self.decode_cursor(cursor, queryset.model)))
+        return queryset[:self.page_size_value + 1]
+
+    def set_page(self, rows):
+        self.has_next = len(rows) > self.page_size_value
+        self.page = rows[:self.page_size_value]
+        return self.page
+
+    def paginate_queryset(self, queryset, request, view=None):
+        return self.set_page(list(self.page_queryset(queryset, request)))
+
+    async def apaginate_queryset(self, queryset, request, view=None):
+        return self.set_page([row async for row in self.page_queryset(queryset, request)])
+
+    def get_next_link(self):
+        if not self.has_next:
+            return None
+        url = self.request.build_absolute_uri()
+        return replace_query_param(url, self.cursor_query_param, self.encode_cursor(self.page[-1]))
+
+    def get_paginated_response(self, data):
+        return Response({'next': self.get_next_link(), 'results': data})
@@ -0,0 +1,30 @@
+# backend/api/parsers.py
+from django.conf import settings
+from rest_framework.exceptions import ParseError
+from rest_framework.parsers import JSONParser
+
+try:
+    import orjson
+except ImportError:  # Falls back to DRF's json-based parsing.
+    orjson = None
+
+
+class FastJSONParser(JSONParser):
+    """``JSONParser`` decoding with orjson when it is installed."""
+
+    def parse(self, stream, media_type=None, parser_context=None):
+        if orjson is None:
+            return super().parse(stream, media_type, parser_context)
+        encoding = (parser_context or {}).get('encoding', settings.DEFAULT_CHARSET)
+        try:
+            data = stream.read()
+            if encoding.lower().replace('-', '') != 'utf8':
+                data = data.decode(encoding)
+            return orjson.loads(data)
+        except ValueError as exc:
+            raise ParseError(f'JSON parse error - {exc}')
+
+
+class MergePatchParser(FastJSONParser):
+    """JSON merge patch bodies (RFC 7396)."""
+    media_type = 'application/merge-patch+json'
@@ -0,0 +1,232 @@
+# backend/api/preferences.py
+"""
+Typed, size-capped profile preferences updated with JSON merge patches.
+
+``PREFERENCES_SCHEMA`` uses a small subset of JSON Schema (type,
+properties, additionalProperties, enum, maxLength, minimum, maximum,
+items, maxItems). It is compiled once into nested checks: one validator
+for whole documents and one for merge patches, where ``null`` deletes a
+key and nested objects are validated as patches themselves.
+
+``apply_patch`` merges a patch (RFC 7396) into the stored document inside
+a single UPDATE, so a write costs the size of the change on the wire and
+in Python, and the database never hands the blob back. The size cap is
+counted in characters of the database's own JSON text, which is what that
+UPDATE measures; ``encoded_size`` reproduces it for the other checks.
+"""
+import functools
+import json
+
+from django.conf import settings
+from django.db import NotSupportedError, connection, transaction
+from django.db.models import F, Func, JSONField, TextField, Value
+from django.db.models.functions import Cast, Length
+from django.utils import timezone
+
+LANGUAGE = {'type': 'string', 'maxLength': 16}
+
+PREFERENCES_SCHEMA = {
+    'type': 'object',
+    'additionalProperties': False,
+    'properties': {
+        'language': LANGUAGE,
+        'audio_language': LANGUAGE,
+        'maturity_rating': {'type': 'string', 'enum': ['all', '7+', '13+', '16+', '18+']},
+        'autoplay_next_episode': {'type': 'boolean'},
+        'autoplay_previews': {'type': 'boolean'},
+        'subtitles': {
+            'type': 'object',
+            'additionalProperties': False,
+            'properties': {
+                'enabled': {'type': 'boolean'},
+                'language': LANGUAGE,
+                'size': {'type': 'string', 'enum': ['small', 'medium', 'large']},
+            },
+        },
+        'favorite_genres': {
+            'type': 'array',
+            'maxItems': 50,
+            'items': {'type': 'integer', 'minimum': 1},
+        },
+    },
+}
+
+# Vendors whose SQL can merge a patch; others merge in Python under a row lock.
+MERGE_PATCH_FUNCTIONS = {
+    'sqlite': 'json_patch',
+    'mysql': 'JSON_MERGE_PATCH',
+    # Created by migration 0009_jsonb_merge_patch.
+    'postgresql': 'jsonb_merge_patch',
+}
+
+# How each database prints JSON as text. SQLite keeps the compact text it
+# was given, with Django's \u escapes; the others print their own form.
+JSON_TEXT = {
+    'postgresql': {'separators': (', ', ': '), 'ensure_ascii': False},
+    'mysql': {'separators': (', ', ': '), 'ensure_ascii': False},
+}
+
+
+class PreferencesError(ValueError):
+    def __init__(self, path, message):
+        super().__init__(f'{path}: {message}')
+        self.path = path
+        self.message = message
+
+
+_TYPES = {
+    'object': (dict,),
+    'array': (list,),
+    'string': (str,),
+    'boolean': (bool,),
+    'integer': (int,),
+    'number': (int, float),
+}
+
+
+def compile_schema(schema, patch=False):
+    """Return ``check(value, path)`` for ``schema``; it raises ``PreferencesError``."""
+    kind = schema['type']
+    types = _TYPES[kind]
+    checks = []
+
+    if kind == 'object':
+        properties = {
+            name: compile_schema(subschema, patch)
+            for name, subschema in schema.get('properties', {}).items()
+        }
+        closed = not schema.get('additionalProperties', True)
+
+        def check_properties(value, path):
+            for name, item in value.items():
+                if patch and item is None:
+                    continue
+                check = properties.get(name)
+                if check is not None:
+                    check(item, f'{path}.{name}')
+                elif closed:
+                    raise PreferencesError(f'{path}.{name}', 'Unknown preference.')
+        checks.append(check_properties)
+
+    if kind == 'array':
+        item_check = compile_schema(schema['items']) if 'items' in schema else None
+        max_items = schema.get('maxItems')
+
+        def check_items(value, path):
+            if max_items is not None and len(value) > max_items:
+                raise PreferencesError(path, f'At most {max_items} items are allowed.')
+            if item_check is not None:
+                for index, item in enumerate(value):
+                    item_check(item, f'{path}[{index}]')
+        checks.append(check_items)
+
+    if 'enum' in schema:
+        choices = frozenset(schema['enum'])
+
+        def check_enum(value, path):
+            if value not in choices:
+                raise PreferencesError(path, f'Must be one of {", ".join(sorted(choices))}.')
+        checks.append(check_enum)
+
+    if 'maxLength' in schema:
+        max_length = schema['maxLength']
+
+        def check_length(value, path):
+            if len(value) > max_length:
+                raise PreferencesError(path, f'At most {max_length} characters are allowed.')
+        checks.append(check_length)
+
+    if 'minimum' in schema or 'maximum' in schema:
+        low, high = schema.get('minimum'), schema.get('maximum')
+
+        def check_range(value, path):
+            if (low is not None and value < low) or (high is not None and value > high):
+                raise PreferencesError(path, 'Out of range.')
+        checks.append(check_range)
+
+    def check(value, path='preferences'):
+        # bool is an int subclass, but never a valid integer or number here.
+        if not isinstance(value, types) or (kind in ('integer', 'number') and isinstance(value, bool)):
+            raise PreferencesError(path, f'Must be of type {kind}.')
+        for rule in checks:
+            rule(value, path)
+
+    return check
+
+
+@functools.cache
+def get_validator(patch=False):
+    return compile_schema(PREFERENCES_SCHEMA, patch=patch)
+
+
+def encoded_size(value):
+    """Length of ``value`` as the database's JSON text, as ``apply_patch`` measures it."""
+    options = JSON_TEXT.get(connection.vendor, {'separators': (',', ':'), 'ensure_ascii': True})
+    return len(json.dumps(value, **options))
+
+
+def validate_preferences(preferences):
+    """Validate a whole preferences document."""
+    get_validator()(preferences)
+    if encoded_size(preferences) > settings.PREFERENCES_MAX_SIZE:
+        raise PreferencesError('preferences', f'Must be at most {settings.PREFERENCES_MAX_SIZE} characters.')
+
+
+def validate_patch(patch):
+    get_validator(patch=True)(patch)
+    if encoded_size(patch) > settings.PREFERENCES_MAX_SIZE:
+        raise PreferencesError('preferences', f'Must be at most {settings.PREFERENCES_MAX_SIZE} characters.')
+
+
+def merge_patch(target, patch):
+    """RFC 7396 merge in Python, for databases without a SQL equivalent."""
+    if not isinstance(patch, dict):
+        return patch
+    merged = dict(target) if isinstance(target, dict) else {}
+    for key, value in patch.items():
+        if value is None:
+            merged.pop(key, None)
+        else:
+            merged[key] = merge_patch(merged.get(key), value)
+    return merged
+
+
+class MergePatch(Func):
+    """RFC 7396 merge of a patch into a JSON column, evaluated by the database."""
+    arity = 2
+    output_field = JSONField()
+
+    def as_sql(self, compiler, connection, **extra_context):
+        function = MERGE_PATCH_FUNCTIONS.get(connection.vendor)
+        if function is None:
+            raise NotSupportedError(f'JSON merge patch is not supported on {connection.vendor}.')
+        return super().as_sql(compiler, connection, function=function, **extra_context)
+
+
+def apply_patch(queryset, patch):
+    """
+    Merge ``patch`` into the preferences of the profiles in ``queryset``.
+
+    Bumps their version like any other profile write. Returns the number of
+    profiles updated; rows whose merged preferences would exceed
+    ``PREFERENCES_MAX_SIZE`` are left untouched and not counted.
+    """
+    limit = settings.PREFERENCES_MAX_SIZE
+    stamp = {'version': F('version') + 1, 'updated_at': timezone.now()}
+
+    if connection.vendor not in MERGE_PATCH_FUNCTIONS:
+        updated = 0
+        with transaction.atomic():
+            for profile in queryset.select_for_update().only('id', 'preferences'):
+                merged = merge_patch(profile.preferences, patch)
+                if encoded_size(merged) <= limit:
+                    updated += queryset.model.objects.filter(pk=profile.pk).update(preferences=merged, **stamp)
+        return updated
+
+    merged = MergePatch(F('preferences'), Value(patch, output_field=JSONField()))
+    return (
+        queryset
+        .alias(merged_size=Length(Cast(merged, TextField())))
+        .filter(merged_size__lte=limit)
+        .update(preferences=merged, **stamp)
+    )
@@ -0,0 +1,211 @@
+# backend/api/progress.py
+"""
+Playback progress ("Continue watching") with write-behind buffering.
+
+Players report their position every few seconds. ``ProgressBuffer.record``
+keeps the report in a write-behind buffer (``writebehind``) keyed by
+(profile, item), where a later report replaces an earlier one, and mirrors
+it into the shared cache so every worker's continue-watching reads see it
+immediately. The buffer is flushed every ``FLUSH_INTERVAL`` seconds, or as
+soon as ``MAX_PENDING`` keys are waiting, with one upsert per batch: the
+database sees one write per viewer per interval instead of one per
+heartbeat.
+
+The trade-off is durability: reports still buffered when a worker dies
+are lost, which is at most ``FLUSH_INTERVAL`` seconds of progress.
+"""
+import threading
+import time
+
+from django.conf import settings
+from django.core.cache import caches
+from django.core.signals import setting_changed
+from django.db import transaction
+from django.db.models import F
+from django.dispatch import receiver
+from django.utils import timezone
+
+from . import titles
+from .lru import LRUCache
+from .models import PlaybackProgress, Profile, Title
+from .writebehind import WriteBehindBuffer
+
+FIELDS = ('profile_id', 'item_id', 'media_type', 'season', 'episode', 'position', 'duration', 'updated_at')
+
+
+def make_entry(profile_id, item_id, position, media_type=None, season=None, episode=None, duration=None):
+    return {
+        'profile_id': profile_id,
+        'item_id': item_id,
+        'media_type': media_type,
+        'season': season,
+        'episode': episode,
+        'position': int(position),
+        'duration': int(duration) if duration else None,
+        'updated_at': timezone.now(),
+    }
+
+
+def is_finished(entry):
+    duration = entry['duration']
+    return bool(duration) and entry['position'] >= duration * settings.PLAYBACK_PROGRESS['FINISHED_RATIO']
+
+
+def _newest(*entries):
+    return max((entry for entry in entries if entry is not None), key=lambda entry: entry['updated_at'])
+
+
+def write_progress(entries):
+    """
+    Upsert buffered entries; returns the number of rows written.
+
+    Entries for deleted profiles are dropped, and so are entries older than
+    the stored row, which another worker may have flushed in the meantime.
+    """
+    entries = list(entries)
+    with transaction.atomic():
+        live = set(
+            Profile.objects.filter(id__in={entry['profile_id'] for entry in entries}).values_list('id', flat=True)
+        )
+        stored = {
+            (profile_id, item_id): updated_at
+            for profile_id, item_id, updated_at in PlaybackProgress.objects.filter(
+                profile_id__in=live, item_id__in={entry['item_id'] for entry in entries}
+            ).values_list('profile_id', 'item_id', 'updated_at')
+        }
+        rows = [
+            PlaybackProgress(**entry) for entry in entries
+            if entry['profile_id'] in live
+            and stored.get((entry['profile_id'], entry['item_id']), entry['updated_at']) <= entry['updated_at']
+        ]
+        PlaybackProgress.objects.bulk_create(
+            rows,
+            update_conflicts=True,
+            unique_fields=['profile', 'item_id'],
+            update_fields=['media_type', 'season', 'episode', 'position', 'duration', 'updated_at'],
+            batch_size=500,
+        )
+    return len(rows)
+
+
+class ProgressBuffer(WriteBehindBuffer):
+    """Coalesces progress reports per (profile, item) and writes them in batches."""
+    name = 'progress'
+
+    def __init__(self, shared=None, flush_interval=5, max_pending=5000, shared_ttl=600, write=write_progress):
+        super().__init__(write, flush_interval=flush_interval, max_pending=max_pending)
+        self.shared = shared
+        self.shared_ttl = shared_ttl
+
+    def record(self, entry):
+        super().record((entry['profile_id'], entry['item_id']), entry)
+        self._mirror(entry)
+
+    def pending(self, profile_id):
+        """Buffered entries of a profile from every worker, by item id."""
+        entries = {item_id: entry for (owner, item_id), entry in self.items() if owner == profile_id}
+        if self.shared is not None:
+            for item_id, entry in (self.shared.get(self._shared_key(profile_id)) or {}).items():
+                entries[item_id] = _newest(entries.get(item_id), entry)
+        return entries
+
+    @staticmethod
+    def _shared_key(profile_id):
+        return f'progress:{profile_id}'
+
+    def _mirror(self, entry):
+        if self.shared is None:
+            return
+        # Read-modify-write: a concurrent report for the same profile on
+        # another worker may drop this one from the mirror, but it is still
+        # visible from this worker's buffer and in the database after the
+        # next flush.
+        key = self._shared_key(entry['profile_id'])
+        entries = self.shared.get(key) or {}
+        entries[entry['item_id']] = entry
+        self.shared.set(key, entries, self.shared_ttl)
+
+
+def continue_watching(profile_id, limit=20):
+    """A profile's unfinished titles, most recently watched first, including buffered reports."""
+    pending = get_progress_buffer().pending(profile_id)
+    ratio = settings.PLAYBACK_PROGRESS['FINISHED_RATIO']
+    stored = (
+        PlaybackProgress.objects
+        .filter(profile_id=profile_id)
+        .exclude(duration__gt=0, position__gte=F('duration') * ratio)
+        .order_by('-updated_at')
+        .values(*FIELDS)
+    )
+    # Buffered reports can replace or finish stored rows, so read that many more.
+    entries = {row['item_id']: row for row in stored[:limit + len(pending)]}
+    for item_id, entry in pending.items():
+        entries[item_id] = _newest(entries.get(item_id), entry)
+
+    recent = sorted(
+        (entry for entry in entries.values() if not is_finished(entry)),
+        key=lambda entry: entry['updated_at'], reverse=True,
+    )[:limit]
+
+    known = {
+        (title.item_id, title.media_type): title
+        for title in Title.objects.filter(item_id__in=[entry['item_id'] for entry in recent])
+        .only('item_id', 'media_type', 'title', 'poster_path')
+    }
+    results = []
+    for entry in recent:
+        title = known.get(titles.title_key(entry['item_id'], entry['media_type']))
+        results.append({
+            'item_id': entry['item_id'],
+            'media_type': entry['media_type'],
+            'season': entry['season'],
+            'episode': entry['episode'],
+            'position': entry['position'],
+            'duration': entry['duration'],
+            'updated_at': entry['updated_at'].isoformat(),
+            'title': title.title if title else None,
+            'poster_path': title.poster_path if title else None,
+        })
+    return results
+
+
+# Heartbeats check profile ownership here rather than in the database.
+OWNER_TTL = 300
+_owners = LRUCache(10000)
+
+
+def owns_profile(user_id, profile_id):
+    key = (user_id, profile_id)
+    if _owners.get(key):
+        return True
+    owned = Profile.objects.filter(id=profile_id, user_id=user_id).exists()
+    if owned:
+        _owners.set(key, True, expires_at=time.time() + OWNER_TTL)
+    return owned
+
+
+_progress_buffer = None
+_progress_lock = threading.Lock()
+
+
+def get_progress_buffer():
+    global _progress_buffer
+    if _progress_buffer is None:
+        with _progress_lock:
+            if _progress_buffer is None:
+                config = settings.PLAYBACK_PROGRESS
+                _progress_buffer = ProgressBuffer(
+                    shared=caches[config['CACHE_ALIAS']],
+                    flush_interval=config['FLUSH_INTERVAL'],
+                    max_pending=config['MAX_PENDING'],
+                    shared_ttl=config['SHARED_TTL'],
+                )
+    return _progress_buffer
+
+
+@receiver(setting_changed)
+def reset_progress_buffer(setting=None, **kwargs):
+    global _progress_buffer
+    if setting in (None, 'PLAYBACK_PROGRESS', 'CACHES') and _progress_buffer is not None:
+        _progress_buffer.close()
+        _progress_buffer = None
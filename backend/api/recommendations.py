@@ -0,0 +1,247 @@
+# backend/api/recommendations.py
+"""
+"Because you added X" recommendations from My List co-occurrence.
+
+An item is a title, keyed by ``(item_id, media_type)`` like ``Title``:
+TMDB numbers movies and shows separately. Every saved (profile, item)
+pair is a 1 in a profile x item matrix. Two items are similar when the
+same profiles saved both, scored by cosine similarity of their columns:
+co-occurrences / sqrt(saves(a) * saves(b)). ``rebuild`` computes this
+for all items with NumPy, a block of items at a time, and keeps the top
+``NEIGHBORS`` per item in ``ItemNeighbor``. Co-occurrences are counted
+sparsely, so a block needs memory for the pairs its items actually form,
+not for a row per item of the catalog.
+
+List changes mark the touched items stale; ``refresh_stale`` recomputes
+just those rows with a few aggregate queries per item. Items that merely
+co-occur with a changed item are caught up by the next full rebuild.
+
+A profile's recommendations are the summed scores of the neighbors of
+everything on its list, minus what is already there. They are cached per
+profile version.
+"""
+from itertools import chain
+
+import numpy as np
+from django.conf import settings
+from django.core.cache import caches
+from django.db import transaction
+from django.db.models import Count, Exists, OuterRef, Subquery, Sum
+
+from .models import ItemNeighbor, MovieList, StaleItem, Title
+from .titles import MEDIA_TYPES
+
+
+def top_neighbors(profile_ids, item_ids, k, min_support=1, block_size=1024):
+    """
+    Yield ``(item_id, neighbor_id, score)`` for the ``k`` most similar items of each item.
+
+    ``profile_ids`` and ``item_ids`` are parallel arrays of saved pairs.
+    Pairs with fewer than ``min_support`` co-occurrences are ignored.
+    """
+    item_ids = np.asarray(item_ids, dtype=np.int64)
+    if not len(item_ids):
+        return
+    items, item_index = np.unique(item_ids, return_inverse=True)
+    _, profile_index = np.unique(np.asarray(profile_ids, dtype=np.int64), return_inverse=True)
+    n_items = len(items)
+    k = min(k, n_items - 1)
+    if k <= 0:
+        return
+
+    # Group the pairs by profile (CSR layout): the items of profile p are
+    # item_index[indptr[p]:indptr[p + 1]].
+    order = np.argsort(profile_index, kind='stable')
+    profile_index, item_index = profile_index[order], item_index[order]
+    indptr = np.zeros(profile_index[-1] + 2, dtype=np.int64)
+    np.cumsum(np.bincount(profile_index), out=indptr[1:])
+    norms = np.sqrt(np.bincount(item_index, minlength=n_items).astype(np.float64))
+
+    for start in range(0, n_items, block_size):
+        stop = min(start + block_size, n_items)
+
+        # Every (item in block, other item of the same profile) pair.
+        in_block = (item_index >= start) & (item_index < stop)
+        owners = profile_index[in_block]
+        lengths = indptr[owners + 1] - indptr[owners]
+        ends = np.cumsum(lengths)
+        positions = np.repeat(indptr[owners] - (ends - lengths), lengths) + np.arange(ends[-1])
+        sources = np.repeat(item_index[in_block], lengths)
+
+        # Co-occurrence counts of the pairs that occur, as (source, target, count).
+        pairs, counts = np.unique(sources * n_items + item_index[positions], return_counts=True)
+        sources, targets = np.divmod(pairs, n_items)
+        keep = (sources != targets) & (counts >= min_support)
+        sources, targets, counts = sources[keep], targets[keep], counts[keep]
+        similarity = counts / (norms[sources] * norms[targets])
+
+        # Best first within each source; the first k of each run are its neighbors.
+        order = np.lexsort((targets, -similarity, sources))
+        sources, targets, similarity = sources[order], targets[order], similarity[order]
+        firsts = np.flatnonzero(np.r_[True, sources[1:] != sources[:-1]])
+        rank = np.arange(len(sources)) - np.repeat(firsts, np.diff(np.r_[firsts, len(sources)]))
+        top = rank < k
+
+        for source, target, score in zip(sources[top], targets[top], similarity[top]):
+            yield int(items[source]), int(items[target]), float(score)
+
+
+def rebuild(batch_size=5000):
+    """Recompute every item's neighbors; returns the number of rows stored."""
+    config = settings.RECOMMENDATIONS
+    stale = list(StaleItem.objects.values_list('id', flat=True))
+    # Title ids stand for (item_id, media_type) in the matrix.
+    pairs = MovieList.objects.filter(profile__isnull=False).values_list('profile_id', 'title_id')
+    flat = np.fromiter(chain.from_iterable(pairs.iterator(chunk_size=10000)), dtype=np.int64)
+    flat = flat.reshape(-1, 2)
+    keys = {
+        title_id: (item_id, media_type)
+        for title_id, item_id, media_type in Title.objects.filter(id__in=MovieList.objects.values('title_id'))
+        .values_list('id', 'item_id', 'media_type').iterator(chunk_size=10000)
+    }
+
+    neighbors = top_neighbors(
+        flat[:, 0], flat[:, 1], config['NEIGHBORS'], config['MIN_SUPPORT'], config['BLOCK_SIZE']
+    )
+    stored = 0
+    with transaction.atomic():
+        ItemNeighbor.objects.all().delete()
+        while True:
+            batch = [
+                _neighbor(keys[title_id], keys[neighbor_title_id], score)
+                for title_id, neighbor_title_id, score in _take(neighbors, batch_size)
+            ]
+            if not batch:
+                break
+            ItemNeighbor.objects.bulk_create(batch)
+            stored += len(batch)
+        # Only what was stale before the pairs were read is now up to date.
+        StaleItem.objects.filter(id__in=stale).delete()
+    return stored
+
+
+def _neighbor(key, neighbor_key, score):
+    return ItemNeighbor(item_id=key[0], media_type=key[1],
+                        neighbor_id=neighbor_key[0], neighbor_media_type=neighbor_key[1], score=score)
+
+
+def _take(iterator, count):
+    for _, value in zip(range(count), iterator):
+        yield value
+
+
+def refresh_item(item_id, media_type):
+    """Recompute one item's neighbors from the current lists."""
+    config = settings.RECOMMENDATIONS
+    title_id = Title.objects.filter(item_id=item_id, media_type=media_type).values_list('id', flat=True).first()
+    scores = []
+    if title_id is not None:
+        counts = dict(
+            MovieList.objects
+            .filter(profile__movie_lists__title_id=title_id)
+            .exclude(title_id=title_id)
+            .values_list('title_id')
+            .annotate(count=Count('id'))
+        )
+        counts = {other: count for other, count in counts.items() if count >= config['MIN_SUPPORT']}
+        saves = dict(
+            MovieList.objects
+            .filter(title_id__in=[title_id, *counts], profile__isnull=False)
+            .values_list('title_id')
+            .annotate(count=Count('id'))
+        ) if counts else {}
+        scores = sorted(
+            ((count / (saves[title_id] * saves[other]) ** 0.5, other) for other, count in counts.items()),
+            reverse=True,
+        )[:config['NEIGHBORS']]
+    keys = {
+        pk: (other_id, other_type)
+        for pk, other_id, other_type in Title.objects.filter(id__in=[other for _, other in scores])
+        .values_list('id', 'item_id', 'media_type')
+    } if scores else {}
+    with transaction.atomic():
+        ItemNeighbor.objects.filter(item_id=item_id, media_type=media_type).delete()
+        ItemNeighbor.objects.bulk_create(
+            _neighbor((item_id, media_type), keys[other], score) for score, other in scores
+        )
+
+
+def refresh_stale(limit=None):
+    """Recompute the neighbors of items marked stale; returns how many were refreshed."""
+    stale = StaleItem.objects.order_by('id').values_list('id', 'item_id', 'media_type')
+    rows = list(stale[:limit] if limit else stale)
+    for _, item_id, media_type in rows:
+        refresh_item(item_id, media_type)
+    StaleItem.objects.filter(id__in=[row[0] for row in rows]).delete()
+    return len(rows)
+
+
+def mark_stale(item_ids):
+    # The list signal carries bare ids; marking both media types saves a
+    # lookup on every write, and refreshing an item nobody saved only clears it.
+    StaleItem.objects.bulk_create(
+        (StaleItem(item_id=item_id, media_type=media_type) for item_id in item_ids for media_type in MEDIA_TYPES),
+        ignore_conflicts=True,
+    )
+
+
+def _neighbor_title(field):
+    return Subquery(
+        Title.objects.filter(item_id=OuterRef('neighbor_id'), media_type=OuterRef('neighbor_media_type'))
+        .values(field)[:1]
+    )
+
+
+def recommend(profile, limit=20):
+    """Recommendations for ``profile`` (needs ``id`` and ``version``), best first."""
+    config = settings.RECOMMENDATIONS
+    cache = caches[config['CACHE_ALIAS']]
+    key = f'recommendations:{profile.id}:{profile.version}:{limit}'
+    results = cache.get(key)
+    if results is not None:
+        return results
+
+    saved = MovieList.objects.filter(profile_id=profile.id)
+    saved_item = saved.filter(title__item_id=OuterRef('item_id'), title__media_type=OuterRef('media_type'))
+    saved_neighbor = saved.filter(
+        title__item_id=OuterRef('neighbor_id'), title__media_type=OuterRef('neighbor_media_type'),
+    )
+    ranked = list(
+        ItemNeighbor.objects
+        .filter(Exists(saved_item))
+        .exclude(Exists(saved_neighbor))
+        .values('neighbor_id', 'neighbor_media_type')
+        .annotate(score=Sum('score'), title=_neighbor_title('title'), poster_path=_neighbor_title('poster_path'))
+        .order_by('-score', 'neighbor_id', 'neighbor_media_type')[:limit]
+    )
+
+    # The saved item that contributed most to each recommendation.
+    wanted = {(row['neighbor_id'], row['neighbor_media_type']) for row in ranked}
+    because = {}
+    neighbors = ItemNeighbor.objects.filter(
+        Exists(saved_item), neighbor_id__in=[neighbor_id for neighbor_id, _ in wanted],
+    ).values_list('neighbor_id', 'neighbor_media_type', 'item_id', 'media_type', 'score')
+    for neighbor_id, neighbor_media_type, item_id, media_type, score in neighbors:
+        neighbor = (neighbor_id, neighbor_media_type)
+        if neighbor in wanted and score > because.get(neighbor, (None, 0.0))[1]:
+            because[neighbor] = ((item_id, media_type), score)
+    titles = {
+        (item_id, media_type): title
+        for item_id, media_type, title in saved
+        .filter(title__item_id__in=[source[0] for source, _ in because.values()])
+        .values_list('title__item_id', 'title__media_type', 'title__title')
+    }
+
+    results = []
+    for row in ranked:
+        source = because[row['neighbor_id'], row['neighbor_media_type']][0]
+        results.append({
+            'item_id': row['neighbor_id'],
+            'title': row['title'],
+            'poster_path': row['poster_path'],
+            'media_type': row['neighbor_media_type'],
+            'score': round(row['score'], 4),
+            'because': {'item_id': source[0], 'media_type': source[1], 'title': titles.get(source)},
+        })
+    cache.set(key, results, config['CACHE_TTL'])
+    return results
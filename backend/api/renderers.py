@@ -0,0 +1,53 @@
+# backend/api/renderers.py
+"""
+JSON rendering with orjson when it is installed.
+
+``FastJSONRenderer`` produces the same documents as DRF's ``JSONRenderer``
+(compact, UTF-8, datetimes in ISO 8601 with ``Z`` for UTC) several times
+faster; only U+2028 and U+2029 are left unescaped, which JSON allows.
+Types orjson does not know, such as ``Decimal`` or lazy translation
+strings, go through DRF's encoder. Without orjson, or for the
+indented output of the browsable API, it is DRF's renderer.
+"""
+from rest_framework.renderers import BaseRenderer, JSONRenderer
+from rest_framework.utils.encoders import JSONEncoder
+
+try:
+    import orjson
+except ImportError:  # Falls back to DRF's json-based rendering.
+    orjson = None
+
+if orjson is not None:
+    OPTIONS = orjson.OPT_UTC_Z | orjson.OPT_NON_STR_KEYS
+    _default = JSONEncoder().default
+
+
+def dumps(data):
+    """``data`` as compact JSON bytes."""
+    if orjson is None:
+        return JSONRenderer().render(data)
+    return orjson.dumps(data, default=_default, option=OPTIONS)
+
+
+class FastJSONRenderer(JSONRenderer):
+    def render(self, data, accepted_media_type=None, renderer_context=None):
+        if orjson is None or self.get_indent(accepted_media_type or '', renderer_context or {}):
+            return super().render(data, accepted_media_type, renderer_context)
+        if data is None:
+            return b''
+        return dumps(data)
+
+
+class EventStreamRenderer(BaseRenderer):
+    """
+    Lets ``Accept: text/event-stream`` requests through content negotiation.
+
+    Event streams are ``StreamingHttpResponse`` and skip rendering; this
+    only renders their error responses, as JSON.
+    """
+    media_type = 'text/event-stream'
+    format = 'sse'
+    charset = None
+
+    def render(self, data, accepted_media_type=None, renderer_context=None):
+        return b'' if data is None else dumps(data)
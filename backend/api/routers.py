@@ -0,0 +1,173 @@
+# backend/api/routers.py
+"""
+Read-replica routing with read-your-writes stickiness.
+
+Only views decorated with ``replica_reads`` read from a replica, one picked
+at random from ``DATABASE_ROUTING['REPLICAS']`` per request; everything
+else, and every write, uses ``default``. A user whose request wrote to the
+database is pinned to ``default`` for ``STICKY_SECONDS`` afterwards, long
+enough for the replicas to catch up, so a profile change or a list edit is
+visible in the very next read. Pins live in the shared cache so they hold
+on every worker; async views and the async middleware path reach it
+through the cache's async methods.
+
+Writes are noticed by the router itself (``db_for_write``) inside the scope
+that ``ReplicaPinningMiddleware`` opens per request; raw ``cursor()``
+writes bypass routers and would not pin.
+"""
+import contextvars
+import functools
+import random
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction
+from django.conf import settings
+from django.core.cache import caches
+from django.utils.functional import SimpleLazyObject
+
+# The replica the current view reads from, or None.
+_replica = contextvars.ContextVar('replica', default=None)
+# Per-request write tracking; a mutable holder so writes made in
+# sync_to_async threads, which run in a copy of the context, still count.
+_request_writes = contextvars.ContextVar('request_writes', default=None)
+
+
+class _Writes:
+    wrote = False
+
+
+def _pin_key(user_id):
+    return f'db-pin:{user_id}'
+
+
+def pin(user_id):
+    """Send ``user_id``'s reads to ``default`` for ``STICKY_SECONDS``."""
+    config = settings.DATABASE_ROUTING
+    caches[config['CACHE_ALIAS']].set(_pin_key(user_id), True, config['STICKY_SECONDS'])
+
+
+async def apin(user_id):
+    config = settings.DATABASE_ROUTING
+    await caches[config['CACHE_ALIAS']].aset(_pin_key(user_id), True, config['STICKY_SECONDS'])
+
+
+def is_pinned(user_id):
+    return caches[settings.DATABASE_ROUTING['CACHE_ALIAS']].get(_pin_key(user_id)) is not None
+
+
+async def ais_pinned(user_id):
+    return await caches[settings.DATABASE_ROUTING['CACHE_ALIAS']].aget(_pin_key(user_id)) is not None
+
+
+def choose_replica(user_id):
+    """The alias the user's reads should go to, or None for ``default``."""
+    replicas = settings.DATABASE_ROUTING['REPLICAS']
+    if not replicas or (user_id is not None and is_pinned(user_id)):
+        return None
+    return random.choice(replicas)
+
+
+async def achoose_replica(user_id):
+    replicas = settings.DATABASE_ROUTING['REPLICAS']
+    if not replicas or (user_id is not None and await ais_pinned(user_id)):
+        return None
+    return random.choice(replicas)
+
+
+class ReplicaRouter:
+    def db_for_read(self, model, **hints):
+        writes = _request_writes.get()
+        if writes is not None and writes.wrote:
+            return None
+        return _replica.get()
+
+    def db_for_write(self, model, **hints):
+        writes = _request_writes.get()
+        if writes is not None:
+            writes.wrote = True
+        return None
+
+    def allow_relation(self, obj1, obj2, **hints):
+        # Replicas hold the same rows as default.
+        return True
+
+
+def replica_reads(view):
+    """
+    Route the reads of ``view`` to a replica unless the user is pinned.
+
+    Works on function views (below ``@api_view``) and on sync or async
+    ``APIView`` handler methods.
+    """
+    def user_id(args):
+        # Handler methods are called with (self, request), function views with (request,).
+        request = args[1] if len(args) > 1 else args[0]
+        return request.user.id
+
+    if iscoroutinefunction(view):
+        @functools.wraps(view)
+        async def wrapped(*args, **kwargs):
+            token = _replica.set(await achoose_replica(user_id(args)))
+            try:
+                return await view(*args, **kwargs)
+            finally:
+                _replica.reset(token)
+    else:
+        @functools.wraps(view)
+        def wrapped(*args, **kwargs):
+            token = _replica.set(choose_replica(user_id(args)))
+            try:
+                return view(*args, **kwargs)
+            finally:
+                _replica.reset(token)
+    return wrapped
+
+
+class ReplicaPinningMiddleware:
+    """Pins the requesting user to ``default`` after a request that wrote."""
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        self.is_async = iscoroutinefunction(get_response)
+        if self.is_async:
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if self.is_async:
+            return self.__acall__(request)
+        writes = _Writes()
+        token = _request_writes.set(writes)
+        try:
+            response = self.get_response(request)
+        finally:
+            _request_writes.reset(token)
+        writer = self.writer(request, writes)
+        if writer is not None:
+            pin(writer)
+        return response
+
+    async def __acall__(self, request):
+        writes = _Writes()
+        token = _request_writes.set(writes)
+        try:
+            response = await self.get_response(request)
+        finally:
+            _request_writes.reset(token)
+        writer = self.writer(request, writes)
+        if writer is not None:
+            await apin(writer)
+        return response
+
+    @staticmethod
+    def writer(request, writes):
+        """The id of the user to pin after the request, or None."""
+        if not writes.wrote or not settings.DATABASE_ROUTING['REPLICAS']:
+            return None
+        # DRF sets the user it authenticated on the underlying request. The
+        # session user is lazy and would cost a query, which the API's
+        # anonymous writes (register, token) do not need.
+        user = getattr(request, 'user', None)
+        if user is None or isinstance(user, SimpleLazyObject) or not user.is_authenticated:
+            return None
+        return user.id
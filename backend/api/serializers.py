@@ -1,23 +1,195 @@
+import time
+
 from rest_framework import serializers
+from rest_framework_simplejwt.exceptions import TokenError
+from rest_framework_simplejwt.serializers import TokenObtainPairSerializer, TokenRefreshSerializer
+from rest_framework_simplejwt.settings import api_settings
+from . import authentication, logins, metrics, preferences, titles
 from .models import MovieList, Profile
 
-class MovieListSerializer(serializers.ModelSerializer):
+class SparseFieldsMixin:
+    """Lets callers pass ``fields=[...]`` to keep only a subset of the declared fields."""
+
+    def __init__(self, *args, **kwargs):
+        fields = kwargs.pop('fields', None)
+        super().__init__(*args, **kwargs)
+        if fields is not None:
+            for name in set(self.fields) - set(fields):
+                self.fields.pop(name)
+
+class TimedSerializerMixin:
+    """Adds ``to_representation`` time to the sampled request's metrics."""
+
+    def to_representation(self, instance):
+        record = metrics.current_record()
+        if record is None:
+            return super().to_representation(instance)
+        # Only the outermost serializer is timed, nested ones are part of it.
+        record.serializer_depth += 1
+        started = time.perf_counter()
+        try:
+            return super().to_representation(instance)
+        finally:
+            record.serializer_depth -= 1
+            if not record.serializer_depth:
+                record.serializer_time += time.perf_counter() - started
+
+class MovieListSerializer(TimedSerializerMixin, SparseFieldsMixin, serializers.ModelSerializer):
+    # Read through the shared Title; querysets should select_related('title').
+    title = serializers.CharField(source='title.title', max_length=200)
+    poster_path = serializers.CharField(source='title.poster_path', max_length=200)
+
     class Meta:
         model = MovieList
-        fields = ['user', 'profile', 'item_id', 'title', 'poster_path', 'added_date', 'media_type']
-        read_only_fields = ['user', 'profile']
+        fields = ['user', 'profile', 'item_id', 'title', 'poster_path', 'added_date', 'media_type', 'position']
+        read_only_fields = ['user', 'profile', 'position']
+
+    def create(self, validated_data):
+        metadata = validated_data.pop('title')
+        item_id, media_type = validated_data['item_id'], validated_data.get('media_type')
+        resolved = titles.resolve([(item_id, media_type, metadata['title'], metadata['poster_path'])])
+        return MovieList.objects.create(title=resolved[titles.title_key(item_id, media_type)], **validated_data)
+
+class ValuesSerializer:
+    """
+    Read-only list output built straight from ``.values()`` rows.
+
+    The read endpoints that return the most rows use these instead of a
+    ModelSerializer, which costs a model instance and a field dispatch per
+    value. ``columns`` maps each output field, in output order, to the row
+    key it comes from; ``datetimes`` are formatted as ``DateTimeField``
+    would, and a field in ``nested`` holds a list of rows for another
+    ``ValuesSerializer``. The output must stay equal to the ModelSerializer
+    a subclass stands in for.
+    """
+    columns = {}
+    datetimes = ()
+    nested = {}
+
+    def __init__(self, rows=None, fields=None):
+        self.rows = rows
+        self.fields = fields
+
+    @classmethod
+    def lookups(cls, fields=None):
+        """The ``values()`` lookups for ``fields`` (all when None); nested fields are the caller's."""
+        return [
+            lookup for name, lookup in cls.columns.items()
+            if name not in cls.nested and (fields is None or name in fields)
+        ]
+
+    def to_representation(self, rows):
+        columns = [(name, key) for name, key in self.columns.items() if self.fields is None or name in self.fields]
+        data = [{name: row[key] for name, key in columns} for row in rows]
+        for name, _ in columns:
+            if name in self.datetimes:
+                to_string = serializers.DateTimeField().to_representation
+                for item in data:
+                    item[name] = to_string(item[name])
+            elif name in self.nested:
+                nested = self.nested[name]()
+                for item in data:
+                    item[name] = nested.to_representation(item[name])
+        return data
+
+    @property
+    def data(self):
+        record = metrics.current_record()
+        started = time.perf_counter()
+        data = self.to_representation(self.rows)
+        if record is not None:
+            record.serializer_time += time.perf_counter() - started
+        return data
 
-class ProfileSerializer(serializers.ModelSerializer):
+class MovieListValuesSerializer(ValuesSerializer):
+    """``MovieListSerializer`` output for reads."""
+    columns = {
+        'user': 'user_id', 'profile': 'profile_id', 'item_id': 'item_id', 'title': 'title__title',
+        'poster_path': 'title__poster_path', 'added_date': 'added_date', 'media_type': 'media_type',
+        'position': 'position',
+    }
+    datetimes = ('added_date',)
+
+class MovieListOperationSerializer(serializers.Serializer):
+    """One entry of a batch My List update."""
+    op = serializers.ChoiceField(choices=['add', 'remove', 'reorder'])
+    item_id = serializers.IntegerField()
+    title = serializers.CharField(max_length=200, required=False)
+    poster_path = serializers.CharField(max_length=200, required=False)
+    media_type = serializers.CharField(max_length=100, required=False, allow_null=True)
+    position = serializers.IntegerField(min_value=0, required=False)
+
+    def validate(self, data):
+        if data['op'] == 'add':
+            missing = [name for name in ('title', 'poster_path') if name not in data]
+            if missing:
+                raise serializers.ValidationError({name: 'This field is required.' for name in missing})
+        if data['op'] == 'reorder' and 'position' not in data:
+            raise serializers.ValidationError({'position': 'This field is required.'})
+        return data
+
+class PlaybackProgressSerializer(serializers.Serializer):
+    """One progress report from the player."""
+    profile_id = serializers.IntegerField()
+    item_id = serializers.IntegerField()
+    media_type = serializers.CharField(max_length=100, required=False, allow_null=True)
+    season = serializers.IntegerField(min_value=0, max_value=32767, required=False, allow_null=True)
+    episode = serializers.IntegerField(min_value=0, max_value=32767, required=False, allow_null=True)
+    position = serializers.FloatField(min_value=0)
+    duration = serializers.FloatField(min_value=0, required=False, allow_null=True)
+
+class ProfileSerializer(TimedSerializerMixin, SparseFieldsMixin, serializers.ModelSerializer):
     movie_lists = MovieListSerializer(many=True, read_only=True)
+    # Only present when the queryset is annotated, see get_profiles.
+    list_count = serializers.IntegerField(read_only=True, required=False)
 
     class Meta:
         model = Profile
-        fields = ['id', 'user', 'name', 'avatar', 'preferences', 'movie_lists']
-        read_only_fields = ['user']
-    
-    def validate(self, data):
-        # Debugging - print the received data in the serializer
-        print("Validation data:", data)
+        fields = ['id', 'user', 'name', 'avatar', 'preferences', 'version', 'movie_lists', 'list_count']
+        read_only_fields = ['user', 'version']
+
+    def validate_preferences(self, value):
+        try:
+            preferences.validate_preferences(value)
+        except preferences.PreferencesError as exc:
+            raise serializers.ValidationError(str(exc))
+        return value
+
+class ProfileValuesSerializer(ValuesSerializer):
+    """``ProfileSerializer`` output for reads; ``movie_lists`` rows are attached by the view."""
+    columns = {
+        'id': 'id', 'user': 'user_id', 'name': 'name', 'avatar': 'avatar', 'preferences': 'preferences',
+        'version': 'version', 'movie_lists': 'movie_lists', 'list_count': 'list_count',
+    }
+    nested = {'movie_lists': MovieListValuesSerializer}
+
+class TokenObtainPairWithClaimsSerializer(TokenObtainPairSerializer):
+    """Adds the claims ``ClaimsUser`` needs to serve reads without a user lookup."""
+
+    @classmethod
+    def get_token(cls, user):
+        token = super().get_token(user)
+        token['username'] = user.username
+        token['email'] = user.email
+        return token
+
+    def validate(self, attrs):
+        data = super().validate(attrs)
+        # Replaces UPDATE_LAST_LOGIN, which saves the user inline.
+        logins.record_login(self.user)
+        return data
+
+
+class TokenRefreshWithRevocationSerializer(TokenRefreshSerializer):
+    """Rotation and revocation against ``RevokedToken`` instead of the blacklist app."""
 
-        # Perform the standard validation
-        return data
\ No newline at end of file
+    def validate(self, attrs):
+        refresh = self.token_class(attrs['refresh'])
+        if api_settings.ROTATE_REFRESH_TOKENS and api_settings.BLACKLIST_AFTER_ROTATION:
+            # One INSERT; losing it means the token was already used.
+            revoked = not authentication.claim_token(refresh)
+        else:
+            revoked = authentication.is_revoked(refresh, stored=True)
+        if revoked:
+            raise TokenError('Token is blacklisted')
+        return super().validate(attrs)
@@ -0,0 +1,39 @@
+# backend/api/signals.py
+from django.dispatch import Signal, receiver
+
+from . import browse, changefeed, recommendations, trending
+from .models import Profile
+
+# Sent by the list views inside the transaction that changed a profile's My
+# List. Database bookkeeping joins that transaction; cache invalidation and
+# stream events wait for the commit.
+# Arguments: profile_id, added (list of item ids), removed (list of item ids),
+# and imported=True when the adds come from a list import.
+movie_list_changed = Signal()
+
+
+@receiver(movie_list_changed)
+def bump_profile_version(sender, profile_id, **kwargs):
+    Profile.touch(profile_id)
+
+
+@receiver(movie_list_changed)
+def invalidate_browse_home(sender, profile_id, **kwargs):
+    browse.invalidate_browse_home(profile_id)
+
+
+@receiver(movie_list_changed)
+def mark_recommendations_stale(sender, added=(), removed=(), **kwargs):
+    recommendations.mark_stale([*added, *removed])
+
+
+@receiver(movie_list_changed)
+def record_list_events(sender, profile_id, added=(), removed=(), imported=False, **kwargs):
+    # A restored list says nothing about what is popular now.
+    if not imported:
+        trending.record(profile_id, added, removed)
+
+
+@receiver(movie_list_changed)
+def publish_list_change(sender, profile_id, added=(), removed=(), **kwargs):
+    changefeed.publish(profile_id, 'list', {'added': list(added), 'removed': list(removed)})
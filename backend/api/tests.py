@@ -1,3 +1,1724 @@
-from django.test import TestCase
+import asyncio
+import gzip
+import hashlib
+import importlib
+import io
+import json
+import logging
+import os
+import tempfile
+import threading
+import time
+import tracemalloc
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from datetime import timedelta
+from decimal import Decimal
+from unittest import addModuleCleanup, mock, skipIf
 
-# Create your tests here.
+import numpy as np
+from django.apps import apps as django_apps
+from django.conf import settings
+from django.contrib.auth.hashers import PBKDF2PasswordHasher, get_hasher
+from django.contrib.auth.models import User
+from django.core.cache import cache
+from django.core.management import call_command
+from django.db import connection, router
+from django.db.models import Count, Prefetch
+from django.test import TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.utils import timezone
+from django.urls import path
+from django.utils.translation import gettext_lazy
+from rest_framework.renderers import JSONRenderer
+from rest_framework.test import APIClient
+from rest_framework_simplejwt.authentication import JWTAuthentication
+from rest_framework_simplejwt.tokens import AccessToken, RefreshToken
+
+from . import (
+    async_views, authentication, browse, catalog, changefeed, images, log, logins, metrics, preferences, progress,
+    recommendations, routers, throttling, titles, trending,
+)
+from .bench.runner import PHASES, ClientTransport, run_benchmark
+from .bench.seed import seed
+from .bench.upstream import StubUpstream
+from .models import (
+    ItemNeighbor, ListEvent, MovieList, PlaybackProgress, Profile, RevokedToken, StaleItem, Title, TrendingBucket,
+)
+from .renderers import FastJSONRenderer
+from .serializers import MovieListSerializer, ProfileSerializer
+
+# Logins stay buffered until a test flushes them.
+BUFFERED_LOGINS = {'DEFER_LAST_LOGIN': True, 'LAST_LOGIN_FLUSH_INTERVAL': 0, 'MAX_PENDING_LOGINS': 1000}
+
+
+def setUpModule():
+    # Many tests expect 4xx/5xx responses; keep Django's line for each out of the test output.
+    request_logger = logging.getLogger('django.request')
+    addModuleCleanup(request_logger.setLevel, request_logger.level)
+    request_logger.setLevel(logging.CRITICAL)
+
+    # Title indexing runs inline, inside each test's transaction.
+    inline_index = override_settings(CATALOG_CACHE={**settings.CATALOG_CACHE, 'INDEX_IN_BACKGROUND': False})
+    inline_index.enable()
+    addModuleCleanup(inline_index.disable)
+
+
+def save_items(user, profile, items):
+    """Bulk-save ``(item_id, media_type)`` pairs to a profile's list."""
+    resolved = titles.resolve(
+        (item_id, media_type, f'Title {item_id}', f'/{item_id}.jpg') for item_id, media_type in items
+    )
+    MovieList.objects.bulk_create(
+        MovieList(user=user, profile=profile, item_id=item_id, media_type=media_type,
+                  title=resolved[titles.title_key(item_id, media_type)])
+        for item_id, media_type in items
+    )
+
+
+class ViewerTestCase(TestCase):
+    """A cleared cache and an authenticated ``viewer`` with a ``Main`` profile (none if ``profile_name`` is None)."""
+    profile_name = 'Main'
+
+    def setUp(self):
+        cache.clear()
+        self.user = User.objects.create_user('viewer', password='pw')
+        self.profile = Profile.objects.create(user=self.user, name=self.profile_name) if self.profile_name else None
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+
+
+class CatalogCacheTests(TestCase):
+    def setUp(self):
+        self.upstream = StubUpstream()
+        self.addCleanup(self.upstream.close)
+        self.now = 1000.0
+        self.settings_override = override_settings(TMDB_BASE_URL=self.upstream.url)
+        self.settings_override.enable()
+        self.addCleanup(self.settings_override.disable)
+        cache.clear()
+
+    def make_cache(self, **kwargs):
+        return catalog.CatalogCache(
+            fetch=catalog.fetch_tmdb, shared=cache, clock=lambda: self.now, **kwargs
+        )
+
+    def test_index_hook_runs_after_waiting_callers_are_released(self):
+        release, indexed = threading.Event(), []
+
+        def on_fetch(path, payload):
+            release.wait(2)
+            indexed.append(path)
+
+        executor = ThreadPoolExecutor(max_workers=1)
+        self.addCleanup(executor.shutdown)
+        catalog_cache = self.make_cache(on_fetch=on_fetch, executor=executor)
+        _, state = catalog_cache.get('movie/popular')
+        self.assertEqual((state, indexed), (catalog.MISS, []))
+        release.set()
+        executor.shutdown(wait=True)
+        self.assertEqual(indexed, ['movie/popular'])
+
+    def test_index_failures_are_counted(self):
+        metrics.registry.clear()
+        self.addCleanup(metrics.registry.clear)
+
+        def on_fetch(path, payload):
+            raise ValueError(path)
+
+        with self.assertLogs('api.catalog', 'WARNING'):
+            self.make_cache(on_fetch=on_fetch).get('movie/popular')
+        self.assertIn('api_title_index_failures_total 1', metrics.registry.render())
+
+    def test_second_read_is_served_from_cache(self):
+        catalog_cache = self.make_cache(default_ttl=60)
+        _, first = catalog_cache.get('movie/popular', {'page': '1'})
+        payload, second = catalog_cache.get('movie/popular', {'page': '1'})
+        self.assertEqual((first, second), (catalog.MISS, catalog.HIT))
+        self.assertEqual(payload['count'], 1)
+        self.assertEqual(self.upstream.hits['3/movie/popular'], 1)
+
+    def test_shared_tier_survives_local_eviction(self):
+        catalog_cache = self.make_cache(lru_size=1)
+        catalog_cache.get('movie/popular')
+        catalog_cache.get('tv/popular')
+        _, state = catalog_cache.get('movie/popular')
+        self.assertEqual(state, catalog.HIT)
+        self.assertEqual(self.upstream.hits['3/movie/popular'], 1)
+
+    def test_concurrent_misses_are_coalesced(self):
+        self.upstream.delay = 0.2
+        catalog_cache = self.make_cache()
+        threads = [
+            threading.Thread(target=catalog_cache.get, args=('trending/all/day',))
+            for _ in range(8)
+        ]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        self.assertEqual(self.upstream.hits['3/trending/all/day'], 1)
+
+    def test_stale_entry_is_served_while_revalidating(self):
+        catalog_cache = self.make_cache(default_ttl=10, stale_ttl=100)
+        catalog_cache.get('movie/upcoming')
+        self.now += 20
+
+        payload, state = catalog_cache.get('movie/upcoming')
+        self.assertEqual((state, payload['count']), (catalog.STALE, 1))
+
+        for _ in range(50):
+            if catalog_cache.local.get(catalog_cache.make_key('movie/upcoming', {}))['payload']['count'] == 2:
+                break
+            time.sleep(0.02)
+        payload, state = catalog_cache.get('movie/upcoming')
+        self.assertEqual((state, payload['count']), (catalog.HIT, 2))
+
+    def test_per_path_ttl_uses_longest_prefix(self):
+        catalog_cache = self.make_cache(default_ttl=5, ttls={'movie/': 50, 'movie/upcoming': 500})
+        self.assertEqual(catalog_cache.ttl_for('movie/upcoming'), 500)
+        self.assertEqual(catalog_cache.ttl_for('movie/popular'), 50)
+        self.assertEqual(catalog_cache.ttl_for('tv/popular'), 5)
+
+
+class CatalogProxyViewTests(ViewerTestCase):
+    profile_name = None
+
+    def setUp(self):
+        super().setUp()
+        self.upstream = StubUpstream()
+        self.addCleanup(self.upstream.close)
+        self.settings_override = override_settings(TMDB_BASE_URL=self.upstream.url)
+        self.settings_override.enable()
+        self.addCleanup(self.settings_override.disable)
+
+    def test_proxies_and_caches_allowed_paths(self):
+        first = self.client.get('/api/catalog/movie/popular', {'page': 2})
+        second = self.client.get('/api/catalog/movie/popular', {'page': 2})
+        self.assertEqual(first.status_code, 200)
+        self.assertEqual((first['X-Cache'], second['X-Cache']), ('MISS', 'HIT'))
+        self.assertEqual(self.upstream.hits['3/movie/popular'], 1)
+
+    def test_rejects_paths_outside_allowlist(self):
+        response = self.client.get('/api/catalog/account/1')
+        self.assertEqual(response.status_code, 404)
+
+    def test_upstream_errors_are_not_cached(self):
+        self.upstream.status = 503
+        response = self.client.get('/api/catalog/tv/popular')
+        self.assertEqual(response.status_code, 503)
+        self.upstream.status = 200
+        response = self.client.get('/api/catalog/tv/popular')
+        self.assertEqual(response.status_code, 200)
+
+
+class BrowseHomeTests(ViewerTestCase):
+    def setUp(self):
+        super().setUp()
+        self.upstream = StubUpstream()
+        self.addCleanup(self.upstream.close)
+        self.settings_override = override_settings(TMDB_BASE_URL=self.upstream.url)
+        self.settings_override.enable()
+        self.addCleanup(self.settings_override.disable)
+
+    def test_returns_every_row_and_my_list_in_one_response(self):
+        response = self.client.get('/api/browse/home/', {'profile_id': self.profile.id})
+        self.assertEqual(response.status_code, 200)
+        page = json.loads(response.content)
+        self.assertEqual([row['key'] for row in page['rows']], [row[0] for row in browse.BROWSE_ROWS])
+        self.assertEqual(page['my_list'], [])
+        self.assertEqual(len(self.upstream.hits), len(browse.BROWSE_ROWS))
+
+    def test_page_is_cached_compressed_and_invalidated_by_list_changes(self):
+        self.client.get('/api/browse/home/', {'profile_id': self.profile.id})
+        response = self.client.get(
+            '/api/browse/home/', {'profile_id': self.profile.id}, HTTP_ACCEPT_ENCODING='gzip'
+        )
+        self.assertEqual(response['Content-Encoding'], 'gzip')
+        self.assertEqual(json.loads(gzip.decompress(response.content))['my_list'], [])
+
+        with self.captureOnCommitCallbacks(execute=True):
+            self.client.post('/api/mylist/add/', {
+                'profile_id': self.profile.id, 'item_id': 7, 'title': 'Se7en',
+                'poster_path': '/p.jpg', 'media_type': 'movie',
+            })
+        page = json.loads(self.client.get('/api/browse/home/', {'profile_id': self.profile.id}).content)
+        self.assertEqual([item['item_id'] for item in page['my_list']], [7])
+        self.assertEqual(max(self.upstream.hits.values()), 1)
+
+    def test_list_changes_invalidate_the_page_after_commit(self):
+        key = browse.cache_key(self.profile.id)
+        changes = [
+            lambda: self.client.post('/api/mylist/add/', {'profile_id': self.profile.id, 'item_id': 7,
+                                                          'title': 'Se7en', 'poster_path': '/p.jpg',
+                                                          'media_type': 'movie'}),
+            lambda: self.client.delete(f'/api/mylist/remove/7/?profile_id={self.profile.id}'),
+            lambda: self.client.post('/api/mylist/batch/', {'profile_id': self.profile.id, 'operations': [
+                {'op': 'add', 'item_id': 8, 'title': 'Eight', 'poster_path': '/8.jpg', 'media_type': 'movie'},
+            ]}, format='json'),
+        ]
+        for change in changes:
+            cache.set(key, 'page')
+            with self.captureOnCommitCallbacks() as callbacks:
+                self.assertLess(change().status_code, 300)
+            # Still there until the transaction commits.
+            self.assertEqual(cache.get(key), 'page')
+            for callback in callbacks:
+                callback()
+            self.assertIsNone(cache.get(key))
+
+    def test_other_users_profile_is_not_found(self):
+        other = Profile.objects.create(user=User.objects.create_user('other'), name='Other')
+        response = self.client.get('/api/browse/home/', {'profile_id': other.id})
+        self.assertEqual(response.status_code, 404)
+
+
+class ProfileListTests(ViewerTestCase):
+    profile_name = None
+
+    def seed(self, profiles, items):
+        for index in range(profiles):
+            profile = Profile.objects.create(user=self.user, name=f'Profile {index}')
+            save_items(self.user, profile, [(item, 'movie') for item in range(items)])
+
+    def test_full_mode_query_count_is_constant(self):
+        self.seed(profiles=1, items=1)
+        with self.assertNumQueries(2):
+            self.client.get('/api/profiles/')
+        self.seed(profiles=4, items=25)
+        with self.assertNumQueries(2):
+            response = self.client.get('/api/profiles/')
+        self.assertEqual(len(response.data), 5)
+        self.assertEqual(response.data[-1]['list_count'], 25)
+        self.assertEqual(len(response.data[-1]['movie_lists']), 25)
+
+    def test_summary_mode_skips_list_rows(self):
+        self.seed(profiles=3, items=10)
+        with self.assertNumQueries(1):
+            response = self.client.get('/api/profiles/', {'fields': 'summary'})
+        self.assertEqual(set(response.data[0]), {'id', 'name', 'avatar', 'version', 'list_count'})
+        self.assertEqual(response.data[0]['list_count'], 10)
+
+    def test_explicit_field_selection(self):
+        self.seed(profiles=1, items=2)
+        response = self.client.get('/api/profiles/', {'fields': 'id,name'})
+        self.assertEqual(set(response.data[0]), {'id', 'name'})
+
+
+class MovieListPaginationTests(ViewerTestCase):
+    def setUp(self):
+        super().setUp()
+        save_items(self.user, self.profile, [(item, 'tv' if item % 3 == 0 else 'movie') for item in range(120)])
+
+    def collect(self, params):
+        seen, url, pages = [], '/api/mylist/', 0
+        while url:
+            with self.assertNumQueries(2):
+                response = self.client.get(url, params)
+            self.assertEqual(response.status_code, 200)
+            seen.extend(response.data['results'])
+            url, params, pages = response.data['next'], None, pages + 1
+        return seen, pages
+
+    def test_cursor_walks_every_row_once_newest_first(self):
+        rows, pages = self.collect({'profile_id': self.profile.id})
+        self.assertEqual(pages, 3)
+        self.assertEqual([row['item_id'] for row in rows], list(range(119, -1, -1)))
+
+    def test_media_type_filter_and_sparse_fields(self):
+        rows, _ = self.collect({
+            'profile_id': self.profile.id, 'media_type': 'tv', 'fields': 'item_id,title',
+            'page_size': 15,
+        })
+        self.assertEqual(len(rows), 40)
+        self.assertEqual(set(rows[0]), {'item_id', 'title'})
+
+    def test_invalid_cursor_is_rejected(self):
+        response = self.client.get('/api/mylist/', {'profile_id': self.profile.id, 'cursor': 'nope'})
+        self.assertEqual(response.status_code, 400)
+
+    def test_item_id_filter_must_be_an_integer(self):
+        response = self.client.get('/api/mylist/', {'profile_id': self.profile.id, 'item_id': 'abc'})
+        self.assertEqual(response.status_code, 400)
+        self.assertIn('item_id', response.data)
+        response = self.client.get('/api/mylist/', {'profile_id': self.profile.id, 'item_id': '7'})
+        self.assertEqual([row['item_id'] for row in response.data['results']], [7])
+
+
+class MovieListBatchTests(ViewerTestCase):
+    def batch(self, operations, profile_id=None):
+        return self.client.post('/api/mylist/batch/', {
+            'profile_id': profile_id or self.profile.id, 'operations': operations,
+        }, format='json')
+
+    def add(self, item_id, **extra):
+        return {'op': 'add', 'item_id': item_id, 'title': f'Title {item_id}',
+                'poster_path': '/p.jpg', 'media_type': 'movie', **extra}
+
+    def test_importing_500_titles_is_a_handful_of_queries(self):
+        # SQLite caps bound parameters, so the list and title inserts are
+        # split into a few batches each, as are the stale-item inserts for
+        # recommendations (one row per id and media type); a lookup plus a
+        # few more inserts log the adds for trending.
+        with CaptureQueriesContext(connection) as queries:
+            response = self.batch([self.add(item) for item in range(500)])
+        self.assertLessEqual(len(queries), 22)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(MovieList.objects.filter(profile=self.profile).count(), 500)
+        self.assertEqual({result['status'] for result in response.data['results']}, {'added'})
+
+    def test_mixed_operations_report_per_item_results(self):
+        self.batch([self.add(1), self.add(2), self.add(3)])
+        response = self.batch([
+            self.add(1),
+            self.add(4),
+            {'op': 'remove', 'item_id': 2},
+            {'op': 'remove', 'item_id': 99},
+            {'op': 'reorder', 'item_id': 3, 'position': 5},
+            {'op': 'add', 'item_id': 5},
+            {'op': 'remove', 'item_id': 4},
+        ])
+        statuses = [result['status'] for result in response.data['results']]
+        self.assertEqual(statuses, ['exists', 'added', 'removed', 'not_found', 'reordered', 'invalid', 'duplicate'])
+        self.assertEqual(
+            sorted(MovieList.objects.filter(profile=self.profile).values_list('item_id', flat=True)),
+            [1, 3, 4],
+        )
+        self.assertEqual(MovieList.objects.get(profile=self.profile, item_id=3).position, 5)
+
+    def test_position_ordering_is_paginated(self):
+        self.batch([self.add(item) for item in range(5)])
+        self.batch([{'op': 'reorder', 'item_id': item, 'position': item + 1} for item in range(5)])
+        response = self.client.get('/api/mylist/', {
+            'profile_id': self.profile.id, 'ordering': 'position', 'page_size': 3,
+        })
+        rest = self.client.get(response.data['next'])
+        items = [row['item_id'] for row in response.data['results'] + rest.data['results']]
+        self.assertEqual(items, [0, 1, 2, 3, 4])
+
+    def test_other_users_profile_is_rejected(self):
+        other = Profile.objects.create(user=User.objects.create_user('other'), name='Other')
+        response = self.batch([self.add(1)], profile_id=other.id)
+        self.assertEqual(response.status_code, 404)
+
+
+class ConditionalGetTests(ViewerTestCase):
+    def test_unchanged_list_revalidates_without_list_query(self):
+        first = self.client.get('/api/mylist/', {'profile_id': self.profile.id})
+        with self.assertNumQueries(1):
+            second = self.client.get(
+                '/api/mylist/', {'profile_id': self.profile.id}, HTTP_IF_NONE_MATCH=first['ETag']
+            )
+        self.assertEqual(second.status_code, 304)
+
+        self.client.post('/api/mylist/add/', {
+            'profile_id': self.profile.id, 'item_id': 7, 'title': 'Se7en',
+            'poster_path': '/p.jpg', 'media_type': 'movie',
+        })
+        third = self.client.get('/api/mylist/', {'profile_id': self.profile.id}, HTTP_IF_NONE_MATCH=first['ETag'])
+        self.assertEqual(third.status_code, 200)
+        self.assertNotEqual(third['ETag'], first['ETag'])
+
+    def test_profiles_revalidate_until_a_profile_changes(self):
+        first = self.client.get('/api/profiles/')
+        self.assertEqual(first.data[0]['version'], 1)
+        with self.assertNumQueries(1):
+            second = self.client.get('/api/profiles/', HTTP_IF_NONE_MATCH=first['ETag'])
+        self.assertEqual(second.status_code, 304)
+
+        response = self.client.put(f'/api/profiles/{self.profile.id}/update/', {'name': 'Renamed'})
+        self.assertEqual(response.data['version'], 2)
+        third = self.client.get('/api/profiles/', HTTP_IF_NONE_MATCH=first['ETag'])
+        self.assertEqual(third.status_code, 200)
+
+    def test_batch_changes_bump_the_version(self):
+        self.client.post('/api/mylist/batch/', {
+            'profile_id': self.profile.id,
+            'operations': [{'op': 'add', 'item_id': 1, 'title': 'One', 'poster_path': '/p.jpg'}],
+        }, format='json')
+        self.profile.refresh_from_db()
+        self.assertEqual(self.profile.version, 2)
+
+
+class CachedJWTAuthenticationTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        authentication.reset_auth_caches()
+        self.user = User.objects.create_user('viewer', password='pw')
+        self.token = AccessToken.for_user(self.user)
+        self.client = APIClient()
+        self.client.credentials(HTTP_AUTHORIZATION=f'Bearer {self.token}')
+
+    def test_hot_token_skips_verification_and_user_lookup(self):
+        self.assertEqual(self.client.get('/api/user/info/').status_code, 200)
+        with mock.patch.object(JWTAuthentication, 'get_validated_token') as verify, \
+                self.assertNumQueries(0):
+            response = self.client.get('/api/user/info/')
+        self.assertEqual(response.status_code, 200)
+        verify.assert_not_called()
+
+    def test_revoked_token_is_rejected_even_when_cached(self):
+        self.client.get('/api/user/info/')
+        authentication.revoke_token(self.token)
+        self.assertEqual(self.client.get('/api/user/info/').status_code, 401)
+
+    def test_logout_revokes_both_tokens(self):
+        refresh = RefreshToken.for_user(self.user)
+        self.assertEqual(self.client.get('/api/user/info/').status_code, 200)
+        response = self.client.post('/api/logout/', {'refresh': str(refresh)})
+        self.assertEqual(response.status_code, 204)
+        self.assertEqual(self.client.get('/api/user/info/').status_code, 401)
+        response = APIClient().post('/api/token/refresh/', {'refresh': str(refresh)})
+        self.assertEqual(response.status_code, 401)
+
+    def test_logout_refuses_another_users_refresh_token(self):
+        other = User.objects.create_user('other')
+        response = self.client.post('/api/logout/', {'refresh': str(RefreshToken.for_user(other))})
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(self.client.get('/api/user/info/').status_code, 200)
+
+    def test_user_changes_evict_the_cached_user(self):
+        self.client.get('/api/user/info/')
+        self.user.is_active = False
+        self.user.save()
+        self.assertEqual(self.client.get('/api/user/info/').status_code, 401)
+
+    def test_user_changes_in_another_worker_evict_the_cached_user(self):
+        self.client.get('/api/user/info/')
+        # Another worker's save: the row and the shared marker change, this process's LRU does not.
+        User.objects.filter(pk=self.user.pk).update(is_active=False)
+        authentication._bump_user_version(self.user.pk)
+        self.assertEqual(self.client.get('/api/user/info/').status_code, 401)
+
+    def test_middleware_and_drf_share_one_verification(self):
+        with mock.patch.object(
+            JWTAuthentication, 'get_validated_token', wraps=JWTAuthentication().get_validated_token
+        ) as verify, self.modify_settings(MIDDLEWARE={'append': 'api.middleware.JWTAuthenticationMiddleware'}):
+            response = self.client.get('/api/user/info/')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(verify.call_count, 1)
+
+
+@override_settings(JWT_STATELESS_USER=True, LOGIN_PIPELINE=BUFFERED_LOGINS)
+class ClaimsUserAuthenticationTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        authentication.reset_auth_caches()
+        self.addCleanup(logins.reset_login_buffer)
+        self.user = User.objects.create_user('viewer', email='viewer@example.com', password='pw')
+        self.profile = Profile.objects.create(user=self.user, name='Main')
+        self.client = APIClient()
+        response = self.client.post('/api/token/', {'username': 'viewer', 'password': 'pw'})
+        self.access = response.data['access']
+        self.client.credentials(HTTP_AUTHORIZATION=f'Bearer {self.access}')
+
+    def test_token_carries_user_claims(self):
+        token = AccessToken(self.access)
+        self.assertEqual((token['username'], token['email']), ('viewer', 'viewer@example.com'))
+        self.assertNotIn('profile_ids', token)
+
+    def test_reads_need_no_auth_queries(self):
+        with self.assertNumQueries(0):
+            response = self.client.get('/api/user/info/')
+        self.assertEqual(response.data, {'username': 'viewer', 'email': 'viewer@example.com', 'id': self.user.id})
+        with self.assertNumQueries(1):
+            response = self.client.get('/api/profiles/', {'fields': 'summary'})
+        self.assertEqual(response.data[0]['id'], self.profile.id)
+
+    def test_writes_load_the_full_user(self):
+        response = self.client.post('/api/profiles/create/', {'name': 'Kids'})
+        self.assertEqual(response.status_code, 201)
+        self.assertEqual(Profile.objects.get(name='Kids').user, self.user)
+
+
+# Routes the coroutine views for AsyncReadViewTests (ASYNC_READ_VIEWS=True).
+urlpatterns = [
+    path('api/user/info/', async_views.get_user_info),
+    path('api/profiles/', async_views.get_profiles),
+    path('api/mylist/', async_views.get_movie_list),
+    path('api/browse/home/', async_views.browse_home),
+    path('api/catalog/<path:tmdb_path>', async_views.catalog_proxy),
+]
+
+
+@override_settings(ROOT_URLCONF=__name__)
+class AsyncReadViewTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        authentication.reset_auth_caches()
+        self.upstream = StubUpstream(delay=0.1)
+        self.addCleanup(self.upstream.close)
+        self.settings_override = override_settings(TMDB_BASE_URL=self.upstream.url)
+        self.settings_override.enable()
+        self.addCleanup(self.settings_override.disable)
+        self.user = User.objects.create_user('viewer', email='viewer@example.com', password='pw')
+        self.profile = Profile.objects.create(user=self.user, name='Main')
+        save_items(self.user, self.profile, [(item, 'movie') for item in range(3)])
+        self.headers = {'Authorization': f'Bearer {AccessToken.for_user(self.user)}'}
+
+    async def test_user_info_and_profiles(self):
+        response = await self.async_client.get('/api/user/info/', headers=self.headers)
+        self.assertEqual(json.loads(response.content)['username'], 'viewer')
+        response = await self.async_client.get('/api/profiles/', {'fields': 'summary'}, headers=self.headers)
+        self.assertEqual(json.loads(response.content)[0]['list_count'], 3)
+
+    async def test_my_list_pages_and_revalidates(self):
+        params = {'profile_id': self.profile.id, 'page_size': 2}
+        first = await self.async_client.get('/api/mylist/', params, headers=self.headers)
+        page = json.loads(first.content)
+        self.assertEqual([row['item_id'] for row in page['results']], [2, 1])
+        self.assertIsNotNone(page['next'])
+        again = await self.async_client.get(
+            '/api/mylist/', params, headers={**self.headers, 'If-None-Match': first['ETag']}
+        )
+        self.assertEqual(again.status_code, 304)
+
+    async def test_concurrent_catalog_misses_share_one_upstream_call(self):
+        responses = await asyncio.gather(*(
+            self.async_client.get('/api/catalog/movie/popular', headers=self.headers)
+            for _ in range(10)
+        ))
+        self.assertEqual({response.status_code for response in responses}, {200})
+        self.assertEqual(self.upstream.hits['3/movie/popular'], 1)
+
+    async def test_browse_home_gathers_rows(self):
+        response = await self.async_client.get(
+            '/api/browse/home/', {'profile_id': self.profile.id}, headers=self.headers
+        )
+        page = json.loads(response.content)
+        self.assertEqual(len(page['rows']), len(browse.BROWSE_ROWS))
+        self.assertEqual(len(page['my_list']), 3)
+
+    async def test_missing_token_is_rejected(self):
+        response = await self.async_client.get('/api/user/info/')
+        self.assertEqual(response.status_code, 401)
+
+    async def test_throttles_use_the_async_cache_methods(self):
+        rates = {**settings.REST_FRAMEWORK['DEFAULT_THROTTLE_RATES'], 'user': '2/m'}
+        blocking = mock.patch.object(throttling.SlidingWindowThrottle, 'allow_request', side_effect=AssertionError)
+        with self.settings(REST_FRAMEWORK={**settings.REST_FRAMEWORK, 'DEFAULT_THROTTLE_RATES': rates}), blocking:
+            statuses = [(await self.async_client.get('/api/user/info/', headers=self.headers)).status_code
+                        for _ in range(3)]
+        self.assertEqual(statuses, [200, 200, 429])
+
+
+@override_settings(PASSWORD_HASHERS=['django.contrib.auth.hashers.MD5PasswordHasher'], LOGIN_PIPELINE=BUFFERED_LOGINS)
+class BenchmarkTests(TestCase):
+    def setUp(self):
+        self.addCleanup(logins.reset_login_buffer)
+
+    def test_seed_creates_users_profiles_and_items(self):
+        seeded = seed(users=3, profiles=2, items=4)
+        self.assertEqual(len(seeded), 3)
+        self.assertTrue(all(len(profile_ids) == 2 for _, profile_ids in seeded))
+        self.assertEqual(MovieList.objects.count(), 3 * 2 * 4)
+
+    def test_every_phase_succeeds_and_counts_queries(self):
+        results = run_benchmark(ClientTransport(), seed(users=2, profiles=1, items=3), rounds=2, concurrency=1)
+        self.assertEqual(list(results), list(PHASES))
+        for phase, stats in results.items():
+            self.assertEqual(stats['requests'], 4, phase)
+            self.assertEqual(stats['errors'], 0, phase)
+            self.assertGreater(stats['queries_max'], 0, phase)
+
+
+@override_settings(METRICS={'ENABLED': True, 'SAMPLE_RATE': 1.0, 'SERVER_TIMING': True, 'TOKEN': 's3cret'})
+class MetricsTests(ViewerTestCase):
+    def setUp(self):
+        super().setUp()
+        metrics.registry.clear()
+        save_items(self.user, self.profile, [(1, 'movie')])
+
+    def scrape(self):
+        return self.client.get('/metrics', headers={'Authorization': 'Bearer s3cret'}).content.decode()
+
+    def test_sampled_request_is_recorded(self):
+        response = self.client.get('/api/profiles/')
+        self.assertIn('db;dur=', response['Server-Timing'])
+        self.assertIn('desc="2 queries"', response['Server-Timing'])
+
+        body = self.scrape()
+        self.assertIn('api_requests_total{view="get_profiles",method="GET",status="200"} 1', body)
+        self.assertIn('api_db_queries_bucket{view="get_profiles",le="2"} 1', body)
+        self.assertIn('api_db_queries_sum{view="get_profiles"} 2', body)
+        self.assertIn('api_serializer_duration_seconds_count{view="get_profiles"} 1', body)
+        self.assertIn('api_response_bytes_count{view="get_profiles"} 1', body)
+
+    def test_unsampled_request_is_only_counted(self):
+        with self.settings(METRICS={'ENABLED': True, 'SAMPLE_RATE': 0.0, 'SERVER_TIMING': True, 'TOKEN': 's3cret'}):
+            response = self.client.get('/api/profiles/')
+            body = self.scrape()
+        self.assertNotIn('Server-Timing', response)
+        self.assertIn('api_requests_total{view="get_profiles",method="GET",status="200"} 1', body)
+        self.assertNotIn('api_request_duration_seconds_count{view="get_profiles"}', body)
+
+    def test_metrics_token(self):
+        with self.settings(METRICS={'ENABLED': True, 'SAMPLE_RATE': 1.0, 'SERVER_TIMING': False, 'TOKEN': 's3cret'}):
+            self.assertEqual(self.client.get('/metrics').status_code, 403)
+            response = self.client.get('/metrics', headers={'Authorization': 'Bearer s3cret'})
+        self.assertEqual(response.status_code, 200)
+
+    def test_metrics_are_closed_without_a_token(self):
+        with self.settings(METRICS={'ENABLED': True, 'SAMPLE_RATE': 1.0, 'SERVER_TIMING': False, 'TOKEN': ''}):
+            self.assertEqual(self.client.get('/metrics').status_code, 403)
+            self.assertEqual(self.client.get('/metrics', headers={'Authorization': 'Bearer '}).status_code, 403)
+
+
+class LoggingTests(ViewerTestCase):
+    profile_name = None
+
+    def test_request_id_is_generated_or_propagated(self):
+        generated = self.client.get('/api/profiles/')
+        self.assertRegex(generated['X-Request-ID'], r'^[0-9a-f]{32}$')
+        kept = self.client.get('/api/profiles/', headers={'X-Request-ID': 'lb-1234'})
+        self.assertEqual(kept['X-Request-ID'], 'lb-1234')
+        replaced = self.client.get('/api/profiles/', headers={'X-Request-ID': 'bad id\n'})
+        self.assertNotEqual(replaced['X-Request-ID'], 'bad id\n')
+
+    def test_response_log_records_carry_the_request_id(self):
+        with self.assertLogs('django.request', 'WARNING') as logs:
+            response = self.client.get('/api/mylist/')
+        record = logs.records[0]
+        log.RequestIDFilter().filter(record)
+        self.assertEqual(record.request_id, response['X-Request-ID'])
+
+    def test_payload_logging_is_debug_only_and_redacted(self):
+        with self.assertLogs('api.views', 'DEBUG') as logs:
+            self.client.post('/api/profiles/create/', {'name': 'Kids', 'avatar': 'kid.png'}, format='json')
+        self.assertEqual(logs.records[0].payload, {'name': 'Kids', 'avatar': '[redacted]'})
+
+        with mock.patch.object(logging.getLogger('api.views'), 'debug') as debug:
+            with self.assertLogs('api.views', 'INFO'):
+                logging.getLogger('api.views').info('marker')
+                self.client.post('/api/profiles/create/', {'name': 'Adults'}, format='json')
+        debug.assert_not_called()
+
+    def test_queue_handler_writes_json_with_request_id(self):
+        stream = io.StringIO()
+        handler = log.QueueLogHandler(stream=stream)
+        handler.addFilter(log.RequestIDFilter())
+        handler.setFormatter(log.JSONFormatter())
+        logger = logging.getLogger('api.tests.queue')
+        logger.addHandler(handler)
+        token = log.set_request_id('req-1')
+        try:
+            with mock.patch.object(logger, 'propagate', False):
+                logger.warning('Row %s failed', 'trending', extra={'status': 502})
+        finally:
+            log.reset_request_id(token)
+            logger.removeHandler(handler)
+            handler.close()
+
+        entry = json.loads(stream.getvalue())
+        self.assertEqual(entry['message'], 'Row trending failed')
+        self.assertEqual(entry['request_id'], 'req-1')
+        self.assertEqual(entry['status'], 502)
+
+
+class PreferencesPatchTests(ViewerTestCase):
+    def setUp(self):
+        super().setUp()
+        Profile.objects.filter(pk=self.profile.pk).update(preferences={
+            'language': 'en', 'subtitles': {'enabled': True, 'size': 'small'}, 'favorite_genres': [28],
+        })
+        self.profile.refresh_from_db()
+        self.url = f'/api/profiles/{self.profile.id}/preferences/'
+
+    def patch(self, body, **kwargs):
+        return self.client.generic('PATCH', self.url, json.dumps(body),
+                                   content_type='application/merge-patch+json', **kwargs)
+
+    def test_patch_merges_in_one_update(self):
+        with self.assertNumQueries(1):
+            response = self.patch({'subtitles': {'size': 'large', 'enabled': None}, 'autoplay_previews': False})
+        self.assertEqual(response.status_code, 204)
+        self.profile.refresh_from_db()
+        self.assertEqual(self.profile.preferences, {
+            'language': 'en', 'subtitles': {'size': 'large'}, 'favorite_genres': [28], 'autoplay_previews': False,
+        })
+        self.assertEqual(self.profile.version, 2)
+
+    def test_null_removes_a_key(self):
+        self.patch({'language': None})
+        self.profile.refresh_from_db()
+        self.assertNotIn('language', self.profile.preferences)
+
+    def test_schema_violations_are_rejected(self):
+        response = self.patch({'subtitles': {'size': 'huge'}})
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(response.data['path'], 'preferences.subtitles.size')
+        self.assertEqual(self.patch({'theme': 'dark'}).status_code, 400)
+        self.assertEqual(self.patch({'favorite_genres': [True]}).status_code, 400)
+        self.assertEqual(self.patch(['language']).status_code, 400)
+
+    def test_size_cap_applies_to_the_merged_document(self):
+        with self.settings(PREFERENCES_MAX_SIZE=150):
+            response = self.patch({'favorite_genres': list(range(1, 40))})
+        self.assertEqual(response.status_code, 413)
+        self.profile.refresh_from_db()
+        self.assertEqual(self.profile.preferences['favorite_genres'], [28])
+
+    def test_other_users_profile_is_not_found(self):
+        other = Profile.objects.create(user=User.objects.create_user('other', password='pw'), name='Other')
+        response = self.client.patch(f'/api/profiles/{other.id}/preferences/', {'language': 'fr'}, format='json')
+        self.assertEqual(response.status_code, 404)
+
+    def test_python_fallback_matches_rfc_7396(self):
+        self.assertEqual(
+            preferences.merge_patch({'a': 'b', 'c': {'d': 'e', 'f': 'g'}}, {'a': 'z', 'c': {'f': None}}),
+            {'a': 'z', 'c': {'d': 'e'}},
+        )
+        self.assertEqual(preferences.merge_patch({'a': [1]}, {'a': {'b': None}}), {'a': {}})
+
+    def test_full_updates_are_validated_too(self):
+        response = self.client.put(f'/api/profiles/{self.profile.id}/update/',
+                                   {'preferences': {'language': 5}}, format='json')
+        self.assertEqual(response.status_code, 400)
+
+    def test_both_size_checks_count_the_same_characters(self):
+        document = {'language': 'ééé', 'favorite_genres': [1, 2]}
+        size = preferences.encoded_size(document)
+        for limit, put_status, patch_status in ((size, 200, 204), (size - 1, 400, 400)):
+            Profile.objects.filter(pk=self.profile.pk).update(preferences={})
+            with self.settings(PREFERENCES_MAX_SIZE=limit):
+                response = self.client.put(f'/api/profiles/{self.profile.id}/update/',
+                                           {'preferences': document}, format='json')
+                self.assertEqual(response.status_code, put_status)
+                Profile.objects.filter(pk=self.profile.pk).update(preferences={})
+                self.assertEqual(self.patch(document).status_code, patch_status)
+        # Postgres prints jsonb with spaces and unescaped characters.
+        with mock.patch.object(connection, 'vendor', 'postgresql'):
+            size = preferences.encoded_size(document)
+        self.assertEqual(size, len('{"language": "ééé", "favorite_genres": [1, 2]}'))
+
+    def test_migration_sets_rejected_entries_aside(self):
+        migration = importlib.import_module('api.migrations.0019_retire_unknown_preferences')
+        legacy = {
+            'language': 'en', 'theme': 'dark', 'maturity_rating': 'PG',
+            'subtitles': {'size': 'large', 'color': 'red'}, 'favorite_genres': [28, 'x'],
+        }
+        Profile.objects.filter(pk=self.profile.pk).update(preferences=legacy)
+        untouched = Profile.objects.create(user=self.user, name='Kids', preferences={'language': 'fr'})
+        migration.retire(django_apps, connection.schema_editor())
+        self.profile.refresh_from_db()
+        untouched.refresh_from_db()
+        self.assertEqual(self.profile.preferences, {'language': 'en', 'subtitles': {'size': 'large'}})
+        self.assertEqual(self.profile.retired_preferences, {
+            'theme': 'dark', 'maturity_rating': 'PG', 'subtitles': {'color': 'red'}, 'favorite_genres': [28, 'x'],
+        })
+        self.assertEqual((self.profile.version, untouched.version), (2, 1))
+        response = self.client.put(f'/api/profiles/{self.profile.id}/update/',
+                                   {'name': 'Main', 'preferences': self.profile.preferences}, format='json')
+        self.assertEqual(response.status_code, 200)
+        self.assertNotIn('retired_preferences', response.data)
+
+        migration.restore(django_apps, connection.schema_editor())
+        self.profile.refresh_from_db()
+        self.assertEqual((self.profile.preferences, self.profile.retired_preferences), (legacy, {}))
+
+    def test_stored_nulls_outside_the_patch_are_kept(self):
+        # Merge patches only delete the keys they set to null, on every backend.
+        stored = {'language': 'fr', 'legacy': None, 'subtitles': {'enabled': True, 'color': None}}
+        patch = {'audio_language': 'en', 'subtitles': {'enabled': None}}
+        Profile.objects.filter(pk=self.profile.pk).update(preferences=stored)
+        self.assertEqual(preferences.apply_patch(Profile.objects.filter(pk=self.profile.pk), patch), 1)
+        self.profile.refresh_from_db()
+        expected = {'language': 'fr', 'legacy': None, 'audio_language': 'en', 'subtitles': {'color': None}}
+        self.assertEqual(self.profile.preferences, expected)
+        self.assertEqual(preferences.merge_patch(stored, patch), expected)
+
+
+@override_settings(RECOMMENDATIONS={
+    'NEIGHBORS': 5, 'MIN_SUPPORT': 1, 'BLOCK_SIZE': 2, 'CACHE_ALIAS': 'default', 'CACHE_TTL': 600,
+})
+class RecommendationTests(ViewerTestCase):
+    profile_name = None
+
+    def setUp(self):
+        super().setUp()
+        self.profiles = []
+        # 1 and 2 are usually saved together; 3 only sometimes with 1.
+        for items in ([1, 2], [1, 2, 3], [1, 2], [3, 4], [2]):
+            self.profiles.append(self.save_list(items))
+
+    def save_list(self, items):
+        profile = Profile.objects.create(user=self.user, name=f'P{len(getattr(self, "profiles", []))}')
+        save_items(self.user, profile, [(item, 'movie') for item in items])
+        return profile
+
+    def test_top_neighbors_match_cosine_similarity(self):
+        pairs = list(MovieList.objects.values_list('profile_id', 'item_id'))
+        neighbors = list(recommendations.top_neighbors([p for p, _ in pairs], [i for _, i in pairs], k=2, block_size=3))
+        by_item = {}
+        for item_id, neighbor_id, score in neighbors:
+            by_item.setdefault(item_id, []).append((neighbor_id, round(score, 4)))
+        # saves: 1 -> 3, 2 -> 4, 3 -> 2, 4 -> 1; co(1,2) = 3, co(1,3) = 1, co(3,4) = 1
+        self.assertEqual(by_item[1], [(2, round(3 / 12 ** 0.5, 4)), (3, round(1 / 6 ** 0.5, 4))])
+        self.assertEqual(by_item[4], [(3, round(1 / 2 ** 0.5, 4))])
+
+    def test_profile_recommendations(self):
+        recommendations.rebuild()
+        profile = self.save_list([1])
+        response = self.client.get('/api/recommendations/', {'profile_id': profile.id})
+        results = response.data['results']
+        self.assertEqual([row['item_id'] for row in results], [2, 3])
+        self.assertEqual(results[0]['title'], 'Title 2')
+        self.assertEqual(results[0]['media_type'], 'movie')
+        self.assertEqual(results[0]['because'], {'item_id': 1, 'media_type': 'movie', 'title': 'Title 1'})
+
+        with self.assertNumQueries(1):
+            self.client.get('/api/recommendations/', {'profile_id': profile.id})
+
+    def test_list_changes_refresh_incrementally(self):
+        recommendations.rebuild()
+        self.assertFalse(ItemNeighbor.objects.filter(item_id=5).exists())
+        profile = self.profiles[0]
+        self.client.post('/api/mylist/add/', {'profile_id': profile.id, 'item_id': 5, 'title': 'Five',
+                                              'poster_path': '/5.jpg', 'media_type': 'movie'}, format='json')
+        self.assertTrue(StaleItem.objects.filter(item_id=5, media_type='movie').exists())
+
+        # The signal carries bare ids, so both media types of 5 were marked.
+        self.assertEqual(recommendations.refresh_stale(), 2)
+        self.assertEqual(
+            set(ItemNeighbor.objects.filter(item_id=5, media_type='movie').values_list('neighbor_id', flat=True)),
+            {1, 2},
+        )
+        self.assertFalse(ItemNeighbor.objects.filter(item_id=5, media_type='tv').exists())
+        self.assertFalse(StaleItem.objects.exists())
+
+    def test_movies_and_shows_with_the_same_id_are_separate_items(self):
+        # tv 1 is saved with 4 only, movie 1 with 2 (and 3).
+        for _ in range(2):
+            save_items(self.user, Profile.objects.create(user=self.user, name='Shows'), [(1, 'tv'), (4, 'movie')])
+        recommendations.rebuild()
+        neighbors = ItemNeighbor.objects.values_list('neighbor_id', 'neighbor_media_type')
+        self.assertEqual(list(neighbors.filter(item_id=1, media_type='tv')), [(4, 'movie')])
+        self.assertNotIn((4, 'movie'), list(neighbors.filter(item_id=1, media_type='movie')))
+
+        recommendations.refresh_item(1, 'tv')
+        self.assertEqual(list(neighbors.filter(item_id=1, media_type='tv')), [(4, 'movie')])
+
+        profile = Profile.objects.create(user=self.user, name='New')
+        save_items(self.user, profile, [(1, 'tv')])
+        response = self.client.get('/api/recommendations/', {'profile_id': profile.id})
+        self.assertEqual([(row['item_id'], row['media_type']) for row in response.data['results']], [(4, 'movie')])
+
+    def test_rebuild_memory_does_not_grow_with_the_catalog(self):
+        # 100k items saved once each, plus a few pairs: a dense block would be 1024 x 100k floats.
+        items = np.arange(100_000)
+        profiles = np.concatenate([items, [0, 0, 1]])
+        items = np.concatenate([items, [1, 2, 2]])
+        tracemalloc.start()
+        try:
+            neighbors = list(recommendations.top_neighbors(profiles, items, k=5))
+            peak = tracemalloc.get_traced_memory()[1]
+        finally:
+            tracemalloc.stop()
+        self.assertLess(peak, 64 * 1024 * 1024)
+        scores = {(item_id, neighbor_id): round(score, 4) for item_id, neighbor_id, score in neighbors}
+        self.assertEqual(len(scores), 6)
+        self.assertEqual(scores[1, 2], round(2 / 6 ** 0.5, 4))
+        self.assertEqual(scores[0, 1], round(1 / 2 ** 0.5, 4))
+
+
+class TitleSearchTests(ViewerTestCase):
+    profile_name = None
+
+    RESULTS = [
+        {'id': 155, 'media_type': 'movie', 'title': 'The Dark Knight', 'poster_path': '/dk.jpg',
+         'release_date': '2008-07-16', 'popularity': 90.0},
+        {'id': 49026, 'media_type': 'movie', 'title': 'The Dark Knight Rises', 'poster_path': '/dkr.jpg',
+         'release_date': '2012-07-16', 'popularity': 70.0},
+        {'id': 70523, 'media_type': 'tv', 'name': 'Dark', 'poster_path': '/dark.jpg',
+         'first_air_date': '2017-12-01', 'popularity': 50.0},
+        {'id': 3894, 'media_type': 'person', 'name': 'Dark Person'},
+    ]
+
+    def setUp(self):
+        super().setUp()
+        self.upstream = StubUpstream(results=self.RESULTS)
+        self.addCleanup(self.upstream.close)
+        self.settings_override = override_settings(TMDB_BASE_URL=self.upstream.url)
+        self.settings_override.enable()
+        self.addCleanup(self.settings_override.disable)
+
+    def test_catalog_fetches_index_titles(self):
+        self.client.get('/api/catalog/trending/all/week')
+        self.assertEqual(
+            set(Title.objects.values_list('item_id', 'media_type')),
+            {(155, 'movie'), (49026, 'movie'), (70523, 'tv')},
+        )
+        dark = Title.objects.get(item_id=70523)
+        self.assertEqual((dark.title, str(dark.release_date)), ('Dark', '2017-12-01'))
+
+    def test_prefix_search_ranks_local_matches(self):
+        titles.index_payload('trending/all/week', {'results': self.RESULTS})
+        response = self.client.get('/api/search/', {'q': 'dark kn', 'limit': 2})
+        self.assertEqual(response.data['source'], 'local')
+        self.assertEqual([row['item_id'] for row in response.data['results']], [155, 49026])
+        self.assertEqual(response.data['results'][0]['release_date'], '2008-07-16')
+
+        response = self.client.get('/api/search/', {'q': 'dark', 'media_type': 'tv', 'limit': 1})
+        self.assertEqual([row['item_id'] for row in response.data['results']], [70523])
+        self.assertEqual(self.upstream.hits, {})
+
+    def test_renamed_titles_are_reindexed(self):
+        titles.index_payload('movie/popular', {'results': self.RESULTS[:1]})
+        titles.index_payload('movie/popular', {'results': [{**self.RESULTS[0], 'title': 'Batman Returns'}]})
+        self.assertEqual(titles.search_titles('dark'), [])
+        self.assertEqual([title.item_id for title in titles.search_titles('batm')], [155])
+
+    def test_falls_back_to_upstream_and_indexes_results(self):
+        response = self.client.get('/api/search/', {'q': 'dark'})
+        self.assertEqual(response.data['source'], 'upstream')
+        self.assertEqual([row['item_id'] for row in response.data['results']], [155, 49026, 70523])
+        self.assertEqual(self.upstream.hits, {'3/search/multi': 1})
+
+        response = self.client.get('/api/search/', {'q': 'dark'})
+        self.assertEqual(response.data['source'], 'local')
+        self.assertEqual(self.upstream.hits, {'3/search/multi': 1})
+
+    def test_short_queries_return_nothing(self):
+        response = self.client.get('/api/search/', {'q': 'd'})
+        self.assertEqual(response.data, {'source': 'local', 'results': []})
+
+    def test_my_list_additions_are_remembered(self):
+        profile = Profile.objects.create(user=self.user, name='Main')
+        self.client.post('/api/mylist/add/', {'profile_id': profile.id, 'item_id': 603, 'title': 'The Matrix',
+                                              'poster_path': '/m.jpg', 'media_type': 'movie'}, format='json')
+        self.assertEqual([title.item_id for title in titles.search_titles('matr')], [603])
+
+    def test_list_rows_share_title_metadata(self):
+        profiles = [Profile.objects.create(user=self.user, name=name) for name in ('A', 'B')]
+        for profile in profiles:
+            save_items(self.user, profile, [(155, 'movie')])
+        self.assertEqual(Title.objects.count(), 1)
+
+        # A catalog refresh updates the poster on every list at once.
+        titles.index_payload('movie/popular', {'results': self.RESULTS[:1]})
+        with self.assertNumQueries(2):
+            response = self.client.get('/api/mylist/', {'profile_id': profiles[1].id})
+        self.assertEqual(response.data['results'][0]['poster_path'], '/dk.jpg')
+        self.assertEqual(response.data['results'][0]['title'], 'The Dark Knight')
+
+    def test_metadata_changes_invalidate_list_etags(self):
+        profile = Profile.objects.create(user=self.user, name='Main')
+        save_items(self.user, profile, [(155, 'movie')])
+        etag = self.client.get('/api/mylist/', {'profile_id': profile.id})['ETag']
+        profiles_etag = self.client.get('/api/profiles/')['ETag']
+
+        # Popularity alone does not show in the list.
+        titles.index_payload('movie/popular', {'results': [{**self.RESULTS[0], 'popularity': 1.0}]})
+        titles.index_payload('movie/popular', {'results': [{**self.RESULTS[0], 'popularity': 2.0}]})
+        response = self.client.get('/api/mylist/', {'profile_id': profile.id}, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+        etag = response['ETag']
+        self.assertEqual(self.client.get('/api/mylist/', {'profile_id': profile.id},
+                                         HTTP_IF_NONE_MATCH=etag).status_code, 304)
+
+        titles.index_payload('movie/popular', {'results': [{**self.RESULTS[0], 'title': 'Batman Returns'}]})
+        response = self.client.get('/api/mylist/', {'profile_id': profile.id}, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.data['results'][0]['title'], 'Batman Returns')
+        self.assertNotEqual(self.client.get('/api/profiles/')['ETag'], profiles_etag)
+
+    def test_metadata_changes_invalidate_browse_pages(self):
+        listing, other = (Profile.objects.create(user=self.user, name=name) for name in ('Main', 'Kids'))
+        save_items(self.user, listing, [(155, 'movie')])
+        titles.index_payload('movie/popular', {'results': self.RESULTS[:1]})
+        for profile in (listing, other):
+            cache.set(browse.cache_key(profile.id), 'page')
+
+        with self.captureOnCommitCallbacks(execute=True):
+            titles.index_payload('movie/popular', {'results': [{**self.RESULTS[0], 'popularity': 1.0}]})
+        self.assertEqual(cache.get(browse.cache_key(listing.id)), 'page')
+
+        with self.captureOnCommitCallbacks(execute=True):
+            titles.index_payload('movie/popular', {'results': [{**self.RESULTS[0], 'title': 'Batman Returns'}]})
+        self.assertIsNone(cache.get(browse.cache_key(listing.id)))
+        self.assertEqual(cache.get(browse.cache_key(other.id)), 'page')
+
+    def test_missing_posters_keep_the_known_one(self):
+        titles.index_payload('movie/popular', {'results': self.RESULTS[:1]})
+        titles.index_payload('movie/popular', {'results': [{**self.RESULTS[0], 'poster_path': None}]})
+        self.assertEqual(Title.objects.get(item_id=155).poster_path, '/dk.jpg')
+
+
+@override_settings(PLAYBACK_PROGRESS={
+    'CACHE_ALIAS': 'default', 'FLUSH_INTERVAL': 0, 'MAX_PENDING': 5000, 'SHARED_TTL': 600, 'FINISHED_RATIO': 0.95,
+})
+class PlaybackProgressTests(ViewerTestCase):
+    def setUp(self):
+        super().setUp()
+        self.buffer = progress.get_progress_buffer()
+        self.addCleanup(progress.reset_progress_buffer)
+
+    def report(self, item_id, position, **extra):
+        return self.client.post('/api/progress/', {
+            'profile_id': self.profile.id, 'item_id': item_id, 'position': position,
+            'duration': 1000, 'media_type': 'movie', **extra,
+        }, format='json')
+
+    def test_heartbeats_are_buffered_and_coalesced(self):
+        self.report(1, 10)
+        with self.assertNumQueries(0):
+            for position in (20, 30, 40):
+                self.assertEqual(self.report(1, position).status_code, 202)
+        self.report(2, 5, media_type='tv', season=1, episode=3)
+        self.assertFalse(PlaybackProgress.objects.exists())
+
+        # Two reads and one upsert, inside a savepoint under TestCase.
+        with self.assertNumQueries(5):
+            self.assertEqual(self.buffer.flush(), 2)
+        self.assertEqual(
+            set(PlaybackProgress.objects.values_list('item_id', 'position', 'episode')), {(1, 40, None), (2, 5, 3)}
+        )
+
+    def test_continue_watching_merges_buffer_and_database(self):
+        titles.index_payload('movie/popular', {'results': [{'id': 1, 'title': 'One', 'poster_path': '/1.jpg'}]})
+        self.report(1, 100)
+        self.report(2, 990)  # Finished.
+        self.buffer.flush()
+        self.report(3, 50)
+        self.report(1, 200)
+
+        response = self.client.get('/api/progress/continue/', {'profile_id': self.profile.id})
+        results = response.data['results']
+        self.assertEqual([(row['item_id'], row['position']) for row in results], [(1, 200), (3, 50)])
+        self.assertEqual((results[0]['title'], results[0]['poster_path']), ('One', '/1.jpg'))
+
+    def test_other_workers_see_buffered_reports(self):
+        self.report(7, 30)
+        other = progress.ProgressBuffer(shared=cache, flush_interval=0)
+        self.assertEqual(other.pending(self.profile.id)[7]['position'], 30)
+
+    def test_stale_reports_do_not_overwrite_newer_rows(self):
+        self.report(1, 300)
+        older = dict(self.buffer.pending(self.profile.id)[1], position=100)
+        older['updated_at'] -= timezone.timedelta(seconds=10)
+        self.buffer.flush()
+        self.assertEqual(progress.write_progress([older]), 0)
+        self.assertEqual(PlaybackProgress.objects.get().position, 300)
+
+    def test_rejects_profiles_of_other_users(self):
+        other = Profile.objects.create(user=User.objects.create_user('other', password='pw'), name='Other')
+        response = self.client.post('/api/progress/', {'profile_id': other.id, 'item_id': 1, 'position': 1},
+                                    format='json')
+        self.assertEqual(response.status_code, 404)
+
+    def test_background_flusher_writes_batches(self):
+        written = []
+        buffer = progress.ProgressBuffer(flush_interval=0.05, write=lambda entries: written.append(list(entries)))
+        for position in range(5):
+            buffer.record(progress.make_entry(self.profile.id, 1, position))
+        deadline = time.monotonic() + 2
+        while not written and time.monotonic() < deadline:
+            time.sleep(0.01)
+        buffer.close()
+        self.assertEqual([[entry['position'] for entry in batch] for batch in written], [[4]])
+
+
+class ThrottleTests(TestCase):
+    RATES = {'anon': '100/day', 'user': '3/m', 'auth': {'rate': '1/s', 'burst': 2}, 'search': '100/m'}
+
+    def setUp(self):
+        cache.clear()
+        self.now = 60 * 16_000 + 20.0  # 20 seconds into a minute window
+        timer = mock.patch.object(throttling.SlidingWindowThrottle, 'timer', lambda throttle: self.now)
+        timer.start()
+        self.addCleanup(timer.stop)
+        rates = override_settings(REST_FRAMEWORK={**settings.REST_FRAMEWORK, 'DEFAULT_THROTTLE_RATES': self.RATES})
+        rates.enable()
+        self.addCleanup(rates.disable)
+
+    def test_parse_rate(self):
+        self.assertEqual(throttling.parse_rate('100/day'), (100, 86400))
+        self.assertEqual(throttling.parse_rate('5/10m'), (5, 600))
+        self.assertEqual(throttling.parse_rate({'rate': '2/s', 'burst': 20}), (20, 10))
+
+    def test_sliding_window_weighs_the_previous_window(self):
+        client = APIClient()
+        client.force_authenticate(User.objects.create_user('viewer', password='pw'))
+        for _ in range(3):
+            self.assertEqual(client.get('/api/test/').status_code, 200)
+        response = client.get('/api/test/')
+        self.assertEqual(response.status_code, 429)
+        self.assertEqual(response['Retry-After'], '60')
+
+        # 20 seconds into the next window, a third of the previous window
+        # has slid out: 3 * 2 / 3 + 1 <= 3, but not + 2.
+        self.now += 60
+        self.assertEqual([client.get('/api/test/').status_code for _ in range(2)], [200, 429])
+
+    def test_burst_then_refill(self):
+        register = lambda name: self.client.post('/api/register/', {'username': name, 'password': 'pw'})
+        self.assertEqual([register(f'u{i}').status_code for i in range(3)], [201, 201, 429])
+        # A burst of 2 at 1/s is counted as 2 per 2 seconds; halfway through
+        # the next window one request fits again.
+        self.now += 3
+        self.assertEqual([register(f'v{i}').status_code for i in range(2)], [201, 429])
+
+    def test_scopes_are_independent(self):
+        client = APIClient()
+        client.force_authenticate(User.objects.create_user('viewer', password='pw'))
+        for _ in range(5):
+            self.assertEqual(client.get('/api/search/', {'q': 'x'}).status_code, 200)
+        self.assertEqual(client.get('/api/test/').status_code, 200)
+
+    def test_state_is_two_counters_per_key(self):
+        client = APIClient()
+        client.force_authenticate(User.objects.create_user('viewer', password='pw'))
+        for _ in range(2):
+            client.get('/api/test/')
+            self.now += 60
+        self.assertEqual(len([key for key in cache._cache if 'throttle:user:' in key]), 2)
+
+
+@override_settings(PASSWORD_HASH_ITERATIONS=1000, LOGIN_PIPELINE=BUFFERED_LOGINS)
+class LoginPipelineTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.user = User.objects.create_user('viewer', password='pw')
+        self.client = APIClient()
+        self.addCleanup(logins.reset_login_buffer)
+
+    def login(self):
+        return self.client.post('/api/token/', {'username': 'viewer', 'password': 'pw'})
+
+    def refresh(self, token):
+        return self.client.post('/api/token/refresh/', {'refresh': token})
+
+    def test_login_upgrades_the_password_hash(self):
+        self.assertTrue(self.user.password.startswith('pbkdf2_sha256$1000$'))
+        with self.settings(PASSWORD_HASH_ITERATIONS=2000):
+            self.assertEqual(self.login().status_code, 200)
+        self.user.refresh_from_db()
+        self.assertTrue(self.user.password.startswith('pbkdf2_sha256$2000$'))
+        self.assertEqual(self.login().status_code, 200)
+
+    def test_login_never_lowers_the_work_factor(self):
+        with self.settings(PASSWORD_HASH_ITERATIONS=500):
+            self.assertEqual(self.login().status_code, 200)
+        self.user.refresh_from_db()
+        self.assertTrue(self.user.password.startswith('pbkdf2_sha256$1000$'))
+
+        with self.settings(PASSWORD_HASH_ITERATIONS=None):
+            self.assertEqual(get_hasher().iterations, PBKDF2PasswordHasher.iterations)
+
+    def test_last_login_is_written_in_batches(self):
+        # Only the user; no write.
+        with self.assertNumQueries(1):
+            self.assertEqual(self.login().status_code, 200)
+        self.user.refresh_from_db()
+        self.assertIsNone(self.user.last_login)
+
+        self.assertEqual(logins.get_login_buffer().flush(), 1)
+        self.user.refresh_from_db()
+        self.assertIsNotNone(self.user.last_login)
+
+    def test_refresh_token_is_single_use(self):
+        first = self.login().data['refresh']
+        response = self.refresh(first)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(self.refresh(first).status_code, 401)
+        self.assertEqual(self.refresh(response.data['refresh']).status_code, 200)
+
+    def test_revoked_refresh_token_is_rejected_after_the_cache_forgets_it(self):
+        token = self.login().data['refresh']
+        authentication.revoke_token(RefreshToken(token))
+        cache.clear()
+        with self.settings(SIMPLE_JWT={**settings.SIMPLE_JWT, 'ROTATE_REFRESH_TOKENS': False}):
+            self.assertEqual(self.refresh(token).status_code, 401)
+
+    def test_prune_deletes_expired_revocations_only(self):
+        now = timezone.now()
+        RevokedToken.objects.bulk_create(
+            [RevokedToken(jti=f'old{n}', expires_at=now - timezone.timedelta(hours=1)) for n in range(3)]
+            + [RevokedToken(jti='live', expires_at=now + timezone.timedelta(hours=1))]
+        )
+        out = io.StringIO()
+        call_command('prune_revoked_tokens', batch_size=2, stdout=out)
+        self.assertIn('Deleted 3 revoked tokens', out.getvalue())
+        self.assertEqual(list(RevokedToken.objects.values_list('jti', flat=True)), ['live'])
+
+
+@routers.replica_reads
+def read_alias(request):
+    return router.db_for_read(Profile)
+
+
+@override_settings(DATABASE_ROUTING={'REPLICAS': ['replica1'], 'STICKY_SECONDS': 5, 'CACHE_ALIAS': 'default'})
+class ReplicaRoutingTests(ViewerTestCase):
+    profile_name = None
+
+    def setUp(self):
+        super().setUp()
+        self.request = mock.Mock(user=self.user)
+
+    def test_decorated_views_read_from_a_replica(self):
+        self.assertEqual(read_alias(self.request), 'replica1')
+        self.assertEqual(router.db_for_read(Profile), 'default')
+        self.assertEqual(router.db_for_write(Profile), 'default')
+
+    def test_async_handlers_read_from_a_replica(self):
+        class View:
+            @routers.replica_reads
+            async def get(self, request):
+                return router.db_for_read(Profile)
+
+        self.assertEqual(asyncio.run(View().get(self.request)), 'replica1')
+        routers.pin(self.user.id)
+        with mock.patch.object(routers, 'is_pinned', side_effect=AssertionError):
+            self.assertEqual(asyncio.run(View().get(self.request)), 'default')
+
+    def test_writes_pin_the_user_to_the_primary(self):
+        response = self.client.post('/api/profiles/create/', {'name': 'Kids'}, format='json')
+        self.assertEqual(response.status_code, 201)
+        self.assertTrue(routers.is_pinned(self.user.id))
+        self.assertEqual(read_alias(self.request), 'default')
+
+    def test_reads_do_not_pin(self):
+        Profile.objects.create(user=self.user, name='Main')
+        # The test database stands in for the replica.
+        with self.settings(DATABASE_ROUTING={'REPLICAS': ['default'], 'STICKY_SECONDS': 5, 'CACHE_ALIAS': 'default'}):
+            response = self.client.get('/api/profiles/')
+        self.assertEqual(len(response.data), 1)
+        self.assertFalse(routers.is_pinned(self.user.id))
+
+
+def poster_bytes(width=600, height=900):
+    image = images.Image.new('RGB', (width, height), (200, 30, 30))
+    out = io.BytesIO()
+    image.save(out, 'JPEG')
+    return out.getvalue()
+
+
+@skipIf(images.Image is None, 'Pillow is not installed')
+class ImageProxyTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.upstream = StubUpstream(images={'poster.jpg': poster_bytes()})
+        self.addCleanup(self.upstream.close)
+        workdir = tempfile.TemporaryDirectory()
+        self.addCleanup(workdir.cleanup)
+        self.cache_dir = workdir.name
+        override = override_settings(IMAGE_PROXY={
+            **settings.IMAGE_PROXY, 'UPSTREAM_URL': self.upstream.url, 'CACHE_DIR': self.cache_dir,
+            'SENDFILE_HEADER': '',
+        })
+        override.enable()
+        self.addCleanup(override.disable)
+
+    def fetch(self, path, **headers):
+        response = self.client.get(f'/api/images/{path}', headers=headers)
+        body = b''.join(response.streaming_content) if response.streaming else response.content
+        return response, body
+
+    def test_variants_are_made_from_one_upstream_fetch(self):
+        response, body = self.fetch('w342/poster.jpg')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response['Content-Type'], 'image/jpeg')
+        self.assertEqual(response['Cache-Control'], images.IMMUTABLE)
+        self.assertEqual(images.Image.open(io.BytesIO(body)).size, (342, 513))
+
+        self.fetch('w342/poster.jpg')
+        response, body = self.fetch('w92/poster.jpg?format=webp')
+        self.assertEqual(response['Content-Type'], 'image/webp')
+        self.assertEqual(images.Image.open(io.BytesIO(body)).size, (92, 138))
+        self.assertEqual(self.upstream.hits, {'3/poster.jpg': 1})
+
+    def test_etag_is_the_content_digest(self):
+        response, body = self.fetch('original/poster.jpg')
+        self.assertEqual(response['ETag'], f'"{hashlib.sha256(body).hexdigest()}"')
+        response, _ = self.fetch('original/poster.jpg', if_none_match=response['ETag'])
+        self.assertEqual(response.status_code, 304)
+
+    def test_sendfile_header_hands_the_blob_to_the_proxy(self):
+        with self.settings(IMAGE_PROXY={**settings.IMAGE_PROXY, 'SENDFILE_HEADER': 'X-Accel-Redirect'}):
+            response, body = self.fetch('w185/poster.jpg')
+        self.assertEqual(body, b'')
+        self.assertRegex(response['X-Accel-Redirect'], r'^/image-cache/blobs/[0-9a-f]{2}/[0-9a-f]{64}\.jpg$')
+
+    def test_rejects_unknown_sizes_and_names(self):
+        for url in ('w123/poster.jpg', 'w342/..%2Fsettings.py', 'w342/poster.gif', 'w342/poster.jpg?format=avif'):
+            self.assertEqual(self.fetch(url)[0].status_code, 404, url)
+        self.assertEqual(self.upstream.hits, {})
+
+    def test_missing_upstream_images_are_remembered(self):
+        self.assertEqual(self.fetch('w342/gone.jpg')[0].status_code, 502)
+        self.upstream.status = 404
+        self.assertEqual(self.fetch('w342/gone.jpg')[0].status_code, 404)
+        self.assertEqual(self.fetch('w342/gone.jpg')[0].status_code, 404)
+        self.assertEqual(self.upstream.hits['3/gone.jpg'], 2)
+
+    def test_decompression_bombs_are_a_bad_gateway(self):
+        with mock.patch.object(images.Image, 'MAX_IMAGE_PIXELS', 1000), self.assertLogs('api.images', 'WARNING'):
+            self.assertEqual(self.fetch('w342/poster.jpg')[0].status_code, 502)
+
+    def test_requests_are_throttled_per_address(self):
+        rates = {**settings.REST_FRAMEWORK['DEFAULT_THROTTLE_RATES'], 'images': {'rate': '1/m', 'burst': 2}}
+        with self.settings(REST_FRAMEWORK={**settings.REST_FRAMEWORK, 'DEFAULT_THROTTLE_RATES': rates}):
+            for _ in range(2):
+                self.assertEqual(self.fetch('original/poster.jpg')[0].status_code, 200)
+            response, _ = self.fetch('original/poster.jpg')
+        self.assertEqual(response.status_code, 429)
+        self.assertIn('Retry-After', response)
+
+    def test_least_recently_served_blobs_are_evicted(self):
+        store = images.ImageCache(self.cache_dir, max_bytes=250, low_water=0.5)
+        for index in range(3):
+            path, _, _ = store.store(f'key{index}', bytes([index]) * 100, 'jpg')
+            os.utime(path, (1000 + index, 1000 + index))
+        self.assertIsNone(store.lookup('key0'))
+        self.assertIsNone(store.lookup('key1'))
+        self.assertIsNotNone(store.lookup('key2'))
+
+
+class FastResponseTests(ViewerTestCase):
+    def setUp(self):
+        super().setUp()
+        Profile.objects.filter(pk=self.profile.pk).update(preferences={'language': 'fr'})
+        self.profile.refresh_from_db()
+        Profile.objects.create(user=self.user, name='Empty')
+        save_items(self.user, self.profile, [(item, 'tv' if item % 2 else None) for item in range(60)])
+
+    def test_profiles_match_the_model_serializer(self):
+        profiles = Profile.objects.filter(user=self.user).order_by('id').annotate(list_count=Count('movie_lists'))
+        profiles = profiles.prefetch_related(Prefetch(
+            'movie_lists', queryset=MovieList.objects.select_related('title').order_by('-added_date'),
+        ))
+        expected = JSONRenderer().render(ProfileSerializer(profiles, many=True).data)
+        response = self.client.get('/api/profiles/')
+        self.assertEqual(json.loads(response.content), json.loads(expected))
+
+    def test_movie_list_pages_match_the_model_serializer(self):
+        movies = MovieList.objects.filter(profile=self.profile).select_related('title')
+        movies = movies.order_by('position', '-added_date', '-id')
+        expected = json.loads(JSONRenderer().render(MovieListSerializer(movies[:50], many=True).data))
+        response = self.client.get('/api/mylist/', {'profile_id': self.profile.id, 'ordering': 'position'})
+        self.assertEqual(json.loads(response.content)['results'], expected)
+        response = self.client.get(response.data['next'])
+        self.assertEqual(len(response.data['results']), 10)
+
+    def test_renderer_output_matches_drf(self):
+        data = {
+            'when': timezone.now(), 'price': Decimal('9.50'), 'label': gettext_lazy('Title'),
+            'id': uuid.uuid4(), 3: [None, True, 1.5, 'é'],
+        }
+        self.assertEqual(FastJSONRenderer().render(data), JSONRenderer().render(data))
+        self.assertEqual(FastJSONRenderer().render(None), b'')
+
+    def test_invalid_json_body_is_a_parse_error(self):
+        response = self.client.post('/api/profiles/create/', b'{"name": ', content_type='application/json')
+        self.assertEqual(response.status_code, 400)
+
+    def test_large_responses_are_gzipped(self):
+        plain = self.client.get('/api/mylist/', {'profile_id': self.profile.id})
+        response = self.client.get('/api/mylist/', {'profile_id': self.profile.id}, headers={
+            'accept-encoding': 'br;q=0, gzip',
+        })
+        self.assertEqual(response['Content-Encoding'], 'gzip')
+        self.assertIn('Accept-Encoding', response['Vary'])
+        self.assertEqual(response['ETag'], 'W/' + plain['ETag'])
+        self.assertEqual(gzip.decompress(response.content), plain.content)
+        self.assertLess(int(response['Content-Length']), len(plain.content) // 4)
+
+    def test_small_or_refused_responses_are_sent_as_is(self):
+        params = {'profile_id': self.profile.id, 'page_size': 1}
+        response = self.client.get('/api/mylist/', params, headers={'accept-encoding': 'gzip'})
+        self.assertFalse(response.has_header('Content-Encoding'))
+        response = self.client.get('/api/mylist/', {'profile_id': self.profile.id}, headers={
+            'accept-encoding': 'gzip;q=0',
+        })
+        self.assertFalse(response.has_header('Content-Encoding'))
+        self.assertEqual(json.loads(response.content)['results'][0]['item_id'], 59)
+
+
+@override_settings(MY_LIST_TRANSFER={'EXPORT_CHUNK_SIZE': 7, 'IMPORT_BATCH_SIZE': 10, 'IMPORT_MAX_ROWS': 100})
+class ListTransferTests(ViewerTestCase):
+    def setUp(self):
+        super().setUp()
+        self.source = self.profile
+        self.target = Profile.objects.create(user=self.user, name='Copy')
+        save_items(self.user, self.source, [(item, 'tv' if item % 3 == 0 else 'movie') for item in range(25)])
+
+    def export(self, fmt):
+        response = self.client.get(f'/api/mylist/export.{fmt}', {'profile_id': self.source.id})
+        self.assertEqual(response.status_code, 200)
+        self.assertTrue(response.streaming)
+        return b''.join(response.streaming_content)
+
+    async def test_asgi_exports_stream_asynchronously(self):
+        headers = {'Authorization': f'Bearer {AccessToken.for_user(self.user)}'}
+        response = await self.async_client.get(
+            '/api/mylist/export.ndjson', {'profile_id': self.source.id}, headers=headers,
+        )
+        self.assertTrue(response.is_async)
+        lines = b''.join([chunk async for chunk in response.streaming_content]).splitlines()
+        self.assertEqual([json.loads(line)['item_id'] for line in lines], list(range(25)))
+
+    def upload(self, body, content_type):
+        return self.client.generic(
+            'POST', f'/api/mylist/import/?profile_id={self.target.id}', body, content_type=content_type,
+        )
+
+    def listed(self, profile):
+        return list(
+            MovieList.objects.filter(profile=profile).order_by('-added_date', '-id')
+            .values_list('item_id', 'media_type', 'title__title', 'title__poster_path')
+        )
+
+    def test_ndjson_round_trip_keeps_the_order(self):
+        body = self.export('ndjson')
+        lines = body.splitlines()
+        self.assertEqual(len(lines), 25)
+        self.assertEqual(json.loads(lines[0])['item_id'], 0)
+
+        with CaptureQueriesContext(connection) as queries:
+            response = self.upload(body, 'application/x-ndjson')
+        self.assertEqual(response.data, {'rows': 25, 'added': 25})
+        inserts = [query for query in queries if query['sql'].startswith('INSERT') and '"api_movielist"' in query['sql']]
+        self.assertEqual(len(inserts), 3)
+        self.assertEqual(self.listed(self.target), self.listed(self.source))
+
+        response = self.upload(body, 'application/x-ndjson')
+        self.assertEqual(response.data, {'rows': 25, 'added': 0})
+
+    def test_csv_round_trip(self):
+        body = self.export('csv')
+        self.assertTrue(body.startswith(b'item_id,media_type,title,poster_path,position,added_date\r\n'))
+        response = self.upload(b'\xef\xbb\xbf' + body, 'text/csv; charset=utf-8')
+        self.assertEqual(response.data, {'rows': 25, 'added': 25})
+        self.assertEqual(self.listed(self.target), self.listed(self.source))
+
+    def test_bad_row_stops_after_the_batches_before_it(self):
+        rows = [{'item_id': item, 'title': f'Title {item}'} for item in range(14)]
+        rows.append({'item_id': 'x', 'title': 'Broken'})
+        body = b''.join(json.dumps(row).encode() + b'\n' for row in rows)
+        response = self.upload(body, 'application/x-ndjson')
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(response.data, {'error': 'Line 15: item_id must be an integer', 'added': 10})
+        self.assertEqual(MovieList.objects.filter(profile=self.target).count(), 10)
+
+    def test_quoted_csv_fields_and_limits(self):
+        body = b'item_id,title,media_type\r\n700,"Crouching Tiger, Hidden Dragon",movie\r\n'
+        self.assertEqual(self.upload(body, 'text/csv').data, {'rows': 1, 'added': 1})
+        self.assertEqual(self.listed(self.target)[0][2], 'Crouching Tiger, Hidden Dragon')
+
+        self.assertEqual(self.upload(body, 'application/json').status_code, 415)
+        body = b''.join(b'{"item_id": %d, "title": "T"}\n' % item for item in range(101))
+        self.assertEqual(self.upload(body, 'application/x-ndjson').status_code, 400)
+        response = self.client.get('/api/mylist/export.xml', {'profile_id': self.source.id})
+        self.assertEqual(response.status_code, 404)
+
+
+@override_settings(TRENDING={**settings.TRENDING, 'SETTLE_SECONDS': 0})
+class TrendingTests(ViewerTestCase):
+    profile_name = None
+
+    def setUp(self):
+        super().setUp()
+        self.profiles = [Profile.objects.create(user=self.user, name=f'Profile {index}') for index in range(3)]
+
+    def batch(self, profile, operations):
+        response = self.client.post('/api/mylist/batch/', {
+            'profile_id': profile.id, 'operations': operations,
+        }, format='json')
+        self.assertEqual(response.status_code, 200)
+
+    def add(self, item_id, media_type='movie'):
+        return {'op': 'add', 'item_id': item_id, 'title': f'Title {item_id}', 'poster_path': '/p.jpg',
+                'media_type': media_type}
+
+    def ranked(self, **params):
+        response = self.client.get('/api/trending/', params)
+        self.assertEqual(response.status_code, 200)
+        return [(row['item_id'], row['adds']) for row in response.data['results']]
+
+    def test_net_adds_are_ranked_per_media_type(self):
+        first, second, third = self.profiles
+        self.batch(first, [self.add(1), self.add(2, 'tv'), self.add(3)])
+        self.batch(second, [self.add(1), self.add(2, 'anime')])
+        self.batch(third, [self.add(1)])
+        self.batch(third, [{'op': 'remove', 'item_id': 1}])
+        self.assertEqual(ListEvent.objects.count(), 7)
+
+        out = io.StringIO()
+        call_command('rollup_trending', stdout=out)
+        self.assertIn('Rolled up 7 events', out.getvalue())
+        self.assertEqual(self.ranked(), [(1, 2), (2, 2), (3, 1)])
+        self.assertEqual(self.ranked(media_type='tv', window='week'), [(2, 2)])
+        self.assertEqual(self.ranked(limit=1), [(1, 2)])
+        self.assertEqual(self.client.get('/api/trending/', {'window': 'year'}).status_code, 400)
+        self.assertEqual(trending.rollup(), 0)
+
+    def test_imports_are_not_counted_as_adds(self):
+        body = b''.join(b'{"item_id": %d, "title": "T"}\n' % item for item in range(5))
+        response = self.client.generic('POST', f'/api/mylist/import/?profile_id={self.profiles[0].id}', body,
+                                       content_type='application/x-ndjson')
+        self.assertEqual(response.data, {'rows': 5, 'added': 5})
+        self.batch(self.profiles[0], [{'op': 'remove', 'item_id': 0}])
+        self.assertFalse(ListEvent.objects.exists())
+
+    def test_read_cost_does_not_grow_with_events(self):
+        save_items(self.user, self.profiles[0], [(item, 'movie') for item in range(5)])
+        for volume in (50, 2000):
+            ListEvent.objects.bulk_create(
+                ListEvent(profile_id=index, item_id=index % 5, media_type='movie', delta=1)
+                for index in range(volume)
+            )
+            trending.rollup(batch_size=500)
+            self.assertEqual(TrendingBucket.objects.count(), 5)
+            cache.clear()
+            with self.assertNumQueries(2):
+                self.ranked()
+            with self.assertNumQueries(0):
+                self.ranked()
+
+    def test_windows_and_pruning(self):
+        now = timezone.now()
+        start = trending.bucket_start(now)
+        TrendingBucket.objects.bulk_create([
+            TrendingBucket(starts_at=start, media_type='movie', item_id=1, adds=1),
+            TrendingBucket(starts_at=start - timedelta(days=3), media_type='movie', item_id=2, adds=5),
+            TrendingBucket(starts_at=start - timedelta(days=10), media_type='movie', item_id=3, adds=9),
+        ])
+        self.assertEqual([row['item_id'] for row in trending.compute_top('day')], [1])
+        self.assertEqual([row['item_id'] for row in trending.compute_top('week')], [2, 1])
+
+        ListEvent.objects.create(profile_id=1, item_id=1, media_type='movie', delta=1)
+        ListEvent.objects.update(created_at=now - timedelta(days=40))
+        self.assertEqual(trending.prune(now), (1, 0))
+        # Rolled up, the old event lands in an expired bucket.
+        trending.rollup()
+        self.assertEqual(trending.prune(now), (1, 1))
+
+    def test_removes_of_items_added_before_the_log_are_not_counted(self):
+        save_items(self.user, self.profiles[0], [(7, 'movie')])
+        self.batch(self.profiles[0], [{'op': 'remove', 'item_id': 7}])
+        self.assertFalse(ListEvent.objects.exists())
+
+
+@override_settings(CHANGE_FEED={**settings.CHANGE_FEED, 'QUEUE_SIZE': 3, 'KEEPALIVE': 0.2})
+class ChangeFeedTests(ViewerTestCase):
+    def setUp(self):
+        super().setUp()
+        authentication.reset_auth_caches()
+        self.headers = {'Authorization': f'Bearer {AccessToken.for_user(self.user)}', 'Accept': 'text/event-stream'}
+        changefeed.reset_broker()
+        self.addCleanup(changefeed.reset_broker)
+        self.broker = changefeed.get_broker()
+
+    async def open(self, **headers):
+        response = await self.async_client.get(
+            '/api/mylist/events/', {'profile_id': self.profile.id}, headers={**self.headers, **headers},
+        )
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response['Content-Type'], 'text/event-stream')
+        chunks = aiter(response.streaming_content)
+        self.assertEqual(await anext(chunks), b'retry: 3000\n\n')
+        return chunks
+
+    async def read(self, chunks):
+        return (await asyncio.wait_for(anext(chunks), 2)).decode()
+
+    async def test_live_events_follow_the_ready_event(self):
+        chunks = await self.open()
+        self.assertIn('event: ready', await self.read(chunks))
+        await asyncio.to_thread(self.broker.publish, self.profile.id, 'list', {'added': [5], 'removed': []})
+        message = await self.read(chunks)
+        self.assertIn('event: list\ndata: {"added": [5], "removed": []}', message)
+        self.assertEqual(await self.read(chunks), ': keepalive\n\n')
+        await chunks.aclose()
+
+    async def test_reconnect_replays_missed_events(self):
+        first, second, third = [
+            self.broker.publish(self.profile.id, 'list', {'added': [item], 'removed': []}) for item in (1, 2, 3)
+        ]
+        chunks = await self.open(last_event_id=first.id)
+        self.assertTrue((await self.read(chunks)).startswith(f'id: {second.id}\n'))
+        self.assertTrue((await self.read(chunks)).startswith(f'id: {third.id}\n'))
+        await chunks.aclose()
+
+        chunks = await self.open(last_event_id='stale-7')
+        self.assertIn('event: reset', await self.read(chunks))
+        await chunks.aclose()
+
+    async def test_slow_clients_are_disconnected(self):
+        subscription, first_events = await self.broker.subscribe(self.profile.id)
+        for item in range(5):
+            self.broker.publish(self.profile.id, 'list', {'added': [item], 'removed': []})
+        await asyncio.sleep(0)
+        self.assertTrue(subscription.overflowed)
+        with self.assertLogs('api.changefeed', 'INFO'):
+            body = [chunk async for chunk in changefeed.stream(subscription, first_events, lifetime=5)]
+        self.assertEqual(len(body), 2)
+        self.assertEqual(self.broker.connections(), 0)
+
+    async def test_only_the_owner_can_listen(self):
+        other = await User.objects.acreate(username='other')
+        headers = {'Authorization': f'Bearer {AccessToken.for_user(other)}', 'Accept': 'text/event-stream'}
+        response = await self.async_client.get('/api/mylist/events/', {'profile_id': self.profile.id}, headers=headers)
+        self.assertEqual(response.status_code, 404)
+        response = await self.async_client.get('/api/mylist/events/', {'profile_id': self.profile.id})
+        self.assertEqual(response.status_code, 401)
+
+    async def test_tickets_open_their_profile_stream(self):
+        kids = await Profile.objects.acreate(user=self.user, name='Kids')
+        ticket = str(authentication.StreamTicket.for_profile(self.user, self.profile.id))
+        headers = {'Accept': 'text/event-stream'}
+        response = await self.async_client.get(
+            '/api/mylist/events/', {'profile_id': self.profile.id, 'ticket': ticket}, headers=headers,
+        )
+        self.assertEqual(response.status_code, 200)
+        chunks = aiter(response.streaming_content)
+        self.assertEqual(await anext(chunks), b'retry: 3000\n\n')
+        self.assertIn('event: ready', await self.read(chunks))
+        await chunks.aclose()
+
+        response = await self.async_client.get(
+            '/api/mylist/events/', {'profile_id': kids.id, 'ticket': ticket}, headers=headers,
+        )
+        self.assertEqual(response.status_code, 403)
+        # An access token is not a ticket.
+        access = str(AccessToken.for_user(self.user))
+        response = await self.async_client.get(
+            '/api/mylist/events/', {'profile_id': self.profile.id, 'ticket': access}, headers=headers,
+        )
+        self.assertEqual(response.status_code, 401)
+
+    def test_tickets_are_minted_for_own_profiles(self):
+        response = self.client.post('/api/mylist/events/ticket/', {'profile_id': self.profile.id}, format='json')
+        self.assertEqual(response.status_code, 200)
+        ticket = authentication.StreamTicket(response.data['ticket'])
+        self.assertEqual((ticket['profile_id'], ticket['user_id']), (self.profile.id, self.user.id))
+        self.assertLessEqual(ticket['exp'] - time.time(), settings.CHANGE_FEED['TICKET_SECONDS'])
+
+        other = User.objects.create_user('other')
+        theirs = Profile.objects.create(user=other, name='Theirs')
+        response = self.client.post('/api/mylist/events/ticket/', {'profile_id': theirs.id}, format='json')
+        self.assertEqual(response.status_code, 404)
+
+    def test_ticket_streams_end_with_the_access_token(self):
+        access = AccessToken.for_user(self.user)
+        ticket = authentication.StreamTicket.for_profile(self.user, self.profile.id, access)
+        lifetime = async_views.ChangeFeedView.lifetime(mock.Mock(auth=ticket))
+        self.assertAlmostEqual(lifetime, access['exp'] - time.time(), delta=2)
+
+    def test_wsgi_requests_are_refused(self):
+        response = self.client.get('/api/mylist/events/', {'profile_id': self.profile.id}, headers=self.headers)
+        self.assertEqual(response.status_code, 501)
+
+    def test_writes_publish_after_commit(self):
+        client = APIClient()
+        client.force_authenticate(self.user)
+        with self.captureOnCommitCallbacks(execute=True):
+            client.post('/api/mylist/batch/', {'profile_id': self.profile.id, 'operations': [
+                {'op': 'add', 'item_id': 9, 'title': 'Nine', 'poster_path': '/9.jpg', 'media_type': 'movie'},
+            ]}, format='json')
+            client.put(f'/api/profiles/{self.profile.id}/update/', {'name': 'Renamed'}, format='json')
+        events = self.broker._histories.get(self.profile.id)['events']
+        self.assertEqual(
+            [(event.kind, event.data) for event in events],
+            [('list', {'added': [9], 'removed': []}), ('profile', {'changed': ['name']})],
+        )
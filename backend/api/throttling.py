@@ -0,0 +1,177 @@
+# backend/api/throttling.py
+"""
+Sliding-window-counter throttles on atomic cache increments.
+
+Each client key keeps two integers: its request count in the current
+fixed window and in the previous one. The count over the sliding window
+is estimated as ``previous * (1 - elapsed / window) + current``, so the
+state is O(1) per key and a request costs one ``incr`` and one ``get``
+(plus a ``decr`` when it is rejected).
+Both are atomic on Redis and Memcached, which ``THROTTLE_CACHE`` should
+point at in production so limits hold across workers; LocMemCache is the
+per-process stand-in for tests and development. DRF's own throttles
+instead rewrite a list of timestamps per request. ``aallow_request`` does
+the same through the cache's async methods, for ``AsyncAPIView``.
+
+Rates live in ``REST_FRAMEWORK['DEFAULT_THROTTLE_RATES']``, one per scope,
+as either:
+
+* ``'N/period'``: at most N requests in any window of one period. The
+  period is ``s``, ``m``, ``h`` or ``d`` (or a word starting with one),
+  optionally with a multiplier such as ``'N/10m'``.
+* ``{'rate': 'N/period', 'burst': B}``: up to B requests at once, refilled
+  at the rate, like a token bucket of size B. It is counted as B requests
+  per B / rate seconds.
+"""
+import functools
+import math
+import re
+import time
+
+from django.conf import settings
+from django.core.cache import caches
+from django.core.exceptions import ImproperlyConfigured
+from rest_framework.settings import api_settings
+from rest_framework.throttling import BaseThrottle
+
+PERIODS = {'s': 1, 'm': 60, 'h': 3600, 'd': 86400}
+RATE_PATTERN = re.compile(r'^(\d+)/(\d*)([smhd])[a-z]*$')
+
+
+def parse_rate(rate):
+    """Return ``(limit, window_seconds)`` for a scope's rate setting."""
+    if isinstance(rate, dict):
+        count, window = parse_rate(rate['rate'])
+        burst = rate.get('burst', count)
+        return burst, burst * window / count
+    match = RATE_PATTERN.match(rate.replace(' ', '').lower())
+    if match is None:
+        raise ImproperlyConfigured(f'Invalid throttle rate {rate!r}')
+    count, multiplier, unit = match.groups()
+    return int(count), int(multiplier or 1) * PERIODS[unit]
+
+
+class SlidingWindowThrottle(BaseThrottle):
+    scope = None
+    timer = time.time
+
+    def get_cache_key(self, request, view):
+        """The client's key within the scope, or None to skip throttling."""
+        raise NotImplementedError
+
+    def get_rate(self):
+        try:
+            return api_settings.DEFAULT_THROTTLE_RATES[self.scope]
+        except KeyError:
+            raise ImproperlyConfigured(f'No throttle rate set for scope {self.scope!r}')
+
+    def window_keys(self, request, view):
+        """``(current_key, previous_key)`` of the client's counters, or None to skip throttling."""
+        rate = self.get_rate()
+        if rate is None:
+            return None
+        key = self.get_cache_key(request, view)
+        if key is None:
+            return None
+
+        self.limit, self.window = parse_rate(rate)
+        index, self.elapsed = divmod(self.timer(), self.window)
+        prefix = f'throttle:{self.scope}:{key}'
+        return f'{prefix}:{int(index)}', f'{prefix}:{int(index) - 1}'
+
+    def within_limit(self):
+        self.estimate = self.previous * (1 - self.elapsed / self.window) + self.current
+        return self.estimate <= self.limit
+
+    def allow_request(self, request, view):
+        keys = self.window_keys(request, view)
+        if keys is None:
+            return True
+        current_key, previous_key = keys
+        cache = caches[settings.THROTTLE_CACHE]
+
+        self.current = self.increment(cache, current_key)
+        self.previous = cache.get(previous_key, 0)
+        if self.within_limit():
+            return True
+        # Rejected requests do not use up the allowance.
+        cache.decr(current_key)
+        self.current -= 1
+        return False
+
+    async def aallow_request(self, request, view):
+        keys = self.window_keys(request, view)
+        if keys is None:
+            return True
+        current_key, previous_key = keys
+        cache = caches[settings.THROTTLE_CACHE]
+
+        self.current = await self.aincrement(cache, current_key)
+        self.previous = await cache.aget(previous_key, 0)
+        if self.within_limit():
+            return True
+        await cache.adecr(current_key)
+        self.current -= 1
+        return False
+
+    def increment(self, cache, key):
+        # Kept until the window after it has passed.
+        try:
+            return cache.incr(key)
+        except ValueError:
+            if cache.add(key, 1, math.ceil(2 * self.window)):
+                return 1
+            return cache.incr(key)
+
+    async def aincrement(self, cache, key):
+        try:
+            return await cache.aincr(key)
+        except ValueError:
+            if await cache.aadd(key, 1, math.ceil(2 * self.window)):
+                return 1
+            return await cache.aincr(key)
+
+    def wait(self):
+        """Seconds until one more request fits (the counts exclude the rejected one)."""
+        remaining = self.window - self.elapsed
+        if self.current >= self.limit:
+            # Wait for this window to become the previous one and decay enough.
+            return remaining + self.window * (1 - (self.limit - 1) / self.current)
+        # The previous window's share decays linearly over this window.
+        over = self.previous * (1 - self.elapsed / self.window) + self.current + 1 - self.limit
+        return min(remaining, over * self.window / self.previous)
+
+
+class AnonThrottle(SlidingWindowThrottle):
+    """Anonymous requests, by client address."""
+    scope = 'anon'
+
+    def get_cache_key(self, request, view):
+        if request.user and request.user.is_authenticated:
+            return None
+        return self.get_ident(request)
+
+
+class UserThrottle(SlidingWindowThrottle):
+    """Authenticated requests, by user."""
+    scope = 'user'
+
+    def get_cache_key(self, request, view):
+        if request.user and request.user.is_authenticated:
+            return request.user.pk
+        return None
+
+
+class ScopedThrottle(SlidingWindowThrottle):
+    """Per-endpoint scope, by user or by client address when anonymous."""
+
+    def get_cache_key(self, request, view):
+        if request.user and request.user.is_authenticated:
+            return f'user:{request.user.pk}'
+        return f'ip:{self.get_ident(request)}'
+
+
+@functools.cache
+def scoped(scope):
+    """``ScopedThrottle`` subclass for ``scope``, for ``@throttle_classes``."""
+    return type(f'{scope.title()}ScopedThrottle', (ScopedThrottle,), {'scope': scope})
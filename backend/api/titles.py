@@ -0,0 +1,200 @@
+# backend/api/titles.py
+"""
+Local title metadata and the search index behind ``/api/search/``.
+
+Titles are upserted from every catalog response fetched upstream (the
+``on_fetch`` hook of ``CatalogCache``) and created on demand for My List
+rows, which reference them instead of copying the metadata (``resolve``). Search
+runs on the database's full-text index: FTS5 on SQLite and a ``simple``
+tsvector GIN index on Postgres, both created by migration 0012. Every
+word of the query is matched as a prefix, so "dark kn" finds "The Dark
+Knight". Other databases fall back to ``icontains``.
+"""
+import re
+from datetime import date
+
+from django.db import connection, transaction
+from django.db.models import BooleanField, Q
+from django.db.models.expressions import RawSQL
+
+from . import browse
+from .models import MovieList, Profile, Title
+
+MEDIA_TYPES = ('movie', 'tv')
+MAX_QUERY_TOKENS = 8
+
+
+def normalize_media_type(media_type):
+    media_type = (media_type or '').lower()
+    # The anime rows are TMDB TV discover results.
+    return 'tv' if media_type == 'anime' else media_type
+
+
+def _media_type_for(path, item):
+    media_type = normalize_media_type(item.get('media_type'))
+    if media_type:
+        return media_type
+    for segment in path.split('/'):
+        if segment in MEDIA_TYPES:
+            return segment
+    return None
+
+
+def _release_date(item):
+    value = item.get('release_date') or item.get('first_air_date')
+    try:
+        return date.fromisoformat(value) if value else None
+    except ValueError:
+        return None
+
+
+def titles_from_payload(path, payload):
+    """``Title`` objects for the movies and shows in a TMDB response."""
+    if not isinstance(payload, dict):
+        return []
+    items = payload.get('results')
+    if not isinstance(items, list):
+        # Detail endpoints (movie/603) return the title itself.
+        items = [payload]
+
+    titles = {}
+    for item in items:
+        if not isinstance(item, dict) or not isinstance(item.get('id'), int):
+            continue
+        name = item.get('title') or item.get('name')
+        media_type = _media_type_for(path, item)
+        if not name or media_type not in MEDIA_TYPES:
+            continue
+        titles[item['id'], media_type] = Title(
+            item_id=item['id'],
+            media_type=media_type,
+            title=name[:200],
+            poster_path=item.get('poster_path'),
+            release_date=_release_date(item),
+            popularity=item.get('popularity') or 0,
+        )
+    return list(titles.values())
+
+
+def index_payload(path, payload):
+    """
+    Upsert the titles in a catalog response; upstream data always wins,
+    except that a missing poster does not erase a known one.
+
+    Profiles listing a title whose name or poster changed get a new
+    version, so their list ETags stop matching, and lose their cached
+    browse page, whose My List row shows the same metadata.
+    """
+    titles = titles_from_payload(path, payload)
+    if not titles:
+        return
+    known = {
+        (item_id, media_type): (title_id, name, poster_path)
+        for title_id, item_id, media_type, name, poster_path in Title.objects.filter(
+            item_id__in={title.item_id for title in titles}
+        ).values_list('id', 'item_id', 'media_type', 'title', 'poster_path')
+    }
+    changed = []
+    for title in titles:
+        if (title.item_id, title.media_type) not in known:
+            continue
+        title_id, name, poster_path = known[title.item_id, title.media_type]
+        title.poster_path = title.poster_path or poster_path
+        if (title.title, title.poster_path) != (name, poster_path):
+            changed.append(title_id)
+
+    with transaction.atomic():
+        Title.objects.bulk_create(
+            titles,
+            update_conflicts=True,
+            unique_fields=['item_id', 'media_type'],
+            update_fields=['title', 'poster_path', 'release_date', 'popularity', 'updated_at'],
+        )
+        if changed:
+            profile_ids = set(
+                MovieList.objects.filter(title_id__in=changed).values_list('profile_id', flat=True)
+            )
+            Profile.touch(*profile_ids)
+            browse.invalidate_browse_home(*profile_ids)
+
+
+def title_key(item_id, media_type):
+    """The ``(item_id, media_type)`` key of the title a My List row points at."""
+    media_type = normalize_media_type(media_type)
+    # Rows saved without a media type come from the movie rows.
+    return item_id, media_type if media_type in MEDIA_TYPES else 'movie'
+
+
+def resolve(items):
+    """
+    Map ``(item_id, media_type, title, poster_path)`` tuples to ``Title`` rows.
+
+    Returns a dict keyed by ``title_key``. Unknown titles are created from
+    the given metadata; known ones keep theirs, which came from upstream or
+    an earlier save. Two queries however many items there are.
+    """
+    new = {}
+    for item_id, media_type, title, poster_path in items:
+        key = title_key(item_id, media_type)
+        new.setdefault(key, Title(item_id=key[0], media_type=key[1], title=title[:200], poster_path=poster_path))
+    if not new:
+        return {}
+    Title.objects.bulk_create(new.values(), ignore_conflicts=True)
+    found = Title.objects.filter(item_id__in={item_id for item_id, _ in new})
+    return {(title.item_id, title.media_type): title for title in found if (title.item_id, title.media_type) in new}
+
+
+def query_tokens(query):
+    return re.findall(r'\w+', query.lower())[:MAX_QUERY_TOKENS]
+
+
+def search_titles(query, limit=10, media_type=None):
+    """Best local matches for ``query``, each word matched as a prefix."""
+    tokens = query_tokens(query)
+    if not tokens:
+        return []
+
+    if connection.vendor == 'sqlite':
+        # Quoted tokens cannot be read as FTS5 operators.
+        match = ' '.join(f'"{token}"*' for token in tokens)
+        sql = (
+            'SELECT api_title.* FROM api_title_fts '
+            'JOIN api_title ON api_title.id = api_title_fts.rowid '
+            'WHERE api_title_fts MATCH %s'
+        )
+        params = [match]
+        if media_type:
+            sql += ' AND api_title.media_type = %s'
+            params.append(media_type)
+        sql += ' ORDER BY api_title_fts.rank, api_title.popularity DESC LIMIT %s'
+        params.append(limit)
+        return list(Title.objects.raw(sql, params))
+
+    titles = Title.objects.all()
+    if media_type:
+        titles = titles.filter(media_type=media_type)
+    if connection.vendor == 'postgresql':
+        tsquery = ' & '.join(f'{token}:*' for token in tokens)
+        return list(
+            titles
+            .filter(RawSQL("to_tsvector('simple', api_title.title) @@ to_tsquery('simple', %s)",
+                           (tsquery,), output_field=BooleanField()))
+            .annotate(rank=RawSQL("ts_rank(to_tsvector('simple', api_title.title), to_tsquery('simple', %s))",
+                                  (tsquery,)))
+            .order_by('-rank', '-popularity')[:limit]
+        )
+
+    condition = Q()
+    for token in tokens:
+        condition &= Q(title__icontains=token)
+    return list(titles.filter(condition).order_by('-popularity')[:limit])
+
+
+def as_result(title):
+    return {
+        'item_id': title.item_id,
+        'media_type': title.media_type,
+        'title': title.title,
+        'poster_path': title.poster_path,
+        'release_date': title.release_date.isoformat() if title.release_date else None,
+    }
@@ -0,0 +1,202 @@
+# backend/api/transfer.py
+"""
+Streaming export and import of a profile's My List.
+
+An export streams the list oldest first as NDJSON (one object per line)
+or CSV with a header row, reading it with ``iterator(chunk_size=...)`` so
+only one chunk of rows is in memory whatever the size of the list.
+Under ASGI the body is handed over as an async iterator (``aiter_chunks``);
+Django would read a sync one to the end before sending anything.
+
+An import reads the upload line by line in either format, validates each
+row and inserts every ``IMPORT_BATCH_SIZE`` rows with one ``bulk_create``
+in a transaction of its own. Items already on the list are skipped, so an
+interrupted or rejected import can simply be sent again. Rows get the
+import time as ``added_date``; importing an export oldest first keeps
+their order.
+"""
+import codecs
+import csv
+import itertools
+import json
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.db import transaction
+
+from . import titles
+from .models import MovieList
+from .renderers import dumps
+from .signals import movie_list_changed
+
+try:
+    import orjson
+except ImportError:  # Falls back to the json module.
+    orjson = None
+
+FORMATS = {'ndjson': 'application/x-ndjson', 'csv': 'text/csv'}
+COLUMNS = ['item_id', 'media_type', 'title', 'poster_path', 'position', 'added_date']
+EXPORT_LOOKUPS = ['item_id', 'media_type', 'title__title', 'title__poster_path', 'position', 'added_date']
+
+
+class ImportRowError(Exception):
+    def __init__(self, line, message):
+        super().__init__(f'Line {line}: {message}')
+        self.line = line
+        # Rows of the batches inserted before this one.
+        self.added = 0
+
+
+def export_rows(profile):
+    """The profile's list oldest first, as dicts keyed by ``COLUMNS``."""
+    rows = (
+        MovieList.objects.filter(profile=profile).order_by('added_date', 'id')
+        .values_list(*EXPORT_LOOKUPS)
+        .iterator(chunk_size=settings.MY_LIST_TRANSFER['EXPORT_CHUNK_SIZE'])
+    )
+    for row in rows:
+        yield dict(zip(COLUMNS, row))
+
+
+def export_ndjson(rows):
+    for row in rows:
+        yield dumps(row) + b'\n'
+
+
+class _Line:
+    """A write-only file that hands back what ``csv.writer`` wrote."""
+
+    def write(self, value):
+        return value
+
+
+def export_csv(rows):
+    writer = csv.writer(_Line())
+    yield writer.writerow(COLUMNS)
+    for row in rows:
+        row['added_date'] = row['added_date'].isoformat()
+        yield writer.writerow([row[column] for column in COLUMNS])
+
+
+EXPORTERS = {'ndjson': export_ndjson, 'csv': export_csv}
+
+
+async def aiter_chunks(chunks):
+    """``chunks`` as an async iterator, pulled one export chunk at a time."""
+    chunks = iter(chunks)
+    size = settings.MY_LIST_TRANSFER['EXPORT_CHUNK_SIZE']
+    # Thread-sensitive, so the query runs on the sync views' connection.
+    take = sync_to_async(lambda: list(itertools.islice(chunks, size)))
+    while batch := await take():
+        for chunk in batch:
+            yield chunk
+
+
+def parse_ndjson(lines):
+    """``(line_number, dict)`` for every non-blank line."""
+    for number, line in enumerate(lines, 1):
+        if not line.strip():
+            continue
+        try:
+            row = orjson.loads(line) if orjson is not None else json.loads(line)
+        except ValueError:
+            raise ImportRowError(number, 'invalid JSON')
+        if not isinstance(row, dict):
+            raise ImportRowError(number, 'expected an object')
+        yield number, row
+
+
+def parse_csv(lines):
+    """``(line_number, dict)`` for every record after the header row."""
+    reader = csv.DictReader(codecs.iterdecode(lines, 'utf-8-sig'))
+    try:
+        for row in reader:
+            yield reader.line_num, row
+    except (csv.Error, UnicodeDecodeError) as exc:
+        raise ImportRowError(reader.line_num, str(exc))
+
+
+PARSERS = {'application/x-ndjson': parse_ndjson, 'application/jsonl': parse_ndjson, 'text/csv': parse_csv}
+
+
+def _integer(value, minimum=None):
+    if isinstance(value, bool):
+        raise ValueError(value)
+    number = int(value)
+    if minimum is not None and number < minimum:
+        raise ValueError(value)
+    return number
+
+
+def clean_row(number, row):
+    """``(item_id, media_type, title, poster_path, position)`` from an imported row."""
+    try:
+        item_id = _integer(row.get('item_id'))
+    except (TypeError, ValueError):
+        raise ImportRowError(number, 'item_id must be an integer')
+    title = row.get('title')
+    if not isinstance(title, str) or not title.strip():
+        raise ImportRowError(number, 'title is required')
+    poster_path = row.get('poster_path') or None
+    media_type = row.get('media_type') or None
+    for name, value, limit in (('poster_path', poster_path, 200), ('media_type', media_type, 100)):
+        if value is not None and (not isinstance(value, str) or len(value) > limit):
+            raise ImportRowError(number, f'{name} must be a string of at most {limit} characters')
+    try:
+        position = _integer(row.get('position') or 0, minimum=0)
+    except (TypeError, ValueError):
+        raise ImportRowError(number, 'position must be a non-negative integer')
+    return item_id, media_type, title.strip(), poster_path, position
+
+
+def import_rows(user, profile, rows, batch_size=None, max_rows=None):
+    """
+    Insert cleaned ``rows`` into the profile's list in batches.
+
+    Returns ``(rows_read, rows_added)``. An ``ImportRowError`` stops the
+    import; the batches before it stay imported.
+    """
+    config = settings.MY_LIST_TRANSFER
+    batch_size = batch_size or config['IMPORT_BATCH_SIZE']
+    max_rows = max_rows or config['IMPORT_MAX_ROWS']
+    read = added = 0
+    batch = []
+    try:
+        for number, row in rows:
+            read += 1
+            if read > max_rows:
+                raise ImportRowError(number, f'at most {max_rows} rows can be imported at once')
+            batch.append(clean_row(number, row))
+            if len(batch) >= batch_size:
+                added += _insert(user, profile, batch)
+                batch = []
+    except ImportRowError as exc:
+        exc.added = added
+        raise
+    if batch:
+        added += _insert(user, profile, batch)
+    return read, added
+
+
+def _insert(user, profile, batch):
+    with transaction.atomic():
+        existing = set(
+            MovieList.objects.filter(profile=profile, item_id__in=[row[0] for row in batch])
+            .values_list('item_id', flat=True)
+        )
+        new = {row[0]: row for row in batch if row[0] not in existing}
+        if not new:
+            return 0
+        resolved = titles.resolve(row[:4] for row in new.values())
+        MovieList.objects.bulk_create(
+            (
+                MovieList(
+                    user=user, profile=profile, item_id=item_id, media_type=media_type, position=position,
+                    title=resolved[titles.title_key(item_id, media_type)],
+                )
+                for item_id, media_type, _, _, position in new.values()
+            ),
+            batch_size=len(new), ignore_conflicts=True,
+        )
+        movie_list_changed.send(MovieList, profile_id=profile.id, added=list(new), removed=[], imported=True)
+    return len(new)
@@ -0,0 +1,188 @@
+# backend/api/trending.py
+"""
+"Most added" rows from our own users' My List activity.
+
+Every add and remove goes into the append-only ``ListEvent`` log
+(``record``, hooked to ``movie_list_changed``); list imports are left
+out, as are later removes of the items they brought. ``rollup``, run
+periodically by ``rollup_trending``, folds new events into
+``TrendingBucket`` counters, one row per item, media type and
+``BUCKET_SECONDS`` of time, and remembers the last event it consumed in
+``RollupState``. Events younger than ``SETTLE_SECONDS`` wait for the next
+run, so a transaction that commits a lower event id late is not skipped.
+
+``top`` sums the buckets inside a window (``WINDOWS``) and keeps the
+items with the most net adds. That reads at most one row per item and
+bucket whatever the number of events, and the result is cached for
+``CACHE_TTL`` seconds; each rollup recomputes the cached lists.
+"""
+from collections import defaultdict
+from datetime import datetime, timedelta, timezone as dt_timezone
+
+from django.conf import settings
+from django.core.cache import caches
+from django.db import transaction
+from django.db.models import Sum
+from django.utils import timezone
+
+from .models import ListEvent, MovieList, RollupState, Title, TrendingBucket
+from .titles import MEDIA_TYPES
+
+ROLLUP_NAME = 'trending'
+
+
+def bucket_start(moment):
+    size = settings.TRENDING['BUCKET_SECONDS']
+    seconds = int(moment.timestamp()) // size * size
+    return datetime.fromtimestamp(seconds, tz=dt_timezone.utc)
+
+
+def window_start(seconds, now=None):
+    """Start of the oldest of the buckets, up to the current one, that span ``seconds``."""
+    size = settings.TRENDING['BUCKET_SECONDS']
+    return bucket_start(now or timezone.now()) - timedelta(seconds=max(seconds - size, 0))
+
+
+def record(profile_id, added=(), removed=()):
+    """Log the adds and removes of one list change."""
+    events = []
+    if added:
+        saved = MovieList.objects.filter(profile_id=profile_id, item_id__in=list(added))
+        events.extend(
+            ListEvent(profile_id=profile_id, item_id=item_id, media_type=media_type, delta=1)
+            for item_id, media_type in saved.values_list('item_id', 'title__media_type')
+        )
+    if removed:
+        # The rows are gone; the media type is that of the item's last add.
+        # Items added before the log existed were never counted.
+        last_adds = (
+            ListEvent.objects.filter(profile_id=profile_id, item_id__in=list(removed), delta=1)
+            .order_by('id').values_list('item_id', 'media_type')
+        )
+        events.extend(
+            ListEvent(profile_id=profile_id, item_id=item_id, media_type=media_type, delta=-1)
+            for item_id, media_type in dict(last_adds).items()
+        )
+    if events:
+        ListEvent.objects.bulk_create(events)
+    return len(events)
+
+
+def rollup(batch_size=10000):
+    """Fold events older than ``SETTLE_SECONDS`` into the buckets; returns how many."""
+    settled = timezone.now() - timedelta(seconds=settings.TRENDING['SETTLE_SECONDS'])
+    total = 0
+    while True:
+        with transaction.atomic():
+            # Concurrent runs queue up on the state row.
+            RollupState.objects.get_or_create(name=ROLLUP_NAME)
+            state = RollupState.objects.select_for_update().get(name=ROLLUP_NAME)
+            events = list(
+                ListEvent.objects.filter(id__gt=state.last_event_id, created_at__lte=settled)
+                .order_by('id').values_list('id', 'created_at', 'media_type', 'item_id', 'delta')[:batch_size]
+            )
+            if not events:
+                return total
+            counts = defaultdict(lambda: [0, 0])
+            for _, created_at, media_type, item_id, delta in events:
+                counts[(bucket_start(created_at), media_type, item_id)][0 if delta > 0 else 1] += 1
+            _add_counts(counts)
+            state.last_event_id = events[-1][0]
+            state.save(update_fields=['last_event_id'])
+        total += len(events)
+        if len(events) < batch_size:
+            return total
+
+
+def _add_counts(counts):
+    starts = {key[0] for key in counts}
+    existing = {
+        (bucket.starts_at, bucket.media_type, bucket.item_id): bucket
+        for bucket in TrendingBucket.objects.filter(starts_at__in=starts, item_id__in={key[2] for key in counts})
+    }
+    to_create, to_update = [], []
+    for key, (adds, removes) in counts.items():
+        bucket = existing.get(key)
+        if bucket is None:
+            to_create.append(TrendingBucket(starts_at=key[0], media_type=key[1], item_id=key[2],
+                                            adds=adds, removes=removes))
+        else:
+            bucket.adds += adds
+            bucket.removes += removes
+            to_update.append(bucket)
+    TrendingBucket.objects.bulk_create(to_create, batch_size=1000)
+    TrendingBucket.objects.bulk_update(to_update, ['adds', 'removes'], batch_size=1000)
+
+
+def prune(now=None):
+    """Delete buckets outside the longest window and rolled-up events past ``EVENT_RETENTION``."""
+    config = settings.TRENDING
+    now = now or timezone.now()
+    longest = max(config['WINDOWS'].values())
+    buckets, _ = TrendingBucket.objects.filter(starts_at__lt=window_start(longest, now)).delete()
+    state = RollupState.objects.filter(name=ROLLUP_NAME).first()
+    events = 0
+    if state is not None:
+        events, _ = ListEvent.objects.filter(
+            id__lte=state.last_event_id, created_at__lt=now - timedelta(seconds=config['EVENT_RETENTION']),
+        ).delete()
+    return buckets, events
+
+
+def compute_top(window, media_type=None, limit=None):
+    """
+    The ``limit`` items with the most net adds in ``window``, best first.
+
+    Each is ``{'item_id', 'media_type', 'title', 'poster_path', 'adds'}``.
+    """
+    config = settings.TRENDING
+    limit = limit or config['MAX_LIMIT']
+    buckets = TrendingBucket.objects.filter(starts_at__gte=window_start(config['WINDOWS'][window]))
+    if media_type:
+        buckets = buckets.filter(media_type=media_type)
+    ranked = list(
+        buckets.values('item_id', 'media_type')
+        .annotate(score=Sum('adds') - Sum('removes'))
+        .filter(score__gt=0)
+        .order_by('-score', 'item_id')[:limit]
+    )
+    if not ranked:
+        return []
+    found = Title.objects.filter(item_id__in=[row['item_id'] for row in ranked])
+    titles = {(title.item_id, title.media_type): title for title in found}
+    results = []
+    for row in ranked:
+        title = titles.get((row['item_id'], row['media_type']))
+        results.append({
+            'item_id': row['item_id'],
+            'media_type': row['media_type'],
+            'title': title.title if title else None,
+            'poster_path': title.poster_path if title else None,
+            'adds': row['score'],
+        })
+    return results
+
+
+def _cache_key(window, media_type):
+    return f'trending:{window}:{media_type or "all"}'
+
+
+def top(window, media_type=None, limit=10):
+    """Cached ``compute_top``; ``limit`` is capped at ``MAX_LIMIT``."""
+    config = settings.TRENDING
+    cache = caches[config['CACHE_ALIAS']]
+    key = _cache_key(window, media_type)
+    results = cache.get(key)
+    if results is None:
+        results = compute_top(window, media_type)
+        cache.set(key, results, config['CACHE_TTL'])
+    return results[:limit]
+
+
+def refresh_cache():
+    """Recompute every cached list; ``rollup_trending`` runs this after each rollup."""
+    config = settings.TRENDING
+    cache = caches[config['CACHE_ALIAS']]
+    for window in config['WINDOWS']:
+        for media_type in (None, *MEDIA_TYPES):
+            cache.set(_cache_key(window, media_type), compute_top(window, media_type), config['CACHE_TTL'])
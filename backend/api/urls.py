@@ -1,17 +1,38 @@
 # backend/api/urls.py
+from django.conf import settings
 from django.urls import path
-from . import views
+from . import async_views, images, views
+
+# Read and upstream-calling endpoints run as coroutines under ASGI.
+read_views = async_views if settings.ASYNC_READ_VIEWS else views
 
 urlpatterns = [
     path('test/', views.TestView.as_view(), name='test-view'),
     path('register/', views.register_user, name='register'),
-    path('user/info/', views.get_user_info, name='user_info'),
-    path('mylist/', views.get_movie_list, name='get_movie_list'),
+    path('logout/', views.logout_user, name='logout'),
+    path('user/info/', read_views.get_user_info, name='user_info'),
+    path('mylist/', read_views.get_movie_list, name='get_movie_list'),
     path('mylist/add/', views.add_to_list, name='add_to_list'),
     path('mylist/remove/<int:item_id>/', views.remove_from_list, name='remove_from_list'),
+    path('mylist/batch/', views.batch_update_list, name='batch_update_list'),
+    path('mylist/export.<str:fmt>', views.export_list, name='export_list'),
+    path('mylist/import/', views.import_list, name='import_list'),
+    # Always a coroutine: a stream stays open for minutes.
+    path('mylist/events/', async_views.change_feed, name='change_feed'),
+    path('mylist/events/ticket/', views.change_feed_ticket, name='change_feed_ticket'),
 
-    path('profiles/', views.get_profiles, name='get_profiles'),
+    path('profiles/', read_views.get_profiles, name='get_profiles'),
     path('profiles/create/', views.create_profile, name='create_profile'),
     path('profiles/<int:profile_id>/update/', views.update_profile, name='update_profile'),
+    path('profiles/<int:profile_id>/preferences/', views.patch_preferences, name='patch_preferences'),
     path('profiles/<int:profile_id>/delete/', views.delete_profile, name='delete_profile'),
+
+    path('progress/', views.record_progress, name='record_progress'),
+    path('progress/continue/', views.continue_watching, name='continue_watching'),
+    path('recommendations/', views.get_recommendations, name='recommendations'),
+    path('trending/', views.get_trending, name='trending'),
+    path('search/', views.search_titles, name='search'),
+    path('browse/home/', read_views.browse_home, name='browse_home'),
+    path('catalog/<path:tmdb_path>', read_views.catalog_proxy, name='catalog'),
+    path('images/<str:size>/<str:name>', images.image_view, name='image'),
 ]
@@ -1,14 +1,102 @@
 # backend/api/views.py
+import hashlib
+import logging
+
 from rest_framework.views import APIView
 from rest_framework import status
-from rest_framework.decorators import api_view, permission_classes
+from rest_framework.decorators import api_view, parser_classes, permission_classes, throttle_classes
+from rest_framework.exceptions import ValidationError
 from rest_framework.permissions import AllowAny
 from rest_framework.response import Response
 from django.contrib.auth.models import User
-from django.db import IntegrityError
+from django.conf import settings
+from django.db import IntegrityError, transaction
+from django.db.models import Count
+from django.http import HttpResponse, StreamingHttpResponse
+from django.utils.cache import get_conditional_response, patch_vary_headers
+from django.utils.http import http_date
 from rest_framework.permissions import IsAuthenticated
 from .models import MovieList, Profile
-from .serializers import MovieListSerializer, ProfileSerializer
+from .pagination import KeysetPagination
+from .parsers import FastJSONParser, MergePatchParser
+from .routers import replica_reads
+from .serializers import (
+    MovieListOperationSerializer, MovieListSerializer, MovieListValuesSerializer, PlaybackProgressSerializer,
+    ProfileSerializer, ProfileValuesSerializer,
+)
+from .signals import movie_list_changed
+from .throttling import AnonThrottle, scoped
+from .log import redact
+from rest_framework_simplejwt.exceptions import TokenError
+from rest_framework_simplejwt.settings import api_settings as jwt_settings
+from rest_framework_simplejwt.tokens import RefreshToken
+from .authentication import StreamTicket, revoke_token
+from . import browse, catalog, changefeed, preferences, progress, recommendations, titles, transfer, trending
+
+logger = logging.getLogger(__name__)
+
+PROFILE_SUMMARY_FIELDS = ['id', 'name', 'avatar', 'version', 'list_count']
+MOVIE_LIST_ORDERINGS = {
+    'added': ('-added_date', '-id'),
+    'position': ('position', '-added_date', '-id'),
+}
+
+def requested_fields(request, aliases=None):
+    """Parse the ``fields`` query param into a list, or None when absent."""
+    raw = request.query_params.get('fields')
+    if not raw:
+        return None
+    if aliases and raw in aliases:
+        return list(aliases[raw])
+    return [name.strip() for name in raw.split(',') if name.strip()]
+
+def profiles_queryset(user_id, fields):
+    profiles = Profile.objects.filter(user_id=user_id).order_by('id')
+    if fields is None or 'list_count' in fields:
+        profiles = profiles.annotate(list_count=Count('movie_lists'))
+    # id and version are always needed, for the lists and the ETag.
+    return profiles.values(*dict.fromkeys(['id', 'version', *ProfileValuesSerializer.lookups(fields)]))
+
+def profile_lists_queryset(profile_ids):
+    """The saved titles of ``profile_ids``, newest first; the title columns come through a join."""
+    return (
+        MovieList.objects.filter(profile_id__in=profile_ids).order_by('-added_date')
+        .values(*MovieListValuesSerializer.lookups())
+    )
+
+def attach_lists(profiles, movies):
+    """Put each row of ``movies`` under ``movie_lists`` of its profile row."""
+    lists = {profile['id']: [] for profile in profiles}
+    for movie in movies:
+        lists[movie['profile_id']].append(movie)
+    for profile in profiles:
+        profile['movie_lists'] = lists[profile['id']]
+
+def wants_lists(profiles, fields):
+    return bool(profiles) and (fields is None or 'movie_lists' in fields)
+
+def movie_list_queryset(profile, params, fields, paginator):
+    movies = MovieList.objects.filter(profile=profile)
+    media_type = params.get('media_type')
+    if media_type:
+        movies = movies.filter(media_type=media_type)
+    item_id = params.get('item_id')
+    if item_id:
+        if not item_id.lstrip('-').isdigit():
+            raise ValidationError({'item_id': 'Must be an integer.'})
+        movies = movies.filter(item_id=int(item_id))
+    # The cursor is made from the ordering columns of the last row.
+    return movies.values(*dict.fromkeys([*MovieListValuesSerializer.lookups(fields), *paginator.ordering_fields]))
+
+def make_etag(*parts):
+    return '"%s"' % hashlib.sha1(repr(parts).encode()).hexdigest()[:24]
+
+def set_validators(response, etag, last_modified=None):
+    response['ETag'] = etag
+    if last_modified is not None:
+        response['Last-Modified'] = http_date(last_modified.timestamp())
+    response['Cache-Control'] = 'private, no-cache'
+    return response
 
 class TestView(APIView):
     def get(self, request):
@@ -16,6 +104,7 @@ class TestView(APIView):
 
 @api_view(['POST'])
 @permission_classes([AllowAny])
+@throttle_classes([AnonThrottle, scoped('auth')])
 def register_user(request):
     try:
         username = request.data.get('username')
@@ -52,11 +141,31 @@ def register_user(request):
             status=status.HTTP_500_INTERNAL_SERVER_ERROR
         )
 
+@api_view(['POST'])
+@permission_classes([IsAuthenticated])
+def logout_user(request):
+    # Revoked in the shared cache, so every worker rejects the access token
+    # even where it is already verified and cached.
+    refresh = None
+    if request.data.get('refresh'):
+        try:
+            refresh = RefreshToken(request.data['refresh'])
+        except TokenError:
+            return Response({"error": "Invalid refresh token"}, status=status.HTTP_400_BAD_REQUEST)
+        if str(refresh.get(jwt_settings.USER_ID_CLAIM)) != str(request.user.id):
+            return Response({"error": "Invalid refresh token"}, status=status.HTTP_400_BAD_REQUEST)
+    if request.auth is not None:
+        revoke_token(request.auth)
+    if refresh is not None:
+        revoke_token(refresh)
+    return Response(status=status.HTTP_204_NO_CONTENT)
+
 from rest_framework.decorators import api_view, permission_classes
 from rest_framework.permissions import IsAuthenticated
 
 @api_view(['GET'])
 @permission_classes([IsAuthenticated])
+@replica_reads
 def get_user_info(request):
     user = request.user
     return Response({
@@ -71,20 +180,38 @@ class TestView(APIView):
 
 @api_view(['GET'])
 @permission_classes([IsAuthenticated])
+@replica_reads
 def get_profiles(request):
-    profiles = Profile.objects.filter(user=request.user)
-    serializer = ProfileSerializer(profiles, many=True)
-    return Response(serializer.data)
+    fields = requested_fields(request, aliases={'summary': PROFILE_SUMMARY_FIELDS})
+    query = request.GET.urlencode()
+
+    # Revalidation only needs the version stamps, not the profiles or lists.
+    if 'HTTP_IF_NONE_MATCH' in request.META:
+        stamps = Profile.objects.filter(user_id=request.user.id).order_by('id').values_list('id', 'version')
+        etag = make_etag('profiles', query, *stamps)
+        not_modified = get_conditional_response(request, etag=etag)
+        if not_modified is not None:
+            return not_modified
+
+    profiles = list(profiles_queryset(request.user.id, fields))
+    if wants_lists(profiles, fields):
+        attach_lists(profiles, profile_lists_queryset([profile['id'] for profile in profiles]))
+    serializer = ProfileValuesSerializer(profiles, fields=fields)
+    etag = make_etag('profiles', query, *((profile['id'], profile['version']) for profile in profiles))
+    # No Last-Modified here: deleting a profile would not move it forward.
+    return set_validators(Response(serializer.data), etag)
 
 @api_view(['POST'])
 @permission_classes([IsAuthenticated])
 def create_profile(request):
-    print("Request Data:", request.data)
     data = request.data
+    if logger.isEnabledFor(logging.DEBUG):
+        logger.debug('Create profile', extra={'user_id': request.user.id, 'payload': redact(data)})
     serializer = ProfileSerializer(data=data)
     if serializer.is_valid():
         serializer.save(user=request.user)
         return Response(serializer.data, status=status.HTTP_201_CREATED)
+    logger.debug('Create profile rejected', extra={'user_id': request.user.id, 'errors': serializer.errors})
     return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
 
 @api_view(['PUT'])
@@ -95,39 +222,81 @@ def update_profile(request, profile_id):
     except Profile.DoesNotExist:
         return Response({"error": "Profile not found"}, status=status.HTTP_404_NOT_FOUND)
 
+    if logger.isEnabledFor(logging.DEBUG):
+        logger.debug('Update profile', extra={'profile_id': profile.id, 'payload': redact(request.data)})
     serializer = ProfileSerializer(profile, data=request.data, partial=True)
     if serializer.is_valid():
         serializer.save()
+        changefeed.publish(profile.id, 'profile', {'changed': sorted(serializer.validated_data)})
         return Response(serializer.data)
     else:
-        print("Serializer Errors:", serializer.errors)
+        logger.debug('Update profile rejected', extra={'profile_id': profile.id, 'errors': serializer.errors})
         return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
 
+@api_view(['PATCH'])
+@permission_classes([IsAuthenticated])
+@parser_classes([MergePatchParser, FastJSONParser])
+def patch_preferences(request, profile_id):
+    patch = request.data
+    if not isinstance(patch, dict):
+        return Response({"error": "Preferences patch must be a JSON object"}, status=status.HTTP_400_BAD_REQUEST)
+
+    try:
+        preferences.validate_patch(patch)
+    except preferences.PreferencesError as exc:
+        return Response({"error": exc.message, "path": exc.path}, status=status.HTTP_400_BAD_REQUEST)
+
+    profiles = Profile.objects.filter(id=profile_id, user_id=request.user.id)
+    if preferences.apply_patch(profiles, patch):
+        changefeed.publish(int(profile_id), 'profile', {'changed': ['preferences']})
+        return Response(status=status.HTTP_204_NO_CONTENT)
+    if not profiles.exists():
+        return Response({"error": "Profile not found"}, status=status.HTTP_404_NOT_FOUND)
+    return Response(
+        {"error": f"Preferences may not exceed {settings.PREFERENCES_MAX_SIZE} characters"},
+        status=status.HTTP_413_REQUEST_ENTITY_TOO_LARGE,
+    )
+
 @api_view(['DELETE'])
 @permission_classes([IsAuthenticated])
 def delete_profile(request, profile_id):
     try:
         profile = Profile.objects.get(id=profile_id, user=request.user)
         profile.delete()
+        browse.invalidate_browse_home(profile_id)
+        changefeed.publish(profile_id, 'profile_deleted')
         return Response({"message": "Profile deleted successfully"}, status=status.HTTP_200_OK)
     except Profile.DoesNotExist:
         return Response({"error": "Profile not found"}, status=status.HTTP_404_NOT_FOUND)
 
 @api_view(['GET'])
 @permission_classes([IsAuthenticated])
+@replica_reads
 def get_movie_list(request):
     profile_id = request.query_params.get('profile_id')
     if not profile_id:
         return Response({"error": "Profile ID is required"}, status=status.HTTP_400_BAD_REQUEST)
 
     try:
-        profile = Profile.objects.get(id=profile_id, user=request.user)
+        profile = Profile.objects.only('id', 'version', 'updated_at').get(id=profile_id, user_id=request.user.id)
     except Profile.DoesNotExist:
         return Response({"error": "Profile not found"}, status=status.HTTP_404_NOT_FOUND)
 
-    movies = MovieList.objects.filter(profile=profile)
-    serializer = MovieListSerializer(movies, many=True)
-    return Response(serializer.data)
+    etag = make_etag('mylist', profile.id, profile.version, request.GET.urlencode())
+    not_modified = get_conditional_response(request, etag=etag, last_modified=int(profile.updated_at.timestamp()))
+    if not_modified is not None:
+        return set_validators(not_modified, etag, profile.updated_at)
+
+    ordering = MOVIE_LIST_ORDERINGS.get(request.query_params.get('ordering', 'added'))
+    if ordering is None:
+        return Response({"error": "Unknown ordering"}, status=status.HTTP_400_BAD_REQUEST)
+    paginator = KeysetPagination(ordering)
+    fields = requested_fields(request)
+
+    movies = movie_list_queryset(profile, request.query_params, fields, paginator)
+    page = paginator.paginate_queryset(movies, request)
+    serializer = MovieListValuesSerializer(page, fields=fields)
+    return set_validators(paginator.get_paginated_response(serializer.data), etag, profile.updated_at)
 
 @api_view(['POST'])
 @permission_classes([IsAuthenticated])
@@ -149,15 +318,22 @@ def add_to_list(request):
         'media_type': request.data.get('media_type')
     }
 
+    serializer = MovieListSerializer(data=movie_data)
+    if not serializer.is_valid():
+        return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
     try:
-        movie = MovieList.objects.get(profile=profile, item_id=movie_data['item_id'])
-        return Response({'message': 'Movie already in list'}, status=status.HTTP_400_BAD_REQUEST)
-    except MovieList.DoesNotExist:
-        serializer = MovieListSerializer(data=movie_data)
-        if serializer.is_valid():
+        # One write transaction for the title, the row and the receivers'
+        # database writes, as in batch_update_list; separate ones contend for
+        # SQLite's lock.
+        with transaction.atomic():
+            if MovieList.objects.filter(profile=profile, item_id=serializer.validated_data['item_id']).exists():
+                return Response({'message': 'Movie already in list'}, status=status.HTTP_400_BAD_REQUEST)
             serializer.save(user=request.user, profile=profile)
-            return Response(serializer.data, status=status.HTTP_201_CREATED)
-        return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
+            movie_list_changed.send(MovieList, profile_id=profile.id, added=[serializer.instance.item_id], removed=[])
+    except IntegrityError:
+        # A concurrent add of the same item won.
+        return Response({'message': 'Movie already in list'}, status=status.HTTP_400_BAD_REQUEST)
+    return Response(serializer.data, status=status.HTTP_201_CREATED)
 
 @api_view(['DELETE'])
 @permission_classes([IsAuthenticated])
@@ -171,9 +347,301 @@ def remove_from_list(request, item_id):
     except Profile.DoesNotExist:
         return Response({"error": "Profile not found"}, status=status.HTTP_404_NOT_FOUND)
 
+    with transaction.atomic():
+        deleted, _ = MovieList.objects.filter(profile=profile, item_id=item_id).delete()
+        if not deleted:
+            return Response({'message': 'Movie not found in list'}, status=status.HTTP_404_NOT_FOUND)
+        movie_list_changed.send(MovieList, profile_id=profile.id, added=[], removed=[item_id])
+    return Response({'message': 'Movie removed from list'}, status=status.HTTP_200_OK)
+
+@api_view(['POST'])
+@permission_classes([IsAuthenticated])
+def batch_update_list(request):
+    profile_id = request.data.get('profile_id')
+    if not profile_id:
+        return Response({"error": "Profile ID is required"}, status=status.HTTP_400_BAD_REQUEST)
+
+    operations = request.data.get('operations')
+    if not isinstance(operations, list) or not operations:
+        return Response({"error": "Operations must be a non-empty list"}, status=status.HTTP_400_BAD_REQUEST)
+    if len(operations) > settings.MY_LIST_BATCH_LIMIT:
+        return Response(
+            {"error": f"At most {settings.MY_LIST_BATCH_LIMIT} operations per request"},
+            status=status.HTTP_400_BAD_REQUEST,
+        )
+
+    try:
+        profile = Profile.objects.get(id=profile_id, user=request.user)
+    except Profile.DoesNotExist:
+        return Response({"error": "Profile not found"}, status=status.HTTP_404_NOT_FOUND)
+
+    results = []
+    valid = {}
+    for index, raw in enumerate(operations):
+        serializer = MovieListOperationSerializer(data=raw)
+        if not serializer.is_valid():
+            results.append({'index': index, 'status': 'invalid', 'errors': serializer.errors})
+            continue
+        operation = serializer.validated_data
+        result = {'index': index, 'op': operation['op'], 'item_id': operation['item_id']}
+        results.append(result)
+        if operation['item_id'] in valid:
+            result['status'] = 'duplicate'
+            continue
+        valid[operation['item_id']] = (operation, result)
+
+    with transaction.atomic():
+        existing = dict(
+            MovieList.objects.filter(profile=profile, item_id__in=list(valid)).values_list('item_id', 'id')
+        )
+        resolved = titles.resolve(
+            (item_id, operation.get('media_type'), operation['title'], operation['poster_path'])
+            for item_id, (operation, _) in valid.items()
+            if operation['op'] == 'add' and item_id not in existing
+        )
+        to_create, to_delete, to_move = [], [], []
+        for item_id, (operation, result) in valid.items():
+            op = operation['op']
+            if op == 'add':
+                if item_id in existing:
+                    result['status'] = 'exists'
+                    continue
+                to_create.append(MovieList(
+                    user=request.user, profile=profile, item_id=item_id,
+                    title=resolved[titles.title_key(item_id, operation.get('media_type'))],
+                    media_type=operation.get('media_type'), position=operation.get('position', 0),
+                ))
+                result['status'] = 'added'
+            elif item_id not in existing:
+                result['status'] = 'not_found'
+            elif op == 'remove':
+                to_delete.append(item_id)
+                result['status'] = 'removed'
+            else:
+                to_move.append(MovieList(id=existing[item_id], position=operation['position']))
+                result['status'] = 'reordered'
+
+        if to_create:
+            MovieList.objects.bulk_create(to_create, ignore_conflicts=True)
+        if to_delete:
+            MovieList.objects.filter(profile=profile, item_id__in=to_delete).delete()
+        if to_move:
+            MovieList.objects.bulk_update(to_move, ['position'])
+
+        if to_create or to_delete or to_move:
+            movie_list_changed.send(
+                MovieList, profile_id=profile.id,
+                added=[movie.item_id for movie in to_create], removed=to_delete,
+            )
+    return Response({'results': results}, status=status.HTTP_200_OK)
+
+@api_view(['GET'])
+@permission_classes([IsAuthenticated])
+def export_list(request, fmt):
+    if fmt not in transfer.FORMATS:
+        return Response({"error": "Unknown export format"}, status=status.HTTP_404_NOT_FOUND)
+    profile_id = request.query_params.get('profile_id')
+    if not profile_id:
+        return Response({"error": "Profile ID is required"}, status=status.HTTP_400_BAD_REQUEST)
+
+    try:
+        profile = Profile.objects.only('id').get(id=profile_id, user_id=request.user.id)
+    except Profile.DoesNotExist:
+        return Response({"error": "Profile not found"}, status=status.HTTP_404_NOT_FOUND)
+
+    rows = transfer.EXPORTERS[fmt](transfer.export_rows(profile))
+    if getattr(request, 'scope', None) is not None:
+        rows = transfer.aiter_chunks(rows)
+    response = StreamingHttpResponse(rows, content_type=transfer.FORMATS[fmt])
+    response['Content-Disposition'] = f'attachment; filename="mylist-{profile.id}.{fmt}"'
+    response['Cache-Control'] = 'private, no-store'
+    return response
+
+@api_view(['POST'])
+@permission_classes([IsAuthenticated])
+def import_list(request):
+    profile_id = request.query_params.get('profile_id')
+    if not profile_id:
+        return Response({"error": "Profile ID is required"}, status=status.HTTP_400_BAD_REQUEST)
+
+    parse = transfer.PARSERS.get(request.content_type.split(';')[0].strip())
+    if parse is None:
+        return Response(
+            {"error": "Upload the list as text/csv or application/x-ndjson"},
+            status=status.HTTP_415_UNSUPPORTED_MEDIA_TYPE,
+        )
+
+    try:
+        profile = Profile.objects.only('id').get(id=profile_id, user_id=request.user.id)
+    except Profile.DoesNotExist:
+        return Response({"error": "Profile not found"}, status=status.HTTP_404_NOT_FOUND)
+
+    # The body is read line by line, never through request.data.
+    try:
+        read, added = transfer.import_rows(request.user, profile, parse(request.stream or ()))
+    except transfer.ImportRowError as exc:
+        return Response({"error": str(exc), "added": exc.added}, status=status.HTTP_400_BAD_REQUEST)
+    return Response({'rows': read, 'added': added}, status=status.HTTP_200_OK)
+
+@api_view(['POST'])
+@permission_classes([IsAuthenticated])
+def change_feed_ticket(request):
+    # EventSource cannot send the Authorization header; it passes this instead.
+    profile_id = str(request.data.get('profile_id', ''))
+    if not profile_id.isdigit():
+        return Response({"error": "Profile ID is required"}, status=status.HTTP_400_BAD_REQUEST)
+    if not Profile.objects.filter(id=profile_id, user_id=request.user.id).exists():
+        return Response({"error": "Profile not found"}, status=status.HTTP_404_NOT_FOUND)
+
+    ticket = StreamTicket.for_profile(request.user, int(profile_id), request.auth)
+    return Response({'ticket': str(ticket), 'expires_in': settings.CHANGE_FEED['TICKET_SECONDS']})
+
+@api_view(['GET'])
+@permission_classes([IsAuthenticated])
+def get_recommendations(request):
+    profile_id = request.query_params.get('profile_id')
+    if not profile_id:
+        return Response({"error": "Profile ID is required"}, status=status.HTTP_400_BAD_REQUEST)
+
+    try:
+        limit = max(1, min(int(request.query_params.get('limit', 20)), 100))
+    except ValueError:
+        return Response({"error": "limit must be an integer"}, status=status.HTTP_400_BAD_REQUEST)
+
+    try:
+        profile = Profile.objects.only('id', 'version').get(id=profile_id, user_id=request.user.id)
+    except Profile.DoesNotExist:
+        return Response({"error": "Profile not found"}, status=status.HTTP_404_NOT_FOUND)
+
+    return Response({'results': recommendations.recommend(profile, limit)})
+
+@api_view(['POST'])
+@permission_classes([IsAuthenticated])
+@throttle_classes([scoped('progress')])
+def record_progress(request):
+    serializer = PlaybackProgressSerializer(data=request.data)
+    if not serializer.is_valid():
+        return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
+    report = serializer.validated_data
+    if not progress.owns_profile(request.user.id, report['profile_id']):
+        return Response({"error": "Profile not found"}, status=status.HTTP_404_NOT_FOUND)
+
+    # Buffered; written to the database by the flusher, see api/progress.py.
+    progress.get_progress_buffer().record(progress.make_entry(**report))
+    return Response(status=status.HTTP_202_ACCEPTED)
+
+@api_view(['GET'])
+@permission_classes([IsAuthenticated])
+def continue_watching(request):
+    profile_id = request.query_params.get('profile_id')
+    if not profile_id:
+        return Response({"error": "Profile ID is required"}, status=status.HTTP_400_BAD_REQUEST)
+
+    try:
+        profile_id = int(profile_id)
+        limit = max(1, min(int(request.query_params.get('limit', 20)), 100))
+    except ValueError:
+        return Response({"error": "profile_id and limit must be integers"}, status=status.HTTP_400_BAD_REQUEST)
+    if not progress.owns_profile(request.user.id, profile_id):
+        return Response({"error": "Profile not found"}, status=status.HTTP_404_NOT_FOUND)
+
+    return Response({'results': progress.continue_watching(profile_id, limit)})
+
+@api_view(['GET'])
+@permission_classes([IsAuthenticated])
+def get_trending(request):
+    window = request.query_params.get('window', 'day')
+    if window not in settings.TRENDING['WINDOWS']:
+        return Response({"error": "Unknown window"}, status=status.HTTP_400_BAD_REQUEST)
+    media_type = request.query_params.get('media_type') or None
+    if media_type is not None and media_type not in titles.MEDIA_TYPES:
+        return Response({"error": "Unknown media type"}, status=status.HTTP_400_BAD_REQUEST)
     try:
-        item = MovieList.objects.get(profile=profile, item_id=item_id)
-        item.delete()
-        return Response({'message': 'Movie removed from list'}, status=status.HTTP_200_OK)
-    except MovieList.DoesNotExist:
-        return Response({'message': 'Movie not found in list'}, status=status.HTTP_404_NOT_FOUND)
+        limit = max(1, min(int(request.query_params.get('limit', 10)), settings.TRENDING['MAX_LIMIT']))
+    except ValueError:
+        return Response({"error": "limit must be an integer"}, status=status.HTTP_400_BAD_REQUEST)
+
+    response = Response({
+        'window': window,
+        'media_type': media_type,
+        'results': trending.top(window, media_type, limit),
+    })
+    response['Cache-Control'] = 'private, max-age=60'
+    return response
+
+@api_view(['GET'])
+@permission_classes([IsAuthenticated])
+@throttle_classes([scoped('search')])
+def search_titles(request):
+    query = request.query_params.get('q', '').strip()
+    media_type = request.query_params.get('media_type') or None
+    if media_type is not None and media_type not in titles.MEDIA_TYPES:
+        return Response({"error": "Unknown media type"}, status=status.HTTP_400_BAD_REQUEST)
+    try:
+        limit = max(1, min(int(request.query_params.get('limit', 10)), settings.TITLE_SEARCH['MAX_LIMIT']))
+    except ValueError:
+        return Response({"error": "limit must be an integer"}, status=status.HTTP_400_BAD_REQUEST)
+
+    if len(query) < 2:
+        return Response({'source': 'local', 'results': []})
+
+    results = titles.search_titles(query, limit, media_type)
+    if len(results) >= min(limit, settings.TITLE_SEARCH['MIN_LOCAL_RESULTS']):
+        return Response({'source': 'local', 'results': [titles.as_result(title) for title in results]})
+
+    # Too few local matches: ask upstream, which also indexes what it returns.
+    path = f'search/{media_type}' if media_type else 'search/multi'
+    try:
+        payload, _ = catalog.get_catalog_cache().get(path, {'query': query, 'include_adult': 'false'})
+    except catalog.UpstreamError as exc:
+        return Response({"error": exc.message}, status=exc.status_code)
+    results = titles.titles_from_payload(path, payload)[:limit]
+    return Response({'source': 'upstream', 'results': [titles.as_result(title) for title in results]})
+
+@api_view(['GET'])
+@permission_classes([IsAuthenticated])
+def catalog_proxy(request, tmdb_path):
+    tmdb_path = tmdb_path.strip('/')
+    if not catalog.is_allowed_path(tmdb_path):
+        return Response({"error": "Catalog path not found"}, status=status.HTTP_404_NOT_FOUND)
+
+    params = catalog_params(request)
+    cache = catalog.get_catalog_cache()
+    try:
+        payload, state = cache.get(tmdb_path, params)
+    except catalog.UpstreamError as exc:
+        return Response({"error": exc.message}, status=exc.status_code)
+    return catalog_response(cache, tmdb_path, payload, state)
+
+def catalog_params(request):
+    return {key: value for key, value in request.query_params.items() if key != 'api_key'}
+
+def catalog_response(cache, tmdb_path, payload, state):
+    response = Response(payload)
+    response['X-Cache'] = state.upper()
+    response['Cache-Control'] = f'private, max-age={cache.ttl_for(tmdb_path)}'
+    return response
+
+@api_view(['GET'])
+@permission_classes([IsAuthenticated])
+def browse_home(request):
+    profile_id = request.query_params.get('profile_id')
+    if not profile_id:
+        return Response({"error": "Profile ID is required"}, status=status.HTTP_400_BAD_REQUEST)
+
+    try:
+        profile = Profile.objects.get(id=profile_id, user_id=request.user.id)
+    except Profile.DoesNotExist:
+        return Response({"error": "Profile not found"}, status=status.HTTP_404_NOT_FOUND)
+
+    return encoded_page_response(request, *browse.get_browse_home(profile))
+
+def encoded_page_response(request, body, gzipped):
+    if 'gzip' in request.META.get('HTTP_ACCEPT_ENCODING', ''):
+        response = HttpResponse(gzipped, content_type='application/json')
+        response['Content-Encoding'] = 'gzip'
+    else:
+        response = HttpResponse(body, content_type='application/json')
+    patch_vary_headers(response, ('Accept-Encoding',))
+    response['Cache-Control'] = 'private, no-cache'
+    return response
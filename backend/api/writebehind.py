@@ -0,0 +1,91 @@
+# backend/api/writebehind.py
+"""
+Per-process write-behind buffer.
+
+``record`` keeps a value per key in memory, where a later value replaces
+an earlier one. A daemon thread, started by the first ``record``, passes
+the buffered values to ``write`` every ``flush_interval`` seconds, or as
+soon as ``max_pending`` keys are waiting, so the database sees one batched
+write per interval instead of one per event. With ``flush_interval`` 0
+nothing is written until ``flush`` is called.
+
+Values still buffered when a worker dies are lost; the rest are written
+at interpreter exit.
+"""
+import atexit
+import logging
+import threading
+
+from django.db import close_old_connections
+
+logger = logging.getLogger(__name__)
+
+
+class WriteBehindBuffer:
+    name = 'write-behind'
+
+    def __init__(self, write, flush_interval=5, max_pending=5000):
+        self.write = write
+        self.flush_interval = flush_interval
+        self.max_pending = max_pending
+        self._pending = {}
+        self._lock = threading.Lock()
+        self._wake = threading.Event()
+        self._stopped = threading.Event()
+        self._thread = None
+
+    def record(self, key, value):
+        with self._lock:
+            self._pending[key] = value
+            full = len(self._pending) >= self.max_pending
+        if self.flush_interval:
+            self._start_flusher()
+            if full:
+                self._wake.set()
+
+    def items(self):
+        """A snapshot of the buffered ``(key, value)`` pairs."""
+        with self._lock:
+            return list(self._pending.items())
+
+    def flush(self):
+        """Write everything buffered; returns what ``write`` returned, or 0 when empty."""
+        with self._lock:
+            pending, self._pending = self._pending, {}
+        if not pending:
+            return 0
+        try:
+            return self.write(pending.values())
+        except Exception:
+            # Keep what newer values have not replaced for the next attempt.
+            with self._lock:
+                for key, value in pending.items():
+                    self._pending.setdefault(key, value)
+            raise
+
+    def close(self):
+        self._stopped.set()
+        self._wake.set()
+        if self._thread is not None:
+            self._thread.join(timeout=self.flush_interval or None)
+        self.flush()
+
+    def _start_flusher(self):
+        if self._thread is not None:
+            return
+        with self._lock:
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._run, name=f'{self.name}-flusher', daemon=True)
+                self._thread.start()
+                atexit.register(self.close)
+
+    def _run(self):
+        while not self._stopped.is_set():
+            self._wake.wait(self.flush_interval)
+            self._wake.clear()
+            try:
+                self.flush()
+            except Exception:
+                logger.warning('Flushing the %s buffer failed', self.name, exc_info=True)
+            finally:
+                close_old_connections()
@@ -50,12 +50,16 @@ INSTALLED_APPS = [
 ]
 
 MIDDLEWARE = [
+    'api.middleware.RequestIDMiddleware',
+    'api.metrics.MetricsMiddleware',
+    'api.middleware.CompressionMiddleware',
     'corsheaders.middleware.CorsMiddleware',
     'django.middleware.security.SecurityMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
     'django.middleware.csrf.CsrfViewMiddleware',
     'django.contrib.auth.middleware.AuthenticationMiddleware',
+    'api.routers.ReplicaPinningMiddleware',
     'django.contrib.messages.middleware.MessageMiddleware',
     'django.middleware.clickjacking.XFrameOptionsMiddleware',
 ]
@@ -79,6 +83,11 @@ TEMPLATES = [
 ]
 
 WSGI_APPLICATION = 'backend.wsgi.application'
+ASGI_APPLICATION = 'backend.asgi.application'
+
+# Route the read and proxy endpoints to the coroutine views in api.async_views
+# (enable when serving through backend.asgi, e.g. under uvicorn)
+ASYNC_READ_VIEWS = env.bool('ASYNC_READ_VIEWS', default=False)
 
 
 # Database
@@ -87,15 +96,221 @@ WSGI_APPLICATION = 'backend.wsgi.application'
 
   
 
+# DATABASE_POOL picks how Postgres connections are reused:
+#   persistent  one connection per worker thread, kept for CONN_MAX_AGE
+#   django      psycopg 3's pool inside each process (Django 5.1+, psycopg[pool])
+#   pgbouncer   an external pooler in transaction mode; server-side cursors
+#               (QuerySet.iterator) do not survive it, so they are disabled
+DATABASE_POOL = env('DATABASE_POOL', default='persistent')
+
+
+def database_config(url):
+    config = dj_database_url.parse(url, conn_max_age=600, conn_health_checks=True)
+    if config['ENGINE'] == 'django.db.backends.sqlite3':
+        # Transactions take the write lock up front and wait for it; a
+        # deferred one that reads first fails with "database is locked".
+        config.setdefault('OPTIONS', {})['transaction_mode'] = 'IMMEDIATE'
+    if config['ENGINE'] != 'django.db.backends.postgresql':
+        return config
+    if DATABASE_POOL == 'django':
+        # Pooled connections replace persistent ones.
+        config['CONN_MAX_AGE'] = 0
+        config.setdefault('OPTIONS', {})['pool'] = {
+            'min_size': env.int('DATABASE_POOL_MIN_SIZE', default=2),
+            'max_size': env.int('DATABASE_POOL_MAX_SIZE', default=10),
+            'timeout': env.float('DATABASE_POOL_TIMEOUT', default=10.0),
+        }
+    elif DATABASE_POOL == 'pgbouncer':
+        config['DISABLE_SERVER_SIDE_CURSORS'] = True
+    return config
+
+
 DATABASES = {
-    'default': dj_database_url.config(
-        default=env('DATABASE_URL'),
-        conn_max_age=600,
-        conn_health_checks=True,
-    )
+    'default': database_config(env('DATABASE_URL')),
+}
+
+# Read replicas, comma-separated URLs, become replica1, replica2, ... The
+# test runner points them at the test database instead of creating them.
+for index, url in enumerate(env.list('DATABASE_REPLICA_URLS', default=[]), start=1):
+    DATABASES[f'replica{index}'] = {**database_config(url), 'TEST': {'MIRROR': 'default'}}
+
+DATABASE_ROUTERS = ['api.routers.ReplicaRouter']
+
+# Which reads go to the replicas, see api/routers.py
+DATABASE_ROUTING = {
+    'REPLICAS': [alias for alias in DATABASES if alias != 'default'],
+    'STICKY_SECONDS': env.int('REPLICA_STICKY_SECONDS', default=5),  # Upper bound on replication lag
+    'CACHE_ALIAS': 'default',   # Where pins are shared between workers
+}
+
+
+# Cache
+# https://docs.djangoproject.com/en/5.1/topics/cache/
+
+CACHES = {
+    'default': env.cache_url('CACHE_URL', default='locmemcache://'),
+}
+
+
+# Logging
+# Records are queued by the request threads and written by a listener
+# thread (api.log.QueueLogHandler), so requests never wait on log I/O.
+
+LOG_LEVEL = env('LOG_LEVEL', default='INFO')
+
+LOGGING = {
+    'version': 1,
+    'disable_existing_loggers': False,
+    'filters': {
+        'request_id': {'()': 'api.log.RequestIDFilter'},
+    },
+    'formatters': {
+        'json': {'()': 'api.log.JSONFormatter'},
+        'plain': {'format': '%(asctime)s %(levelname)s %(name)s [%(request_id)s] %(message)s'},
+    },
+    'handlers': {
+        'queue': {
+            '()': 'api.log.QueueLogHandler',
+            'stream': 'ext://sys.stderr',
+            'maxsize': env.int('LOG_QUEUE_SIZE', default=10000),
+            'filters': ['request_id'],
+            'formatter': env('LOG_FORMAT', default='json'),
+        },
+    },
+    'root': {
+        'handlers': ['queue'],
+        'level': LOG_LEVEL,
+    },
+    'loggers': {
+        'django': {'level': env('DJANGO_LOG_LEVEL', default='INFO'), 'propagate': True},
+        # Set to DEBUG to log (redacted) profile payloads and validation errors
+        'api': {'level': env('API_LOG_LEVEL', default=LOG_LEVEL), 'propagate': True},
+        # httpx logs every upstream request at INFO
+        'httpx': {'level': 'WARNING', 'propagate': True},
+    },
+}
+
+
+# Request metrics, see api/metrics.py
+
+METRICS = {
+    'ENABLED': env.bool('METRICS_ENABLED', default=True),
+    # Fraction of requests that get timings, query counts and sizes
+    'SAMPLE_RATE': env.float('METRICS_SAMPLE_RATE', default=0.1),
+    'SERVER_TIMING': env.bool('METRICS_SERVER_TIMING', default=DEBUG),
+    # /metrics requires "Authorization: Bearer <token>" and is closed while unset
+    'TOKEN': env('METRICS_TOKEN', default=''),
+}
+
+
+# TMDB catalog proxy
+
+TMDB_BASE_URL = env('TMDB_BASE_URL', default='https://api.themoviedb.org/3/')
+TMDB_API_KEY = env('TMDB_API_KEY', default='')
+TMDB_TIMEOUT = env.float('TMDB_TIMEOUT', default=5.0)
+# Connection pool size of the async upstream client, per event loop
+TMDB_MAX_CONNECTIONS = env.int('TMDB_MAX_CONNECTIONS', default=100)
+
+CATALOG_CACHE = {
+    'ALIAS': 'default',
+    'LRU_SIZE': env.int('CATALOG_LRU_SIZE', default=512),
+    'DEFAULT_TTL': 300,     # Seconds a response is served as fresh
+    'STALE_TTL': 3600,      # Extra seconds it may be served while refreshing
+    'INDEX_IN_BACKGROUND': True,  # Index fetched titles on a worker thread, after the response
+    'TTLS': {
+        'trending/': 600,
+        'movie/now_playing': 1800,
+        'movie/upcoming': 3600,
+        'movie/top_rated': 6 * 3600,
+        'tv/top_rated': 6 * 3600,
+        'tv/airing_today': 1800,
+        'search/': 120,
+    },
+    'ALLOWED_PREFIXES': [
+        'movie/', 'tv/', 'trending/', 'discover/', 'search/', 'genre/',
+    ],
+}
+
+
+# Poster/backdrop proxy with resized variants, see api/images.py
+IMAGE_PROXY = {
+    'UPSTREAM_URL': env('TMDB_IMAGE_URL', default='https://image.tmdb.org/t/p/original/'),
+    'CACHE_DIR': env('IMAGE_CACHE_DIR', default=os.path.join(BASE_DIR, 'image_cache')),
+    'MAX_BYTES': env.int('IMAGE_CACHE_MAX_BYTES', default=2 * 1024 ** 3),
+    'LOW_WATER': 0.9,           # Eviction stops at this share of MAX_BYTES
+    'WIDTHS': (92, 154, 185, 300, 342, 500, 780, 1280),  # TMDB's poster and backdrop widths
+    'JPEG_QUALITY': 85,
+    'WEBP_QUALITY': 80,
+    'MAX_SOURCE_BYTES': 20 * 1024 ** 2,
+    # e.g. X-Accel-Redirect with an internal nginx location aliased to CACHE_DIR
+    'SENDFILE_HEADER': env('IMAGE_SENDFILE_HEADER', default=''),
+    'SENDFILE_PREFIX': env('IMAGE_SENDFILE_PREFIX', default='/image-cache/'),
 }
 
 
+# Largest number of operations accepted by /api/mylist/batch/
+MY_LIST_BATCH_LIMIT = 500
+
+# Streaming My List export and import, see api/transfer.py
+MY_LIST_TRANSFER = {
+    'EXPORT_CHUNK_SIZE': 2000,   # Rows fetched per round trip
+    'IMPORT_BATCH_SIZE': 1000,   # Rows per bulk insert and transaction
+    'IMPORT_MAX_ROWS': env.int('MY_LIST_IMPORT_MAX_ROWS', default=100_000),
+}
+
+# Server-Sent Events per profile, see api/changefeed.py. Streams need an
+# ASGI server (uvicorn backend.asgi:application). Events stay in
+# the process by default; with several workers, set CHANGE_FEED_REDIS_URL
+# so they reach every device of a profile whichever worker it streams from.
+CHANGE_FEED_REDIS_URL = env('CHANGE_FEED_REDIS_URL', default='')
+CHANGE_FEED = {
+    'BACKEND': 'api.changefeed.RedisBroker' if CHANGE_FEED_REDIS_URL else 'api.changefeed.LocalBroker',
+    'OPTIONS': {'url': CHANGE_FEED_REDIS_URL} if CHANGE_FEED_REDIS_URL else {},
+    'HISTORY': 100,       # Events kept per profile for Last-Event-ID resumes
+    'QUEUE_SIZE': 64,     # Events buffered per connection before it is closed
+    'KEEPALIVE': 15,      # Seconds between comments on an idle stream
+    'MAX_SECONDS': 3600,  # Streams are closed after this, or when the token expires
+    'RETRY_MS': 3000,     # Reconnect delay sent to EventSource
+    'TICKET_SECONDS': 30,  # Lifetime of the ?ticket= that EventSource connects with
+}
+
+# "Most added" rows from My List activity, see api/trending.py
+TRENDING = {
+    'BUCKET_SECONDS': 3600,
+    'WINDOWS': {'day': 24 * 3600, 'week': 7 * 24 * 3600},
+    'MAX_LIMIT': 50,               # Items kept per cached list
+    'CACHE_ALIAS': 'default',
+    'CACHE_TTL': 600,              # Longer than the rollup interval
+    'SETTLE_SECONDS': 10,          # Events younger than this wait for the next rollup
+    'EVENT_RETENTION': 30 * 24 * 3600,
+}
+
+BROWSE_HOME = {
+    'ALIAS': 'default',
+    'TTL': 300,
+    'MAX_WORKERS': env.int('BROWSE_HOME_WORKERS', default=8),
+}
+
+
+# Password hashing
+# https://docs.djangoproject.com/en/5.1/topics/auth/passwords/
+# Hashes made by any listed hasher, or with another work factor, are
+# upgraded to the first one at the user's next login.
+
+# PBKDF2-SHA256 work factor; unset keeps Django's (870k in 5.1). Stored
+# hashes are only ever re-encoded upwards.
+PASSWORD_HASH_ITERATIONS = env.int('PASSWORD_HASH_ITERATIONS', default=None)
+
+PASSWORD_HASHERS = [
+    'api.hashers.TunedPBKDF2PasswordHasher',
+    'django.contrib.auth.hashers.PBKDF2PasswordHasher',
+    'django.contrib.auth.hashers.PBKDF2SHA1PasswordHasher',
+]
+# PASSWORD_HASHER=argon2 makes new hashes Argon2id (needs argon2-cffi).
+if env('PASSWORD_HASHER', default='pbkdf2') == 'argon2':
+    PASSWORD_HASHERS.insert(0, 'django.contrib.auth.hashers.Argon2PasswordHasher')
+
+
 # Password validation
 # https://docs.djangoproject.com/en/5.1/ref/settings/#auth-password-validators
 
@@ -144,6 +359,9 @@ CORS_ALLOWED_ORIGINS = env.list('CORS_ALLOWED_ORIGINS', default=[
 
 CORS_ALLOW_CREDENTIALS = True
 
+# Lets the frontend read the validators used for conditional GETs.
+CORS_EXPOSE_HEADERS = ['ETag', 'Last-Modified']
+
 CORS_ALLOW_METHODS = [
     "DELETE",
     "GET",
@@ -159,6 +377,9 @@ CORS_ALLOW_HEADERS = [
     "authorization",
     "content-type",
     "dnt",
+    "if-modified-since",
+    "if-none-match",
+    "last-event-id",
     "origin",
     "user-agent",
     "x-csrftoken",
@@ -172,25 +393,52 @@ REST_FRAMEWORK = {
         'rest_framework.permissions.IsAuthenticated',
     ],
     'DEFAULT_AUTHENTICATION_CLASSES': [
-        'rest_framework_simplejwt.authentication.JWTAuthentication',
+        'api.authentication.ClaimsJWTAuthentication',
+    ],
+    'DEFAULT_RENDERER_CLASSES': [
+        'api.renderers.FastJSONRenderer',
+        'rest_framework.renderers.BrowsableAPIRenderer',
+    ],
+    'DEFAULT_PARSER_CLASSES': [
+        'api.parsers.FastJSONParser',
+        'rest_framework.parsers.FormParser',
+        'rest_framework.parsers.MultiPartParser',
     ],
     'DEFAULT_THROTTLE_CLASSES': [
-        'rest_framework.throttling.AnonRateThrottle',
-        'rest_framework.throttling.UserRateThrottle',
+        'api.throttling.AnonThrottle',
+        'api.throttling.UserThrottle',
     ],
+    # Formats are described in api/throttling.py
     'DEFAULT_THROTTLE_RATES': {
         'anon': '100/day',    # Limit anonymous users
         'user': '1000/day',   # Limit authenticated users
+        # Per-endpoint scopes, instead of the defaults above
+        'auth': {'rate': '30/hour', 'burst': 10},   # Register and token, per address
+        'search': {'rate': '2/s', 'burst': 20},     # Typeahead
+        'progress': {'rate': '1/s', 'burst': 10},   # Player heartbeats
+        'images': {'rate': '20/s', 'burst': 300},   # Poster proxy, per address
     },
 }
 
+# Response compression, see api/middleware.py. Below MIN_SIZE bytes the
+# saving is not worth the CPU.
+RESPONSE_COMPRESSION = {
+    'MIN_SIZE': env.int('COMPRESSION_MIN_SIZE', default=1024),
+    'GZIP_LEVEL': 6,
+    'BROTLI_QUALITY': 4,  # 0-11; higher levels are too slow for dynamic responses
+}
+
+# Cache holding the throttle counters; use a shared one (Redis/Memcached)
+# with several workers so that limits are global.
+THROTTLE_CACHE = env('THROTTLE_CACHE', default='default')
+
 from datetime import timedelta
 SIMPLE_JWT = {
     'ACCESS_TOKEN_LIFETIME': timedelta(minutes=15),  # Shorter lifetime for security
     'REFRESH_TOKEN_LIFETIME': timedelta(days=7),
     'ROTATE_REFRESH_TOKENS': True,
-    'BLACKLIST_AFTER_ROTATION': True,
-    'UPDATE_LAST_LOGIN': True,
+    'BLACKLIST_AFTER_ROTATION': True,  # Enforced through api.models.RevokedToken
+    'UPDATE_LAST_LOGIN': False,  # Written by LOGIN_PIPELINE instead
     
     # Stronger algorithms
     'ALGORITHM': 'HS256',
@@ -202,6 +450,53 @@ SIMPLE_JWT = {
     'AUTH_HEADER_NAME': 'HTTP_AUTHORIZATION',
     'USER_ID_FIELD': 'id',
     'USER_ID_CLAIM': 'user_id',
+    'TOKEN_OBTAIN_SERIALIZER': 'api.serializers.TokenObtainPairWithClaimsSerializer',
+    'TOKEN_REFRESH_SERIALIZER': 'api.serializers.TokenRefreshWithRevocationSerializer',
+    'TOKEN_USER_CLASS': 'api.authentication.ClaimsUser',
+}
+
+# Login bookkeeping, see api/logins.py
+LOGIN_PIPELINE = {
+    'DEFER_LAST_LOGIN': True,   # Buffer last_login writes instead of saving the user on every login
+    'LAST_LOGIN_FLUSH_INTERVAL': env.float('LAST_LOGIN_FLUSH_INTERVAL', default=10.0),  # Seconds; 0 flushes only on demand
+    'MAX_PENDING_LOGINS': 1000, # Buffered users that trigger an early flush
+}
+
+# Item-item recommendations, see api/recommendations.py
+RECOMMENDATIONS = {
+    'NEIGHBORS': 50,        # Neighbors kept per item
+    'MIN_SUPPORT': 2,       # Profiles that must have saved both items
+    'BLOCK_SIZE': 1024,     # Items per NumPy block in a full rebuild
+    'CACHE_ALIAS': 'default',
+    'CACHE_TTL': 600,
+}
+
+# Playback progress write-behind buffer, see api/progress.py
+PLAYBACK_PROGRESS = {
+    'CACHE_ALIAS': 'default',   # Where buffered reports are visible to other workers
+    'FLUSH_INTERVAL': env.float('PROGRESS_FLUSH_INTERVAL', default=5.0),  # Seconds; 0 flushes only on demand
+    'MAX_PENDING': 5000,        # Buffered keys that trigger an early flush
+    'SHARED_TTL': 600,          # Seconds a buffered report stays in the shared cache
+    'FINISHED_RATIO': 0.95,     # Share of the duration after which a title is finished
+}
+
+# Local title search, see api/titles.py
+TITLE_SEARCH = {
+    'MIN_LOCAL_RESULTS': 3,  # Fewer local matches than this asks upstream
+    'MAX_LIMIT': 20,
+}
+
+# Upper bound on a profile's serialized preferences, see api/preferences.py
+PREFERENCES_MAX_SIZE = env.int('PREFERENCES_MAX_SIZE', default=16 * 1024)
+
+# Serve read requests with a user built from token claims (no auth_user query)
+JWT_STATELESS_USER = env.bool('JWT_STATELESS_USER', default=False)
+
+# Verified-token and user caches used by api.authentication
+JWT_AUTH_CACHE = {
+    'ALIAS': 'default',     # Shared cache holding revoked token ids
+    'TOKENS': 4096,
+    'USERS': 1024,
 }
 
 SECURE_BROWSER_XSS_FILTER = True
@@ -5,12 +5,16 @@ from rest_framework_simplejwt.views import (
     TokenObtainPairView,
     TokenRefreshView,
 )
+from api.metrics import metrics_view
+from api.throttling import AnonThrottle, scoped
 from api.views import TestView
 
 urlpatterns = [
     path('', TestView.as_view(), name='root'),
     path('admin/', admin.site.urls),
-    path('api/token/', TokenObtainPairView.as_view(), name='token_obtain_pair'),
+    path('api/token/', TokenObtainPairView.as_view(throttle_classes=[AnonThrottle, scoped('auth')]),
+         name='token_obtain_pair'),
     path('api/token/refresh/', TokenRefreshView.as_view(), name='token_refresh'),
     path('api/', include('api.urls')),
+    path('metrics', metrics_view, name='metrics'),
 ]
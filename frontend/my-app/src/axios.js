@@ -2,7 +2,7 @@ import axios from 'axios';
 
 const API_KEY = process.env.REACT_APP_API_KEY;
 const BASE_URL = process.env.REACT_APP_BASE_URL;
-const BACKEND_URL = process.env.REACT_APP_BACKEND_URL;
+export const BACKEND_URL = process.env.REACT_APP_BACKEND_URL || 'http://localhost:8000/api/';
 
 export const tmdbAxios = axios.create({
     baseURL: BASE_URL,
@@ -12,8 +12,12 @@ export const tmdbAxios = axios.create({
     }
 });
 
+// TMDB posters and backdrops through the backend's resizing image proxy.
+export const imageUrl = (path, width) =>
+    path ? `${BACKEND_URL}images/${width ? `w${width}` : 'original'}${path}?format=webp` : '';
+
 export const djangoAxios = axios.create({
-    baseURL: BACKEND_URL || 'http://localhost:8000/api/',
+    baseURL: BACKEND_URL,
     headers: {
         'Content-Type': 'application/json',
         'Accept': 'application/json'
@@ -35,6 +39,21 @@ djangoAxios.interceptors.request.use(
     }
 );
 
+// Refresh tokens are single use, so requests that fail together share one refresh.
+let refreshing = null;
+
+const refreshAccessToken = async () => {
+    const response = await djangoAxios.post('/api/token/refresh/', {
+        refresh: localStorage.getItem('refresh_token')
+    });
+    const { access, refresh } = response.data;
+    localStorage.setItem('access_token', access);
+    if (refresh) {
+        localStorage.setItem('refresh_token', refresh);
+    }
+    return access;
+};
+
 // Response interceptor
 djangoAxios.interceptors.response.use(
     (response) => response,
@@ -45,13 +64,12 @@ djangoAxios.interceptors.response.use(
         if (error.response?.status === 401 && !originalRequest._retry) {
             originalRequest._retry = true;
             try {
-                const refreshToken = localStorage.getItem('refresh_token');
-                const response = await djangoAxios.post('/api/token/refresh/', {
-                    refresh: refreshToken
-                });
-
-                const { access } = response.data;
-                localStorage.setItem('access_token', access);
+                if (!refreshing) {
+                    refreshing = refreshAccessToken().finally(() => {
+                        refreshing = null;
+                    });
+                }
+                const access = await refreshing;
 
                 // Retry original request with new token
                 originalRequest.headers.Authorization = `Bearer ${access}`;
@@ -67,3 +85,15 @@ djangoAxios.interceptors.response.use(
         return Promise.reject(error);
     }
 );
+
+// Revokes the tokens on the server too, so a copied token stops working.
+export const logout = async () => {
+    try {
+        await djangoAxios.post('logout/', { refresh: localStorage.getItem('refresh_token') });
+    } catch (error) {
+        console.error('Error logging out:', error);
+    } finally {
+        localStorage.removeItem('access_token');
+        localStorage.removeItem('refresh_token');
+    }
+};
@@ -2,6 +2,7 @@ import React, { useState, useEffect, useRef, useCallback, useMemo } from "react"
 import { motion, AnimatePresence } from "framer-motion";
 import tmdbAxios from "axios";
 import requests from "../requests";
+import { imageUrl } from "../axios";
 import ShimmerBanner from "./shimmerComps/shimmerBanner";
 import VideoPlayer from "./VideoPlayer";
 import { FontAwesomeIcon } from "@fortawesome/react-fontawesome";
@@ -147,7 +148,7 @@ export default function Banner({ media_type = 'Movie' }) {
                 if (!isMounted) return;
 
                 const contentData = detailedRes.data;
-                await preloadImage(`${baseImgUrl}${contentData.backdrop_path}`);
+                await preloadImage(imageUrl(contentData.backdrop_path, 1280));
                 
                 if (isMounted) {
                     setMovie(contentData);
@@ -248,7 +249,7 @@ export default function Banner({ media_type = 'Movie' }) {
                     >
                         {imageLoaded && (
                             <img
-                                src={`${baseImgUrl}${movie?.backdrop_path || movie?.poster_path}`}
+                                src={imageUrl(movie?.backdrop_path || movie?.poster_path, 1280)}
                                 alt={movie?.title}
                                 className="w-full h-full object-cover"
                                 loading="lazy"
@@ -27,11 +27,10 @@ useEffect(() => {
                 const currentProfileId = localStorage.getItem('currentProfileId');
                 if (!currentProfileId) return;
 
-                const response = await djangoAxios.get(`mylist/?profile_id=${currentProfileId}`);
-                const isMovieInList = response.data.some(item => 
-                    item.item_id === details.id
-                );
-                setIsInList(isMovieInList);
+                const response = await djangoAxios.get('mylist/', {
+                    params: { profile_id: currentProfileId, item_id: details.id, fields: 'item_id' }
+                });
+                setIsInList(response.data.results.length > 0);
             } catch (error) {
                 console.error('Error checking list status:', error);
             }
@@ -1,7 +1,8 @@
 // src/components/MyList.js
 import React, { useState, useEffect } from 'react';
 import { motion, AnimatePresence } from 'framer-motion';
-import { djangoAxios } from '../axios';
+import { djangoAxios, imageUrl } from '../axios';
+import useChangeFeed from '../hooks/useChangeFeed';
 import { useNavigate, Link } from 'react-router-dom';
 import { FontAwesomeIcon } from "@fortawesome/react-fontawesome";
 import { faMinus, faFilm } from "@fortawesome/free-solid-svg-icons";
@@ -54,6 +55,13 @@ export default function MyList() {
         fetchMyList();
     }, []);
 
+    // Other devices' changes to this profile's list show up without a reload.
+    useChangeFeed(localStorage.getItem('currentProfileId'), (kind) => {
+        if (kind === 'list' || kind === 'reset') {
+            fetchMyList();
+        }
+    });
+
     // frontend/my-app/src/components/MyList.js
 // Update the fetchMyList and removeFromList functions:
 
@@ -66,8 +74,14 @@ const fetchMyList = async () => {
             return;
         }
 
-        const response = await djangoAxios.get(`mylist/?profile_id=${currentProfileId}`);
-        setMyList(response.data);
+        const items = [];
+        let url = `mylist/?profile_id=${currentProfileId}`;
+        while (url) {
+            const response = await djangoAxios.get(url);
+            items.push(...response.data.results);
+            url = response.data.next;
+        }
+        setMyList(items);
         setLoading(false);
     } catch (error) {
         console.error('Error fetching mylist:', error);
@@ -131,7 +145,7 @@ const removeFromList = async (itemId) => {
                         >
                             <Link to={`/${item.media_type}/${item.item_id}`}>
                                 <motion.img 
-                                    src={`https://image.tmdb.org/t/p/w500${item.poster_path}`}
+                                    src={imageUrl(item.poster_path, 500)}
                                     alt={item.title}
                                     className="w-full rounded-lg"
                                     whileHover={{ scale: 1.05 }}
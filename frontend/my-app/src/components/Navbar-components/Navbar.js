@@ -2,7 +2,7 @@
 import React, { useState, useEffect, useRef } from "react";
 import { motion, AnimatePresence, useViewportScroll, useTransform } from "framer-motion";
 import { useNavigate } from "react-router-dom";
-import { djangoAxios } from "../../axios";
+import { djangoAxios, logout } from "../../axios";
 import { FontAwesomeIcon } from "@fortawesome/react-fontawesome";
 import { faSignOut, faBars, faTimes } from "@fortawesome/free-solid-svg-icons";
 import NavLinks from "./NavLinks";
@@ -104,9 +104,8 @@ export default function Navbar() {
         }
     }, []);
 
-    const handleLogout = () => {
-        localStorage.removeItem('access_token');
-        localStorage.removeItem('refresh_token');
+    const handleLogout = async () => {
+        await logout();
         setUsername('');
         navigate('/login');
     };
@@ -4,7 +4,7 @@ import { motion, AnimatePresence } from 'framer-motion';
 import { Link, useNavigate } from 'react-router-dom';
 import { FontAwesomeIcon } from '@fortawesome/react-fontawesome';
 import { faSignOut, faPencil } from '@fortawesome/free-solid-svg-icons';
-import { djangoAxios } from '../../axios';
+import { djangoAxios, logout } from '../../axios';
 import { defaultAvatar } from '../../constants/avatarImages';
 import useProfiles from '../../hooks/useProfiles';
 
@@ -25,9 +25,8 @@ export default function ProfileDropdown() {
         }
     }, [profiles]);
 
-    const handleLogout = () => {
-        localStorage.removeItem('access_token');
-        localStorage.removeItem('refresh_token');
+    const handleLogout = async () => {
+        await logout();
         localStorage.removeItem('currentProfileId');
         navigate('/login');
     };
@@ -18,7 +18,7 @@ export default function ProfileSelection() {
 
     const fetchProfiles = async () => {
         try {
-            const response = await djangoAxios.get('profiles/');
+            const response = await djangoAxios.get('profiles/', { params: { fields: 'summary' } });
             setProfiles(response.data);
         } catch (error) {
             console.error('Error fetching profiles:', error);
@@ -1,5 +1,5 @@
 import React, { useState, useEffect } from "react";
-import { tmdbAxios } from "../axios";
+import { tmdbAxios, imageUrl } from "../axios";
 import YouTube from "react-youtube";
 import { FontAwesomeIcon } from "@fortawesome/react-fontawesome";
 import { faStar } from "@fortawesome/free-solid-svg-icons";
@@ -14,7 +14,6 @@ export default function Row(props) {
     const [selectedMovie, setSelectedMovie] = useState(null);
     const [isModalOpen, setIsModalOpen] = useState(false);
     
-    const baseImgUrl = "https://image.tmdb.org/t/p/original/";
     const opts = {
         height: '390',
         width: '100%',
@@ -141,7 +140,7 @@ export default function Row(props) {
                                 <img 
                                     onClick={() => handleClick(movie)}
                                     className="max-h-72 max-w-64 scale-95 hover:scale-100 transitionall duration-200 ease-in-out transform" 
-                                    src={`${baseImgUrl}${props.isBig ? movie.poster_path : movie.backdrop_path}`} 
+                                    src={props.isBig ? imageUrl(movie.poster_path, 342) : imageUrl(movie.backdrop_path, 780)} 
                                     alt={movie.title}
                                     loading="lazy"
                                 />
@@ -1,5 +1,5 @@
 import React, { createContext, useState, useContext, useEffect } from 'react';
-import { djangoAxios } from '../axios';
+import { djangoAxios, logout as revokeTokens } from '../axios';
 
 const AuthContext = createContext(null);
 
@@ -32,9 +32,8 @@ export const AuthProvider = ({ children }) => {
         await checkAuth();
     };
 
-    const logout = () => {
-        localStorage.removeItem('access_token');
-        localStorage.removeItem('refresh_token');
+    const logout = async () => {
+        await revokeTokens();
         setUser(null);
     };
 
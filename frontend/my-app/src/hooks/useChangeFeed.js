@@ -0,0 +1,72 @@
+// frontend/my-app/src/hooks/useChangeFeed.js
+import { useEffect, useRef } from 'react';
+import { djangoAxios, BACKEND_URL } from '../axios';
+
+const RECONNECT_DELAY = 3000;
+
+// Calls onEvent(kind, data) for the profile's change feed events (list,
+// profile, profile_deleted, reset). EventSource cannot send the
+// Authorization header, so every connection opens with a short-lived
+// ticket; when the stream drops, a new ticket is fetched and the feed
+// resumes from the last event seen.
+export default function useChangeFeed(profileId, onEvent) {
+    const handler = useRef(onEvent);
+    handler.current = onEvent;
+
+    useEffect(() => {
+        if (!profileId || typeof EventSource === 'undefined') {
+            return undefined;
+        }
+
+        let source = null;
+        let timer = null;
+        let lastEventId = null;
+        let stopped = false;
+
+        const connect = async () => {
+            try {
+                const response = await djangoAxios.post('mylist/events/ticket/', { profile_id: profileId });
+                if (stopped) {
+                    return;
+                }
+                const params = new URLSearchParams({ profile_id: profileId, ticket: response.data.ticket });
+                if (lastEventId) {
+                    params.set('last_event_id', lastEventId);
+                }
+                source = new EventSource(`${BACKEND_URL}mylist/events/?${params}`);
+                ['ready', 'list', 'profile', 'profile_deleted', 'reset'].forEach((kind) => {
+                    source.addEventListener(kind, (event) => {
+                        lastEventId = event.lastEventId || lastEventId;
+                        if (kind !== 'ready') {
+                            handler.current(kind, JSON.parse(event.data));
+                        }
+                    });
+                });
+                // The ticket in the URL has expired by the time EventSource
+                // would retry on its own, so reconnect with a fresh one.
+                source.onerror = () => {
+                    source.close();
+                    retry();
+                };
+            } catch (error) {
+                console.error('Error opening the change feed:', error);
+                retry();
+            }
+        };
+
+        const retry = () => {
+            if (!stopped) {
+                timer = setTimeout(connect, RECONNECT_DELAY);
+            }
+        };
+
+        connect();
+        return () => {
+            stopped = true;
+            clearTimeout(timer);
+            if (source) {
+                source.close();
+            }
+        };
+    }, [profileId]);
+}